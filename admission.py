@@ -0,0 +1,293 @@
+"""
+Per-cluster admission control of the controller operations
+"""
+
+import asyncio
+import collections
+import contextlib
+import functools
+import logging
+import threading
+import time
+from concurrent import futures
+from typing import NamedTuple, Optional
+
+from grpc_interceptor.exceptions import DeadlineExceeded, ResourceExhausted
+
+import metrics
+
+logger = logging.getLogger("Admission")
+
+# Operations in order of priority, detaching first so that failover is
+# never stuck behind bulk provisioning.
+PRIORITIES = ("unpublish", "publish", "create", "expand", "delete")
+
+_queued = metrics.gauge(
+    "admission_queued", "Operations waiting for admission, by cluster"
+)
+_running = metrics.gauge(
+    "admission_running", "Admitted operations in progress, by cluster"
+)
+_wait_seconds = metrics.summary(
+    "admission_wait_seconds", "Time operations waited for admission"
+)
+_rejected = metrics.counter(
+    "admission_rejected_total", "Operations rejected by admission control"
+)
+
+
+class OperationLimit(NamedTuple):
+    """
+    Concurrency limits of an operation class in a single cluster
+    """
+
+    operation: str
+    running: int
+    queued: Optional[int] = None
+
+    @classmethod
+    def parse(cls, spec: str) -> "OperationLimit":
+        """
+        Parses an OPERATION=RUNNING[:QUEUED] limit specification
+        :param spec: The limit specification, e.g. create=4:8
+        :type spec: str
+        :return: The limit
+        :rtype: OperationLimit
+        """
+        operation, _, limits = spec.partition("=")
+        fields = limits.split(":")
+        if operation not in PRIORITIES or len(fields) not in (1, 2):
+            raise ValueError(f"Invalid admission limit: {spec}")
+
+        return cls(
+            operation,
+            int(fields[0]),
+            int(fields[1]) if len(fields) == 2 else None,
+        )
+
+
+# The publish and unpublish limits apply to reassignment API calls, each
+# one carrying a whole batch of volumes.
+DEFAULT_LIMITS = {
+    "unpublish": OperationLimit("unpublish", 8),
+    "publish": OperationLimit("publish", 8),
+    "create": OperationLimit("create", 4, 4),
+    "expand": OperationLimit("expand", 2, 2),
+    "delete": OperationLimit("delete", 2, 2),
+}
+
+
+class _ClusterQueue:
+    def __init__(self):
+        self.running = 0
+        self.running_by_operation = collections.Counter()
+        self.waiting = {
+            operation: collections.deque() for operation in PRIORITIES
+        }
+
+
+class AdmissionScheduler:
+    """
+    Caps the number of operations running at once per cluster and per
+    operation class, admitting waiting operations in priority order.
+
+    Operations which are over the queue limit of their class are rejected
+    with RESOURCE_EXHAUSTED right away, so that bulk provisioning does not
+    tie up the gRPC worker threads needed by publish and unpublish.
+
+    Waiting operations hold a future which is resolved on admission, so the
+    threaded and the asyncio servers share the same queues.
+    """
+
+    def __init__(self, cluster_limit: int, limits: list = ()):
+        """
+        :param cluster_limit: Maximum operations running at once per cluster
+        :param limits: OperationLimit entries overriding the defaults
+        """
+        self._cluster_limit = cluster_limit
+        self._limits = {
+            **DEFAULT_LIMITS,
+            **{limit.operation: limit for limit in limits},
+        }
+        self._lock = threading.Lock()
+        self._clusters = collections.defaultdict(_ClusterQueue)
+
+    @contextlib.contextmanager
+    def admit(self, cluster: str, operation: str, timeout: float = None):
+        """
+        Waits until the operation may run in the cluster
+        :param cluster: The id of the cluster the operation works in
+        :type cluster: str
+        :param operation: One of PRIORITIES
+        :type operation: str
+        :param timeout: Maximum seconds to wait for admission
+        :type timeout: float
+        """
+        started = time.monotonic()
+        waiter = self._enqueue(cluster, operation)
+
+        try:
+            waiter.result(timeout)
+        except futures.TimeoutError as error:
+            if not self._withdraw(cluster, operation, waiter):
+                raise self._timed_out(cluster, operation) from error
+
+        _wait_seconds.observe(time.monotonic() - started, operation=operation)
+
+        try:
+            yield
+        finally:
+            self._release(cluster, operation)
+
+    @contextlib.asynccontextmanager
+    async def admit_async(
+        self, cluster: str, operation: str, timeout: float = None
+    ):
+        """
+        Waits like admit, for the asyncio server
+        :param cluster: The id of the cluster the operation works in
+        :type cluster: str
+        :param operation: One of PRIORITIES
+        :type operation: str
+        :param timeout: Maximum seconds to wait for admission
+        :type timeout: float
+        """
+        started = time.monotonic()
+        waiter = self._enqueue(cluster, operation)
+
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(waiter)), timeout
+            )
+        except asyncio.TimeoutError as error:
+            if not self._withdraw(cluster, operation, waiter):
+                raise self._timed_out(cluster, operation) from error
+        except BaseException:
+            # Cancelled, give the slot back if it was granted meanwhile
+            if self._withdraw(cluster, operation, waiter):
+                self._release(cluster, operation)
+            raise
+
+        _wait_seconds.observe(time.monotonic() - started, operation=operation)
+
+        try:
+            yield
+        finally:
+            self._release(cluster, operation)
+
+    def _enqueue(self, cluster: str, operation: str) -> futures.Future:
+        waiter = futures.Future()
+
+        with self._lock:
+            queue = self._clusters[cluster]
+            queue.waiting[operation].append(waiter)
+            self._dispatch(queue)
+
+            queued_limit = self._limits[operation].queued
+            if (
+                not waiter.done()
+                and queued_limit is not None
+                and len(queue.waiting[operation]) > queued_limit
+            ):
+                queue.waiting[operation].remove(waiter)
+                _rejected.inc(operation=operation, reason="queue_full")
+                logger.warning(
+                    "Rejecting %s in cluster %s, %d already waiting",
+                    operation,
+                    cluster,
+                    queued_limit,
+                )
+                raise ResourceExhausted(
+                    f"Too many {operation} operations in cluster {cluster}"
+                )
+            self._export(cluster, operation, queue)
+
+        return waiter
+
+    def _withdraw(
+        self, cluster: str, operation: str, waiter: futures.Future
+    ) -> bool:
+        """
+        Takes a waiter which gave up out of the queue, returns whether it
+        was admitted meanwhile
+        """
+        with self._lock:
+            if waiter.done():
+                return True
+            queue = self._clusters[cluster]
+            queue.waiting[operation].remove(waiter)
+            self._export(cluster, operation, queue)
+            return False
+
+    def _release(self, cluster: str, operation: str) -> None:
+        with self._lock:
+            queue = self._clusters[cluster]
+            queue.running -= 1
+            queue.running_by_operation[operation] -= 1
+            self._dispatch(queue)
+            for name in PRIORITIES:
+                self._export(cluster, name, queue)
+
+    @staticmethod
+    def _timed_out(cluster: str, operation: str) -> DeadlineExceeded:
+        _rejected.inc(operation=operation, reason="timeout")
+        return DeadlineExceeded(
+            f"Timed out waiting to run {operation} in cluster {cluster}"
+        )
+
+    def _dispatch(self, queue: _ClusterQueue) -> None:
+        while queue.running < self._cluster_limit:
+            for operation in PRIORITIES:
+                if (
+                    queue.waiting[operation]
+                    and queue.running_by_operation[operation]
+                    < self._limits[operation].running
+                ):
+                    queue.waiting[operation].popleft().set_result(None)
+                    queue.running += 1
+                    queue.running_by_operation[operation] += 1
+                    break
+            else:
+                return
+
+    @staticmethod
+    def _export(cluster: str, operation: str, queue: _ClusterQueue) -> None:
+        labels = {"cluster": cluster, "operation": operation}
+        _queued.set(len(queue.waiting[operation]), **labels)
+        _running.set(queue.running_by_operation[operation], **labels)
+
+
+def admitted(operation: str, cluster):
+    """
+    Decorates a servicer method, or coroutine method of an asyncio
+    servicer, to run through the servicer's `_admission` AdmissionScheduler
+    :param operation: One of PRIORITIES
+    :param cluster: Callable returning the cluster of a request
+    """
+
+    def decorator(method):
+        if asyncio.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def async_wrapper(self, request, context):
+                async with self._admission.admit_async(  # pylint: disable=W0212
+                    cluster(request),
+                    operation,
+                    context.time_remaining() if context is not None else None,
+                ):
+                    return await method(self, request, context)
+
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(self, request, context):
+            with self._admission.admit(  # pylint: disable=W0212
+                cluster(request),
+                operation,
+                context.time_remaining() if context is not None else None,
+            ):
+                return method(self, request, context)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,64 @@
+"""
+Runs the CSI services on a grpc.aio server
+"""
+
+import asyncio
+import logging
+from concurrent import futures
+from typing import Callable, List, Tuple
+
+import grpc
+from grpc_interceptor import AsyncExceptionToStatusInterceptor
+
+logger = logging.getLogger("AsyncServer")
+
+
+def serve(
+    endpoint: str,
+    worker_threads: int,
+    servicers: List[Tuple[Callable, Callable]],
+) -> None:
+    """
+    Serves the CSI services until the server is stopped.
+
+    The servicers are created in the event loop, as the async ones create
+    their locks and queues in their constructors. The worker threads only
+    run the filesystem calls and the cold cache listings handed to the
+    loop's executor, the RPCs themselves are served by the loop.
+    :param endpoint: The address to listen on, e.g. unix:///csi/csi.sock
+    :type endpoint: str
+    :param worker_threads: The size of the loop's default executor
+    :type worker_threads: int
+    :param servicers: Pairs of the csi_pb2_grpc function adding a servicer
+    to a server and a callable creating the servicer
+    :type servicers: list
+    :return: None
+    """
+    asyncio.run(_serve(endpoint, worker_threads, servicers))
+
+
+async def _serve(endpoint, worker_threads, servicers):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(
+        futures.ThreadPoolExecutor(max_workers=worker_threads)
+    )
+
+    server = grpc.aio.server(
+        interceptors=[
+            AsyncExceptionToStatusInterceptor(
+                status_on_unknown_exception=grpc.StatusCode.INTERNAL
+            )
+        ]
+    )
+
+    for add_to_server, create_servicer in servicers:
+        add_to_server(create_servicer(), server)
+
+    server.add_insecure_port(endpoint)
+    await server.start()
+    logger.info("Serving on %s", endpoint)
+
+    try:
+        await server.wait_for_termination()
+    finally:
+        await server.stop(None)
@@ -0,0 +1,41 @@
+"""
+Running commands from the asyncio server
+"""
+
+import asyncio
+import subprocess
+
+
+async def run(
+    command: list, stdout=subprocess.PIPE
+) -> subprocess.CompletedProcess:
+    """
+    Runs a command like subprocess.run with check=False and the output
+    decoded as UTF-8, without taking a thread while it runs.
+
+    A cancelled caller still waits for the command to exit before the
+    cancellation propagates, so that the locks it holds are not released
+    while e.g. mkfs still writes to the device.
+    :param command: The command and its arguments
+    :type command: list
+    :param stdout: Where to send the output, subprocess.PIPE to capture it
+    :return: The exit code and the captured output
+    :rtype: subprocess.CompletedProcess
+    :raises OSError: if the command cannot be started
+    """
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=stdout, stderr=subprocess.PIPE
+    )
+    communicate = asyncio.ensure_future(process.communicate())
+    try:
+        output, errors = await asyncio.shield(communicate)
+    except asyncio.CancelledError:
+        await communicate
+        raise
+
+    return subprocess.CompletedProcess(
+        command,
+        process.returncode,
+        output.decode("utf-8", "replace") if output is not None else None,
+        errors.decode("utf-8", "replace"),
+    )
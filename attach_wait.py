@@ -0,0 +1,313 @@
+"""
+Waiting for StorPool clients to apply reassignments
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Optional
+
+from grpc_interceptor.exceptions import DeadlineExceeded
+
+import metrics
+
+logger = logging.getLogger("AttachWaiter")
+
+_wait_seconds = metrics.summary(
+    "attach_wait_seconds", "Time waited for clients to apply reassignments"
+)
+_polls = metrics.counter(
+    "attach_wait_polls_total", "Client status polls while waiting, by cluster"
+)
+
+
+class _Waiter:
+    def __init__(self, client: Optional[int], generation: int, detach: bool):
+        self.client = client
+        self.generation = generation
+        self.detach = detach
+        self.done = threading.Event()
+
+
+class _ClusterPoller:
+    def __init__(self):
+        self.waiters = []
+        self.wakeup = threading.Event()
+        self.polls_since_wakeup = 0
+        self.running = False
+
+
+class AttachWaiter:
+    """
+    Waits for StorPool clients to reach the configuration generation of a
+    reassignment sent with volumesReassign.
+
+    All waits in a cluster share a single polling loop calling
+    clientsConfigDump. Polling starts at `initial_interval` whenever a new
+    wait begins and backs off exponentially up to `max_interval`, so quick
+    attachments return fast while slow ones cost few API calls.
+
+    A client which is down or gone never applies a generation, but it
+    cannot be using the volume either, so it does not hold up a detach.
+    """
+
+    def __init__(
+        self,
+        sp_api,
+        initial_interval: float,
+        max_interval: float,
+        default_timeout: float,
+    ):
+        """
+        :param sp_api: The StorPool API client
+        :param initial_interval: Seconds before the first poll of a wait
+        :param max_interval: Maximum seconds between polls
+        :param default_timeout: Maximum seconds to wait when the caller
+            sets no timeout
+        """
+        self._sp_api = sp_api
+        self._initial_interval = initial_interval
+        self._max_interval = max_interval
+        self._default_timeout = default_timeout
+        self._lock = threading.Lock()
+        self._pollers = {}
+
+    def wait(
+        self,
+        cluster_name: Optional[str],
+        client: Optional[int],
+        generation: int,
+        timeout: Optional[float] = None,
+        detach: bool = False,
+    ) -> None:
+        """
+        Waits until a client applies the configuration generation
+        :param cluster_name: StorPool cluster name, as passed to clusterName
+        :type cluster_name: str
+        :param client: The StorPool id of the client, None to wait for all
+            clients which are not down
+        :type client: int
+        :param generation: The generation returned by volumesReassign
+        :type generation: int
+        :param timeout: Maximum seconds to wait, the default timeout if None
+        :type timeout: float
+        :param detach: Whether the reassignment detaches the volume from the
+            client, in which case a down or missing client counts as done
+        :type detach: bool
+        :raises DeadlineExceeded: if the client did not apply it in time
+        """
+        started = time.monotonic()
+        if timeout is None:
+            timeout = self._default_timeout
+        waiter = _Waiter(client, generation, detach)
+
+        with self._lock:
+            poller = self._pollers.setdefault(cluster_name, _ClusterPoller())
+            poller.waiters.append(waiter)
+            poller.polls_since_wakeup = 0
+            poller.wakeup.set()
+            if not poller.running:
+                poller.running = True
+                threading.Thread(
+                    target=self._poll,
+                    args=(cluster_name, poller),
+                    name=f"attach-wait-{cluster_name}",
+                    daemon=True,
+                ).start()
+
+        if not waiter.done.wait(timeout):
+            with self._lock:
+                if waiter in poller.waiters:
+                    poller.waiters.remove(waiter)
+            raise DeadlineExceeded(
+                f"Timed out waiting for client {client} in cluster "
+                f"{cluster_name} to apply generation {generation}"
+            )
+
+        _wait_seconds.observe(time.monotonic() - started)
+
+    def _poll(
+        self, cluster_name: Optional[str], poller: _ClusterPoller
+    ) -> None:
+        while True:
+            with self._lock:
+                if not poller.waiters:
+                    poller.running = False
+                    return
+                poller.wakeup.clear()
+                interval = min(
+                    self._max_interval,
+                    self._initial_interval * 2 ** poller.polls_since_wakeup,
+                )
+                poller.polls_since_wakeup += 1
+
+            # A new wait shortens the current sleep, its client is most
+            # likely to be done early.
+            poller.wakeup.wait(interval)
+
+            try:
+                clients = self._sp_api.clientsConfigDump(
+                    clusterName=cluster_name
+                )
+            except Exception as error:  # pylint: disable=W0703
+                logger.error(
+                    "Failed to get the client status of cluster %s: %s",
+                    cluster_name,
+                    error,
+                )
+                continue
+            _polls.inc(cluster=cluster_name or "local")
+
+            with self._lock:
+                for waiter in list(poller.waiters):
+                    if self._applied(clients, waiter):
+                        poller.waiters.remove(waiter)
+                        waiter.done.set()
+
+    @staticmethod
+    def _applied(clients: list, waiter: _Waiter) -> bool:
+        for client in clients:
+            if waiter.client is None:
+                if (
+                    client.configStatus != "down"
+                    and client.clientGeneration < waiter.generation
+                ):
+                    return False
+            elif client.id == waiter.client:
+                if waiter.detach and client.configStatus == "down":
+                    return True
+                return (
+                    client.configStatus == "ok"
+                    and client.clientGeneration >= waiter.generation
+                )
+
+        return waiter.client is None or waiter.detach
+
+
+class _AsyncClusterPoller:
+    def __init__(self):
+        self.waiters = {}
+        self.wakeup = asyncio.Event()
+        self.polls_since_wakeup = 0
+        self.task = None
+
+
+class AsyncAttachWaiter:
+    """
+    Waits for StorPool clients like AttachWaiter for the asyncio server,
+    polling with the AsyncApi client from a single task per cluster.
+    """
+
+    def __init__(
+        self,
+        sp_api,
+        initial_interval: float,
+        max_interval: float,
+        default_timeout: float,
+    ):
+        """
+        :param sp_api: The AsyncApi StorPool API client
+        :param initial_interval: Seconds before the first poll of a wait
+        :param max_interval: Maximum seconds between polls
+        :param default_timeout: Maximum seconds to wait when the caller
+            sets no timeout
+        """
+        self._sp_api = sp_api
+        self._initial_interval = initial_interval
+        self._max_interval = max_interval
+        self._default_timeout = default_timeout
+        self._pollers = {}
+
+    async def wait(
+        self,
+        cluster_name: Optional[str],
+        client: Optional[int],
+        generation: int,
+        timeout: Optional[float] = None,
+        detach: bool = False,
+    ) -> None:
+        """
+        Waits until a client applies the configuration generation
+        :param cluster_name: StorPool cluster name, as passed to clusterName
+        :type cluster_name: str
+        :param client: The StorPool id of the client, None to wait for all
+            clients which are not down
+        :type client: int
+        :param generation: The generation returned by volumesReassign
+        :type generation: int
+        :param timeout: Maximum seconds to wait, the default timeout if None
+        :type timeout: float
+        :param detach: Whether the reassignment detaches the volume from the
+            client, in which case a down or missing client counts as done
+        :type detach: bool
+        :raises DeadlineExceeded: if the client did not apply it in time
+        """
+        started = time.monotonic()
+        if timeout is None:
+            timeout = self._default_timeout
+        waiter = _Waiter(client, generation, detach)
+        done = asyncio.get_running_loop().create_future()
+
+        poller = self._pollers.setdefault(cluster_name, _AsyncClusterPoller())
+        poller.waiters[waiter] = done
+        poller.polls_since_wakeup = 0
+        poller.wakeup.set()
+        if poller.task is None:
+            poller.task = asyncio.ensure_future(
+                self._poll(cluster_name, poller)
+            )
+
+        try:
+            await asyncio.wait_for(done, timeout)
+        except asyncio.TimeoutError as error:
+            raise DeadlineExceeded(
+                f"Timed out waiting for client {client} in cluster "
+                f"{cluster_name} to apply generation {generation}"
+            ) from error
+        finally:
+            poller.waiters.pop(waiter, None)
+
+        _wait_seconds.observe(time.monotonic() - started)
+
+    async def _poll(
+        self, cluster_name: Optional[str], poller: _AsyncClusterPoller
+    ) -> None:
+        try:
+            while poller.waiters:
+                poller.wakeup.clear()
+                interval = min(
+                    self._max_interval,
+                    self._initial_interval * 2 ** poller.polls_since_wakeup,
+                )
+                poller.polls_since_wakeup += 1
+
+                # A new wait shortens the current sleep, its client is most
+                # likely to be done early.
+                try:
+                    await asyncio.wait_for(poller.wakeup.wait(), interval)
+                except asyncio.TimeoutError:
+                    pass
+
+                try:
+                    clients = await self._sp_api.clientsConfigDump(
+                        clusterName=cluster_name
+                    )
+                except Exception as error:  # pylint: disable=W0703
+                    logger.error(
+                        "Failed to get the client status of cluster %s: %s",
+                        cluster_name,
+                        error,
+                    )
+                    continue
+                _polls.inc(cluster=cluster_name or "local")
+
+                for waiter, done in list(poller.waiters.items()):
+                    if AttachWaiter._applied(  # pylint: disable=W0212
+                        clients, waiter
+                    ):
+                        del poller.waiters[waiter]
+                        if not done.done():
+                            done.set_result(None)
+        finally:
+            poller.task = None
@@ -0,0 +1,328 @@
+"""
+In-memory index of the clients each volume is attached to
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import metrics
+
+logger = logging.getLogger("AttachmentIndex")
+
+_skipped = metrics.counter(
+    "attachment_index_skipped_total",
+    "Publish and unpublish calls answered without a reassignment",
+)
+
+
+class Attachment(NamedTuple):
+    """
+    A volume attached to a StorPool client
+    """
+
+    cluster_id: Optional[str]
+    client: int
+    rights: str
+
+    def on(self, cluster_id: str, client: int) -> bool:
+        """
+        Whether this is an attachment to the client in the cluster
+        """
+        return self.client == client and self.cluster_id in (None, cluster_id)
+
+
+class AttachmentIndex:
+    """
+    Maps the globalId of the volumes to their attachments, volumes missing
+    from the attachment listing are not attached anywhere.
+
+    The index is built from the attachment listing and updated after every
+    reassignment done by the driver. A volume whose reassignment failed is
+    unknown until the next resync, so that it is never reported in a state it
+    may not be in. Nothing is known before the first resync. Changes made
+    while a resync is in progress are replayed on top of the fresh listing.
+
+    Volumes may also be detached outside of the driver, so an attachment
+    found in the index is checked against a fresh listing before a publish
+    is skipped. Concurrent checks share a single listing.
+
+    The periodic resync may overlap with a listing fetched for the asyncio
+    server, each replays the changes made since it started and the newer
+    listing wins.
+    """
+
+    def __init__(self, fetch):
+        """
+        :param fetch: Callable returning the current attachments
+        """
+        self._fetch = fetch
+        self._lock = threading.Lock()
+        self._resync_lock = threading.Lock()
+        self._resynced_at = None
+        self._attachments = None
+        self._resync_changes = None
+        self._resyncs = 0
+        self._async_resync = None
+
+    def resync(self) -> None:
+        """
+        Rebuilds the index from the attachment listing
+        """
+        with self._resync_lock:
+            self._resync()
+
+    def _refresh(self) -> None:
+        requested = time.monotonic()
+        with self._resync_lock:
+            # A listing started after the request covers it
+            if self._resynced_at is None or self._resynced_at < requested:
+                self._resync()
+
+    async def _refresh_async(self, fetch) -> None:
+        requested = time.monotonic()
+        while self._resynced_at is None or self._resynced_at < requested:
+            if self._async_resync is None:
+                self._async_resync = asyncio.ensure_future(
+                    self._resync_async(fetch)
+                )
+            # Shielded, so that a cancelled check does not cancel the
+            # listing the others wait for
+            await asyncio.shield(self._async_resync)
+
+    async def _resync_async(self, fetch) -> None:
+        try:
+            started, replay_from = self._begin()
+            try:
+                listing = await fetch()
+            except BaseException:
+                self._abort()
+                raise
+            self._finish(listing, started, replay_from)
+        finally:
+            self._async_resync = None
+
+    def _resync(self) -> None:
+        started, replay_from = self._begin()
+        try:
+            listing = self._fetch()
+        except Exception:
+            self._abort()
+            raise
+        self._finish(listing, started, replay_from)
+
+    def _begin(self) -> tuple:
+        """
+        Starts recording the changes made during a resync, returns when it
+        started and where its changes start
+        """
+        with self._lock:
+            if self._resyncs == 0:
+                self._resync_changes = []
+            self._resyncs += 1
+            return time.monotonic(), len(self._resync_changes)
+
+    def _abort(self) -> None:
+        with self._lock:
+            self._resyncs -= 1
+            if self._resyncs == 0:
+                self._resync_changes = None
+
+    def _finish(self, listing, started: float, replay_from: int) -> None:
+        attachments = {}
+        for attachment in listing:
+            if attachment.snapshot or not attachment.globalId:
+                continue
+            attachments.setdefault(str(attachment.globalId), set()).add(
+                Attachment(
+                    str(attachment.clusterId).lower()
+                    if attachment.clusterId
+                    else None,
+                    attachment.client,
+                    attachment.rights,
+                )
+            )
+
+        with self._lock:
+            for change in self._resync_changes[replay_from:]:
+                change(attachments)
+            self._resyncs -= 1
+            if self._resyncs == 0:
+                self._resync_changes = None
+            if self._resynced_at is not None and self._resynced_at > started:
+                return
+            self._attachments = attachments
+            self._resynced_at = started
+
+        logger.debug("Indexed attachments of %d volumes", len(attachments))
+
+    def attached_only(
+        self, global_id: str, cluster_id: str, client: int, rights: str
+    ) -> bool:
+        """
+        Whether the volume is attached with the rights to the client and
+        nowhere else, as confirmed by a fresh attachment listing
+        :param global_id: The globalId of the volume
+        :type global_id: str
+        :param cluster_id: The id of the cluster of the client
+        :type cluster_id: str
+        :param client: The StorPool id of the client
+        :type client: int
+        :param rights: The rights of the attachment, "rw" or "ro"
+        :type rights: str
+        :rtype: bool
+        """
+        if not self._attached_only(global_id, cluster_id, client, rights):
+            return False
+
+        try:
+            self._refresh()
+        except Exception as error:  # pylint: disable=W0703
+            logger.warning("Cannot check the attachments: %s", error)
+            return False
+
+        if self._attached_only(global_id, cluster_id, client, rights):
+            _skipped.inc(operation="publish")
+            return True
+        return False
+
+    async def attached_only_async(
+        self,
+        global_id: str,
+        cluster_id: str,
+        client: int,
+        rights: str,
+        fetch,
+    ) -> bool:
+        """
+        Checks the attachment like attached_only, for the asyncio server
+        :param global_id: The globalId of the volume
+        :type global_id: str
+        :param cluster_id: The id of the cluster of the client
+        :type cluster_id: str
+        :param client: The StorPool id of the client
+        :type client: int
+        :param rights: The rights of the attachment, "rw" or "ro"
+        :type rights: str
+        :param fetch: Coroutine function returning the current attachments
+        :rtype: bool
+        """
+        if not self._attached_only(global_id, cluster_id, client, rights):
+            return False
+
+        try:
+            await self._refresh_async(fetch)
+        except Exception as error:  # pylint: disable=W0703
+            logger.warning("Cannot check the attachments: %s", error)
+            return False
+
+        if self._attached_only(global_id, cluster_id, client, rights):
+            _skipped.inc(operation="publish")
+            return True
+        return False
+
+    def _attached_only(
+        self, global_id: str, cluster_id: str, client: int, rights: str
+    ) -> bool:
+        attachments = self._known(global_id)
+        if attachments is None or len(attachments) != 1:
+            return False
+
+        (attachment,) = attachments
+        return (
+            attachment.on(cluster_id, client) and attachment.rights == rights
+        )
+
+    def detached(
+        self,
+        global_id: str,
+        cluster_id: Optional[str] = None,
+        client: Optional[int] = None,
+    ) -> bool:
+        """
+        Whether the volume is known not to be attached to the client, or to
+        any client if none is given
+        :param global_id: The globalId of the volume
+        :type global_id: str
+        :param cluster_id: The id of the cluster of the client
+        :type cluster_id: str
+        :param client: The StorPool id of the client
+        :type client: int
+        :rtype: bool
+        """
+        attachments = self._known(global_id)
+        if attachments is None:
+            return False
+
+        if client is None:
+            detached = not attachments
+        else:
+            detached = not any(
+                attachment.on(cluster_id, client) for attachment in attachments
+            )
+
+        if detached:
+            _skipped.inc(operation="unpublish")
+        return detached
+
+    def attached(
+        self, global_id: str, cluster_id: str, client: int, rights: str
+    ) -> None:
+        """
+        Records that the volume was attached to the client and detached from
+        all others
+        """
+
+        def change(attachments):
+            attachments[global_id] = {Attachment(cluster_id, client, rights)}
+
+        self._apply(change)
+
+    def detach(
+        self,
+        global_id: str,
+        cluster_id: Optional[str] = None,
+        client: Optional[int] = None,
+    ) -> None:
+        """
+        Records that the volume was detached from the client, or from all
+        clients if none is given
+        """
+
+        def change(attachments):
+            if client is None:
+                attachments[global_id] = set()
+            elif attachments.get(global_id):
+                attachments[global_id] = {
+                    attachment
+                    for attachment in attachments[global_id]
+                    if not attachment.on(cluster_id, client)
+                }
+
+        self._apply(change)
+
+    def forget(self, global_id: str) -> None:
+        """
+        Marks the attachments of the volume as unknown until the next resync
+        """
+
+        def change(attachments):
+            attachments[global_id] = None
+
+        self._apply(change)
+
+    def _known(self, global_id: str) -> Optional[set]:
+        with self._lock:
+            if self._attachments is None:
+                return None
+            attachments = self._attachments.get(global_id, set())
+            return None if attachments is None else set(attachments)
+
+    def _apply(self, change) -> None:
+        with self._lock:
+            if self._attachments is not None:
+                change(self._attachments)
+            if self._resync_changes is not None:
+                self._resync_changes.append(change)
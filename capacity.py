@@ -0,0 +1,96 @@
+"""
+Cached view of the free space in the StorPool volume templates
+"""
+
+import logging
+import threading
+from typing import NamedTuple, Optional
+
+import metrics
+from periodic import PeriodicTask
+
+logger = logging.getLogger("TemplateCapacity")
+
+_free_bytes = metrics.gauge(
+    "template_free_bytes", "Estimated free space per volume template"
+)
+
+
+class TemplateSpace(NamedTuple):
+    """
+    Space estimations for a single template
+    """
+
+    free: int
+    capacity: int
+
+
+class TemplateCapacity:
+    """
+    Keeps the estimated free space of every volume template, refreshed on a
+    timer from a single volumeTemplatesStatus call.
+    """
+
+    def __init__(self, sp_api, interval: float):
+        self._sp_api = sp_api
+        self._lock = threading.Lock()
+        self._templates = None
+        self._task = PeriodicTask(
+            "template-capacity-refresh", interval, self.refresh
+        ).start()
+
+    def refresh(self) -> None:
+        """
+        Reloads the template status from the StorPool API
+        """
+        templates = {
+            template.name: TemplateSpace(
+                template.stored.free, template.stored.capacity
+            )
+            for template in self._sp_api.volumeTemplatesStatus()
+        }
+
+        with self._lock:
+            self._templates = templates
+
+        for name, space in templates.items():
+            _free_bytes.set(space.free, template=name)
+
+    def get(self, template_name: str) -> Optional[TemplateSpace]:
+        """
+        Returns the space estimations for a template
+        :param template_name: Name of the StorPool template
+        :type template_name: str
+        :return: The estimations or None if the template is unknown
+        :rtype: TemplateSpace
+        """
+        return self._snapshot().get(template_name)
+
+    def largest_free(self) -> int:
+        """
+        Returns the free space of the template with the most free space,
+        the largest volume which may fit in any of the templates
+        """
+        return max(
+            (space.free for space in self._snapshot().values()), default=0
+        )
+
+    def cached(self, template_name: str) -> Optional[TemplateSpace]:
+        """
+        Returns the space estimations for a template only if they are
+        already cached, never calling the API
+        """
+        with self._lock:
+            if self._templates is None:
+                return None
+            return self._templates.get(template_name)
+
+    def _snapshot(self) -> dict:
+        with self._lock:
+            if self._templates is not None:
+                return self._templates
+
+        self.refresh()
+
+        with self._lock:
+            return self._templates
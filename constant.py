@@ -6,3 +6,39 @@ CSI_PLUGIN_NAME = "csi.storpool.com"
 CSI_PLUGIN_VERSION = "0.0.1"
 CSI_NODE_ID_REGEX = r"[a-z0-9]+\.[a-z0-9]+\.[0-9]{1,2}"
 DEFAULT_VOLUME_SIZE = 1073741824
+REASSIGN_BATCH_WINDOW = 0.05
+REASSIGN_BATCH_SIZE = 100
+VOLUME_INDEX_RESYNC_INTERVAL = 300
+VOLUME_LIST_REFRESH_INTERVAL = 30
+SP_GLOBAL_ID_REGEX = r"[a-z0-9]+\.[a-z0-9]+\.[a-z0-9]+"
+CAPACITY_REFRESH_INTERVAL = 30
+SNAPSHOT_LIST_REFRESH_INTERVAL = 30
+DEFAULT_FS_TYPE = "ext4"
+WARM_POOL_REFILL_INTERVAL = 30
+SP_API_TIMEOUT = 30
+SP_API_LONG_TIMEOUT = 300
+SP_API_RETRIES = 3
+SP_API_POOL_SIZE = 16
+SP_API_BACKOFF_BASE = 0.1
+SP_API_BACKOFF_MAX = 2
+SP_API_BREAKER_THRESHOLD = 5
+SP_API_BREAKER_RESET = 10
+VOLUME_INFO_CACHE_TTL = 30
+VOLUME_INFO_CACHE_SIZE = 4096
+ATTACHMENT_INDEX_RESYNC_INTERVAL = 60
+ADMISSION_CLUSTER_LIMIT = 8
+ORPHAN_SCAN_INTERVAL = 600
+ORPHAN_GRACE_PERIOD = 3600
+ORPHAN_BATCH_SIZE = 10
+ORPHAN_DELETE_RATE = 1
+ATTACH_WAIT = "reassign-wait"
+ATTACH_POLL_INITIAL_INTERVAL = 0.05
+ATTACH_POLL_MAX_INTERVAL = 1
+MOUNT_BACKEND = "syscall"
+DEVICE_WAIT_TIMEOUT = 10
+NODE_LOCK_TIMEOUT = 10
+MKFS_PROFILE = "default"
+DISCARD_MODE = "online"
+TRIM_INTERVAL = 24 * 60 * 60
+TRIM_RATE = 1 << 30
+KUBELET_DIR = "/var/lib/kubelet"
@@ -0,0 +1,247 @@
+"""
+Tracking the StorPool block devices attached to the node
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import threading
+import time
+from typing import Optional
+
+import metrics
+
+logger = logging.getLogger("DeviceWatcher")
+
+DEVICE_DIRECTORY = "/dev/storpool-byid"
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+IN_ATTRIB = 0x4
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_WATCH_MASK = (
+    IN_ATTRIB
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+)
+
+_wait_seconds = metrics.summary(
+    "device_wait_seconds", "Time staging waited for a volume's device"
+)
+_wait_timeouts = metrics.counter(
+    "device_wait_timeouts_total", "Device waits which timed out"
+)
+
+
+class DeviceWatcher:
+    """
+    Keeps the devices in /dev/storpool-byid resolved to their /dev/sp-X
+    nodes, rescanning the directory whenever inotify reports a change.
+
+    Without inotify, or while the directory does not exist yet, the
+    directory is rescanned every `poll_interval` seconds instead.
+
+    The waits of the asyncio server are futures resolved from the watcher
+    thread, so that they take no thread of their own.
+    """
+
+    def __init__(
+        self, directory: str = DEVICE_DIRECTORY, poll_interval: float = 1
+    ):
+        self._directory = directory
+        self._poll_interval = poll_interval
+        self._changed = threading.Condition()
+        self._devices = {}
+        self._async_waiters = {}
+        self._inotify_fd = None
+        self._watch = None
+        self._inotify_add_watch = None
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            self._inotify_add_watch = libc.inotify_add_watch
+            self._inotify_add_watch.argtypes = (
+                ctypes.c_int,
+                ctypes.c_char_p,
+                ctypes.c_uint32,
+            )
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            self._inotify_fd = fd
+        except (OSError, AttributeError, TypeError) as error:
+            logger.warning(
+                "Cannot use inotify, polling %s every %ss: %s",
+                directory,
+                poll_interval,
+                error,
+            )
+
+        self._add_watch()
+        self._rescan()
+        threading.Thread(
+            target=self._run, name="device-watcher", daemon=True
+        ).start()
+
+    def resolve(self, volume_name: str) -> Optional[str]:
+        """
+        Returns the block device of an attached volume
+        :param volume_name: The StorPool volume name
+        :type volume_name: str
+        :return: The /dev/sp-X path, None if the volume is not attached
+        :rtype: str
+        """
+        with self._changed:
+            return self._devices.get(volume_name)
+
+    def wait(self, volume_name: str, timeout: float) -> Optional[str]:
+        """
+        Waits for the block device of a volume to appear
+        :param volume_name: The StorPool volume name
+        :type volume_name: str
+        :param timeout: Maximum seconds to wait
+        :type timeout: float
+        :return: The /dev/sp-X path, None if it did not appear in time
+        :rtype: str
+        """
+        started = time.monotonic()
+        with self._changed:
+            found = self._changed.wait_for(
+                lambda: volume_name in self._devices, timeout
+            )
+            device = self._devices.get(volume_name)
+
+        if not found:
+            _wait_timeouts.inc()
+            return None
+
+        _wait_seconds.observe(time.monotonic() - started)
+        return device
+
+    async def wait_async(
+        self, volume_name: str, timeout: float
+    ) -> Optional[str]:
+        """
+        Waits for the block device of a volume to appear like wait, for the
+        asyncio server
+        :param volume_name: The StorPool volume name
+        :type volume_name: str
+        :param timeout: Maximum seconds to wait
+        :type timeout: float
+        :return: The /dev/sp-X path, None if it did not appear in time
+        :rtype: str
+        """
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._changed:
+            device = self._devices.get(volume_name)
+            if device is None:
+                self._async_waiters.setdefault(volume_name, []).append(waiter)
+
+        if device is None:
+            try:
+                device = await asyncio.wait_for(waiter[1], timeout)
+            except asyncio.TimeoutError:
+                _wait_timeouts.inc()
+                return None
+            finally:
+                with self._changed:
+                    waiters = self._async_waiters.get(volume_name, [])
+                    if waiter in waiters:
+                        waiters.remove(waiter)
+                        if not waiters:
+                            del self._async_waiters[volume_name]
+
+        _wait_seconds.observe(time.monotonic() - started)
+        return device
+
+    def _add_watch(self) -> None:
+        if self._inotify_fd is None or self._watch is not None:
+            return
+
+        watch = self._inotify_add_watch(
+            self._inotify_fd, os.fsencode(self._directory), IN_WATCH_MASK
+        )
+        if watch >= 0:
+            self._watch = watch
+
+    def _rescan(self) -> None:
+        devices = {}
+        try:
+            with os.scandir(self._directory) as entries:
+                for entry in entries:
+                    try:
+                        device = os.path.realpath(entry.path)
+                        if os.path.exists(device):
+                            devices[entry.name] = device
+                    except OSError:
+                        continue
+        except FileNotFoundError:
+            pass
+
+        with self._changed:
+            self._devices = devices
+            self._changed.notify_all()
+            for volume_name in list(self._async_waiters):
+                if volume_name in devices:
+                    for loop, future in self._async_waiters.pop(volume_name):
+                        loop.call_soon_threadsafe(
+                            _resolve, future, devices[volume_name]
+                        )
+
+    def _run(self) -> None:
+        while True:
+            try:
+                if self._watch is None:
+                    time.sleep(self._poll_interval)
+                    self._add_watch()
+                else:
+                    select.select([self._inotify_fd], [], [])
+                    if self._drain():
+                        self._watch = None
+                self._rescan()
+            except Exception:  # pylint: disable=W0703
+                logger.exception("Failed to rescan %s", self._directory)
+                time.sleep(self._poll_interval)
+
+    def _drain(self) -> bool:
+        """
+        Reads the pending events, returns whether the watched directory
+        itself was removed
+        """
+        removed = False
+        while True:
+            try:
+                events = os.read(self._inotify_fd, 65536)
+            except BlockingIOError:
+                return removed
+
+            offset = 0
+            while offset < len(events):
+                mask = int.from_bytes(
+                    events[offset + 4 : offset + 8], "little"
+                )
+                length = int.from_bytes(
+                    events[offset + 12 : offset + 16], "little"
+                )
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    removed = True
+                offset += 16 + length
+
+
+def _resolve(future: asyncio.Future, device: str) -> None:
+    if not future.done():
+        future.set_result(device)
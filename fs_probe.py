@@ -0,0 +1,200 @@
+"""
+Detecting the filesystem on a block device from its superblock
+"""
+
+import asyncio
+import logging
+import os
+import struct
+import subprocess
+import uuid
+from typing import NamedTuple, Optional
+
+import aio_subprocess
+import metrics
+
+logger = logging.getLogger("FsProbe")
+
+# Covers the superblocks of all supported filesystems, the btrfs one being
+# the farthest at 64 KiB.
+PROBE_SIZE = 0x10000 + 4096
+
+EXT_SUPERBLOCK = 1024
+EXT_MAGIC = 0xEF53
+EXT_UUID = 0x68
+EXT_COMPAT_HAS_JOURNAL = 0x4
+EXT_INCOMPAT_64BIT = 0x80
+# Features supported by ext3, anything else makes it ext4 as for blkid
+EXT3_INCOMPAT = 0x2 | 0x4 | 0x10
+EXT3_RO_COMPAT = 0x1 | 0x2 | 0x4
+
+XFS_MAGIC = b"XFSB"
+XFS_UUID = 32
+
+BTRFS_SUPERBLOCK = 0x10000
+BTRFS_MAGIC = b"_BHRfS_M"
+BTRFS_FSID = 0x20
+
+_probes = metrics.counter(
+    "fs_probes_total", "Block device probes, by detected filesystem and method"
+)
+
+
+class Superblock(NamedTuple):
+    """
+    The result of probing a block device
+    """
+
+    formatted: bool
+    fs_type: str
+    size: Optional[int]
+    uuid: Optional[str] = None
+
+
+EMPTY = Superblock(False, "", None)
+
+
+def _uuid(data: bytes, offset: int) -> Optional[str]:
+    value = data[offset : offset + 16]
+    if len(value) < 16 or not any(value):
+        return None
+    return str(uuid.UUID(bytes=value))
+
+
+def _probe_ext(data: bytes) -> Optional[Superblock]:
+    superblock = data[EXT_SUPERBLOCK : EXT_SUPERBLOCK + 1024]
+    if len(superblock) < 1024:
+        return None
+    if struct.unpack_from("<H", superblock, 0x38)[0] != EXT_MAGIC:
+        return None
+
+    (blocks_lo,) = struct.unpack_from("<I", superblock, 0x04)
+    (log_block_size,) = struct.unpack_from("<I", superblock, 0x18)
+    compat, incompat, ro_compat = struct.unpack_from("<III", superblock, 0x5C)
+    blocks_hi = 0
+    if incompat & EXT_INCOMPAT_64BIT:
+        (blocks_hi,) = struct.unpack_from("<I", superblock, 0x150)
+
+    if incompat & ~EXT3_INCOMPAT or ro_compat & ~EXT3_RO_COMPAT:
+        fs_type = "ext4"
+    elif compat & EXT_COMPAT_HAS_JOURNAL:
+        fs_type = "ext3"
+    else:
+        fs_type = "ext2"
+
+    blocks = blocks_hi << 32 | blocks_lo
+    return Superblock(
+        True,
+        fs_type,
+        blocks * (1024 << log_block_size),
+        _uuid(superblock, EXT_UUID),
+    )
+
+
+def _probe_xfs(data: bytes) -> Optional[Superblock]:
+    if len(data) < 16 or data[:4] != XFS_MAGIC:
+        return None
+
+    block_size, data_blocks = struct.unpack_from(">IQ", data, 4)
+    return Superblock(
+        True, "xfs", block_size * data_blocks, _uuid(data, XFS_UUID)
+    )
+
+
+def _probe_btrfs(data: bytes) -> Optional[Superblock]:
+    superblock = data[BTRFS_SUPERBLOCK:]
+    if len(superblock) < 0x78 or superblock[0x40:0x48] != BTRFS_MAGIC:
+        return None
+
+    (total_bytes,) = struct.unpack_from("<Q", superblock, 0x70)
+    return Superblock(
+        True, "btrfs", total_bytes, _uuid(superblock, BTRFS_FSID)
+    )
+
+
+def _blkid(device: str) -> Superblock:
+    result = subprocess.run(
+        _blkid_command(device),
+        check=False,
+        capture_output=True,
+        encoding="utf-8",
+    )
+    return _blkid_superblock(result)
+
+
+def _blkid_command(device: str) -> list:
+    return ["blkid", "-o", "value", "-s", "TYPE", device]
+
+
+def _blkid_superblock(result: subprocess.CompletedProcess) -> Superblock:
+    superblock = Superblock(
+        result.returncode == 0, result.stdout.strip(), None
+    )
+    _probes.inc(fs_type=superblock.fs_type or "none", method="blkid")
+    return superblock
+
+
+def probe(device: str) -> Superblock:
+    """
+    Detects the filesystem on a block device by reading its first blocks
+    once. Devices with a signature not recognized here, e.g. a partition
+    table or swap, are probed with blkid.
+    :param device: Path of the block device
+    :type device: str
+    :return: Whether the device is formatted, the filesystem type, size
+        and UUID
+    :rtype: Superblock
+    """
+    superblock = _probe_superblock(device)
+    if superblock is None:
+        superblock = _blkid(device)
+    return superblock
+
+
+async def probe_async(device: str) -> Superblock:
+    """
+    Detects the filesystem on a block device like probe, for the asyncio
+    server. The blocks are read in the loop's executor, blkid runs as an
+    asyncio subprocess.
+    :param device: Path of the block device
+    :type device: str
+    :return: Whether the device is formatted, the filesystem type, size
+        and UUID
+    :rtype: Superblock
+    """
+    superblock = await asyncio.get_running_loop().run_in_executor(
+        None, _probe_superblock, device
+    )
+    if superblock is None:
+        superblock = _blkid_superblock(
+            await aio_subprocess.run(_blkid_command(device))
+        )
+    return superblock
+
+
+def _probe_superblock(device: str) -> Optional[Superblock]:
+    """
+    Returns the filesystem found in the first blocks of the device, None if
+    it has to be probed with blkid
+    """
+    try:
+        fd = os.open(device, os.O_RDONLY | os.O_CLOEXEC)
+        try:
+            data = os.pread(fd, PROBE_SIZE, 0)
+        finally:
+            os.close(fd)
+    except OSError as error:
+        logger.warning("Cannot read %s, using blkid: %s", device, error)
+        return None
+
+    for prober in (_probe_ext, _probe_xfs, _probe_btrfs):
+        superblock = prober(data)
+        if superblock is not None:
+            _probes.inc(fs_type=superblock.fs_type, method="superblock")
+            return superblock
+
+    if not any(data):
+        _probes.inc(fs_type="none", method="superblock")
+        return EMPTY
+
+    return None
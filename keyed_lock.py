@@ -0,0 +1,239 @@
+"""
+Mutual exclusion of node operations on the same volume or path
+"""
+
+import asyncio
+import collections
+import contextlib
+import functools
+import logging
+import threading
+import time
+from concurrent import futures
+from typing import Optional
+
+from grpc_interceptor.exceptions import Aborted
+
+import metrics
+
+logger = logging.getLogger("KeyedLock")
+
+_wait_seconds = metrics.summary(
+    "node_lock_wait_seconds", "Time waited for volume and path locks"
+)
+_conflicts = metrics.counter(
+    "node_lock_conflicts_total",
+    "Calls aborted because the lock was held for too long",
+)
+
+
+class _Entry:
+    def __init__(self):
+        self.held = False
+        self.waiters = collections.deque()
+        self.users = 0
+
+
+class KeyedLock:
+    """
+    One lock per key (e.g. a volume id or a mount path), created on demand
+    and dropped once nobody holds or waits for it.
+
+    Operations on different keys run in parallel. An operation waits at
+    most `timeout` seconds for a key held by another one and is then
+    rejected with ABORTED, so that the CO retries it later.
+
+    A released key is handed over to the next waiter through a future, so
+    threads and asyncio handlers can share the locks.
+    """
+
+    def __init__(self, timeout: float):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._timeout = timeout
+
+    @contextlib.contextmanager
+    def hold(
+        self, keys: list, operation: str, timeout: Optional[float] = None
+    ):
+        """
+        Holds the locks of all keys, taken in sorted order so that
+        operations locking several keys cannot deadlock
+        :param keys: The keys to lock
+        :type keys: list[str]
+        :param operation: Name of the operation, for logs and metrics
+        :type operation: str
+        :param timeout: Maximum seconds to wait, at most the lock's timeout
+        :type timeout: float
+        :raises Aborted: if a key stays locked for too long
+        """
+        timeout = self._limit(timeout)
+        started = time.monotonic()
+        acquired = []
+        try:
+            for key in sorted(set(keys)):
+                waiter = self._acquire(key)
+                if waiter is not None:
+                    try:
+                        waiter.result(self._remaining(started, timeout))
+                    except futures.TimeoutError as error:
+                        if not self._withdraw(key, waiter):
+                            raise self._conflict(
+                                key, operation, started
+                            ) from error
+                acquired.append(key)
+
+            _wait_seconds.observe(
+                time.monotonic() - started, operation=operation
+            )
+            yield
+        finally:
+            for key in reversed(acquired):
+                self._release(key)
+
+    @contextlib.asynccontextmanager
+    async def hold_async(
+        self, keys: list, operation: str, timeout: Optional[float] = None
+    ):
+        """
+        Holds the locks of all keys like hold, for the asyncio server
+        :param keys: The keys to lock
+        :type keys: list[str]
+        :param operation: Name of the operation, for logs and metrics
+        :type operation: str
+        :param timeout: Maximum seconds to wait, at most the lock's timeout
+        :type timeout: float
+        :raises Aborted: if a key stays locked for too long
+        """
+        timeout = self._limit(timeout)
+        started = time.monotonic()
+        acquired = []
+        try:
+            for key in sorted(set(keys)):
+                waiter = self._acquire(key)
+                if waiter is not None:
+                    try:
+                        await asyncio.wait_for(
+                            asyncio.shield(asyncio.wrap_future(waiter)),
+                            self._remaining(started, timeout),
+                        )
+                    except asyncio.TimeoutError as error:
+                        if not self._withdraw(key, waiter):
+                            raise self._conflict(
+                                key, operation, started
+                            ) from error
+                    except BaseException:
+                        # Cancelled, the key is released below if it was
+                        # handed over meanwhile
+                        if self._withdraw(key, waiter):
+                            acquired.append(key)
+                        raise
+                acquired.append(key)
+
+            _wait_seconds.observe(
+                time.monotonic() - started, operation=operation
+            )
+            yield
+        finally:
+            for key in reversed(acquired):
+                self._release(key)
+
+    def _limit(self, timeout: Optional[float]) -> float:
+        if timeout is None or timeout > self._timeout:
+            return self._timeout
+        return timeout
+
+    @staticmethod
+    def _remaining(started: float, timeout: float) -> float:
+        return max(0.0, started + timeout - time.monotonic())
+
+    def _acquire(self, key: str) -> Optional[futures.Future]:
+        """
+        Takes the lock of a key if it is free, otherwise queues for it and
+        returns the future resolved when the lock is handed over
+        """
+        with self._lock:
+            entry = self._entries.setdefault(key, _Entry())
+            entry.users += 1
+            if not entry.held:
+                entry.held = True
+                return None
+
+            waiter = futures.Future()
+            entry.waiters.append(waiter)
+            return waiter
+
+    def _withdraw(self, key: str, waiter: futures.Future) -> bool:
+        """
+        Takes a waiter which gave up out of the queue, returns whether the
+        lock was handed over to it meanwhile
+        """
+        with self._lock:
+            if waiter.done():
+                return True
+
+            entry = self._entries[key]
+            entry.waiters.remove(waiter)
+            self._unref(key, entry)
+            return False
+
+    def _release(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries[key]
+            if entry.waiters:
+                entry.waiters.popleft().set_result(None)
+            else:
+                entry.held = False
+            self._unref(key, entry)
+
+    def _unref(self, key: str, entry: _Entry) -> None:
+        entry.users -= 1
+        if entry.users == 0:
+            del self._entries[key]
+
+    @staticmethod
+    def _conflict(key: str, operation: str, started: float) -> Aborted:
+        _conflicts.inc(operation=operation)
+        logger.warning(
+            "%s gave up waiting for %s after %.1fs",
+            operation,
+            key,
+            time.monotonic() - started,
+        )
+        return Aborted(f"Another operation on {key} is in progress")
+
+
+def locked(keys):
+    """
+    Decorates a servicer method, or coroutine method of an asyncio
+    servicer, to run holding the keys in the servicer's `_locks` KeyedLock
+    instance
+    :param keys: Callable returning the keys of a request
+    """
+
+    def decorator(method):
+        if asyncio.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def async_wrapper(self, request, context):
+                async with self._locks.hold_async(  # pylint: disable=W0212
+                    keys(request),
+                    method.__name__,
+                    context.time_remaining() if context is not None else None,
+                ):
+                    return await method(self, request, context)
+
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(self, request, context):
+            with self._locks.hold(  # pylint: disable=W0212
+                keys(request),
+                method.__name__,
+                context.time_remaining() if context is not None else None,
+            ):
+                return method(self, request, context)
+
+        return wrapper
+
+    return decorator
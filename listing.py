@@ -0,0 +1,132 @@
+"""
+Periodically refreshed, paginated listings of StorPool objects
+"""
+
+import bisect
+import logging
+import re
+import threading
+import time
+
+import metrics
+from periodic import PeriodicTask
+
+logger = logging.getLogger("ListingCache")
+
+_refreshes = metrics.counter(
+    "listing_refreshes_total", "Refreshes of the cached listings"
+)
+_refresh_seconds = metrics.summary(
+    "listing_refresh_seconds", "Time spent refreshing the cached listings"
+)
+_entries = metrics.gauge(
+    "listing_entries", "Number of entries in the cached listings"
+)
+
+
+class InvalidTokenError(ValueError):
+    """
+    Raised when a pagination token was not issued by the listing
+    """
+
+
+class ListingCache:
+    """
+    Keeps a snapshot of a listing sorted by key and refreshes it on a timer,
+    so that any number of list requests cost one API call per interval.
+
+    Pages are continued with the key of the last returned entry, which keeps
+    the tokens valid across refreshes even when entries come and go.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fetch,
+        key,
+        interval: float,
+        token_pattern: str,
+    ):
+        """
+        :param name: Name of the listing, used in logs and metrics
+        :param fetch: Callable returning the current list of entries
+        :param key: Callable returning the unique, sortable key of an entry
+        :param interval: Seconds between refreshes, 0 disables them
+        :param token_pattern: Regular expression the keys always match
+        """
+        self._name = name
+        self._fetch = fetch
+        self._key = key
+        self._token_pattern = re.compile(token_pattern)
+        self._lock = threading.Lock()
+        self._keys = None
+        self._entries = None
+        self._task = PeriodicTask(
+            f"{name}-listing-refresh", interval, self.refresh
+        ).start()
+
+    def refresh(self) -> None:
+        """
+        Replaces the snapshot with a fresh listing
+        """
+        started = time.monotonic()
+        entries = sorted(self._fetch(), key=self._key)
+        keys = [self._key(entry) for entry in entries]
+
+        with self._lock:
+            self._keys = keys
+            self._entries = entries
+
+        _refreshes.inc(listing=self._name)
+        _refresh_seconds.observe(
+            time.monotonic() - started, listing=self._name
+        )
+        _entries.set(len(entries), listing=self._name)
+        logger.debug("Listed %d %s", len(entries), self._name)
+
+    def entries(self) -> list:
+        """
+        Returns all entries in the current snapshot
+        :return: The entries, sorted by key
+        :rtype: list
+        """
+        return self._snapshot()[1]
+
+    def page(self, max_entries: int, starting_token: str) -> tuple:
+        """
+        Returns a single page of the current snapshot
+        :param max_entries: Maximum number of entries, 0 means no limit
+        :type max_entries: int
+        :param starting_token: The token returned with the previous page
+        :type starting_token: str
+        :return: The entries in the page and the token for the next one,
+            which is empty on the last page
+        :rtype: tuple
+        :raises InvalidTokenError: if the starting token is not valid
+        """
+        keys, entries = self._snapshot()
+
+        start = 0
+        if starting_token:
+            if not self._token_pattern.fullmatch(starting_token):
+                raise InvalidTokenError(
+                    f"Invalid {self._name} starting token: {starting_token}"
+                )
+            start = bisect.bisect_right(keys, starting_token)
+
+        end = len(entries)
+        if max_entries > 0:
+            end = min(end, start + max_entries)
+
+        next_token = keys[end - 1] if end < len(entries) else ""
+        return entries[start:end], next_token
+
+    def _snapshot(self) -> tuple:
+        with self._lock:
+            if self._entries is not None:
+                return self._keys, self._entries
+
+        self.refresh()
+
+        with self._lock:
+            return self._keys, self._entries
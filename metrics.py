@@ -0,0 +1,213 @@
+"""
+In-process metrics, exposed in the Prometheus text format
+"""
+
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+logger = logging.getLogger("Metrics")
+
+METRIC_PREFIX = "storpool_csi_"
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, description: str):
+        self.name = METRIC_PREFIX + name
+        self.description = description
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def render(self) -> list[str]:
+        """
+        Renders all samples of the metric
+        :return: Lines in the Prometheus text format
+        :rtype: list
+        """
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    """
+    A monotonically increasing value
+    """
+
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """
+        Increments the counter
+        :param amount: The value to add to the counter
+        :type amount: float
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    A value which can go up and down
+    """
+
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        """
+        Sets the gauge to a value
+        :param value: The new value
+        :type value: float
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """
+        Increments the gauge
+        :param amount: The value to add, may be negative
+        :type amount: float
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        """
+        Decrements the gauge
+        :param amount: The value to subtract
+        :type amount: float
+        """
+        self.inc(-amount, **labels)
+
+
+class Summary(_Metric):
+    """
+    Tracks the count and the sum of observed values, e.g. durations
+    """
+
+    metric_type = "summary"
+
+    def observe(self, value: float, **labels) -> None:
+        """
+        Records a single observation
+        :param value: The observed value
+        :type value: float
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            count, total = self._values.get(key, (0, 0))
+            self._values[key] = (count + 1, total + value)
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        with self._lock:
+            for labels, (count, total) in sorted(self._values.items()):
+                formatted_labels = _format_labels(labels)
+                lines.append(f"{self.name}_count{formatted_labels} {count}")
+                lines.append(f"{self.name}_sum{formatted_labels} {total}")
+        return lines
+
+
+def _register(metric_class, name: str, description: str):
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = metric_class(name, description)
+        return _registry[name]
+
+
+def counter(name: str, description: str) -> Counter:
+    """
+    Returns the counter registered with that name, creating it if needed
+    """
+    return _register(Counter, name, description)
+
+
+def gauge(name: str, description: str) -> Gauge:
+    """
+    Returns the gauge registered with that name, creating it if needed
+    """
+    return _register(Gauge, name, description)
+
+
+def summary(name: str, description: str) -> Summary:
+    """
+    Returns the summary registered with that name, creating it if needed
+    """
+    return _register(Summary, name, description)
+
+
+def render() -> str:
+    """
+    Renders all registered metrics
+    :return: The metrics in the Prometheus text format
+    :rtype: str
+    """
+    with _registry_lock:
+        registered = list(_registry.values())
+
+    lines = []
+    for metric in registered:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # pylint: disable=C0103
+        """
+        Serves the metrics on /metrics
+        """
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=W0622
+        logger.debug(format, *args)
+
+
+def start_http_server(endpoint: str) -> ThreadingHTTPServer:
+    """
+    Starts serving the metrics over HTTP in a background thread
+    :param endpoint: Address to listen on, e.g. ":9809" or "0.0.0.0:9809"
+    :type endpoint: str
+    :return: The running HTTP server
+    :rtype: ThreadingHTTPServer
+    """
+    url = urlparse(f"//{endpoint}")
+    server = ThreadingHTTPServer(
+        (url.hostname or "", url.port), _MetricsHandler
+    )
+    threading.Thread(
+        target=server.serve_forever, name="metrics", daemon=True
+    ).start()
+    logger.info("Serving metrics on %s", endpoint)
+    return server
@@ -0,0 +1,276 @@
+"""
+Formatting volumes with per StorageClass mkfs profiles
+"""
+
+import logging
+import subprocess
+import time
+import uuid
+
+import aio_subprocess
+import metrics
+
+logger = logging.getLogger("Mkfs")
+
+# StorageClass parameters passed to the node in the volume context
+PROFILE_PARAMETER = "mkfsProfile"
+INODE_RATIO_PARAMETER = "mkfsInodeRatio"
+PARAMETERS = (PROFILE_PARAMETER, INODE_RATIO_PARAMETER)
+
+# Set by the controller on volumes cloned from a formatted snapshot, whose
+# filesystem UUID is the snapshot's one until it is replaced on staging
+CLONED_FS_PARAMETER = "clonedFilesystem"
+CLONED_FS_UUID_NAMESPACE = uuid.UUID("bdc00fd0-59e0-4c5a-a56c-b63b6b7477a0")
+
+# Profile name: filesystem type: extra mkfs arguments. The fast profile
+# skips discarding the whole device, pointless on a new thin volume, and
+# leaves the ext inode tables and journal to be zeroed after mounting.
+PROFILES = {
+    "default": {},
+    "fast": {
+        "ext2": ["-E", "lazy_itable_init=1,nodiscard"],
+        "ext3": ["-E", "lazy_itable_init=1,lazy_journal_init=1,nodiscard"],
+        "ext4": ["-E", "lazy_itable_init=1,lazy_journal_init=1,nodiscard"],
+        "xfs": ["-K"],
+        "btrfs": ["--nodiscard"],
+    },
+}
+
+EXT_FILESYSTEMS = ("ext2", "ext3", "ext4")
+
+# Commands setting the UUID of an unmounted filesystem
+SET_UUID_COMMANDS = {
+    "ext2": ["tune2fs", "-U"],
+    "ext3": ["tune2fs", "-U"],
+    "ext4": ["tune2fs", "-U"],
+    "xfs": ["xfs_admin", "-U"],
+    "btrfs": ["btrfstune", "-f", "-U"],
+}
+
+_format_seconds = metrics.summary(
+    "mkfs_seconds", "Time spent formatting volumes, by filesystem and profile"
+)
+_formats = metrics.counter(
+    "mkfs_total", "Volumes formatted, by filesystem, profile and result"
+)
+
+
+class FormatError(Exception):
+    """
+    Raised when mkfs fails
+    """
+
+
+def mkfs_command(
+    device: str, fs_type: str, volume_context: dict, default_profile: str
+) -> list:
+    """
+    Builds the mkfs command line for a volume
+    :param device: The block device
+    :type device: str
+    :param fs_type: The filesystem to create
+    :type fs_type: str
+    :param volume_context: The volume context with the StorageClass
+        parameters
+    :type volume_context: dict
+    :param default_profile: Profile of volumes without mkfsProfile
+    :type default_profile: str
+    :return: The command
+    :rtype: list[str]
+    :raises ValueError: if the parameters are invalid for the filesystem
+    """
+    profile = volume_context.get(PROFILE_PARAMETER) or default_profile
+    if profile not in PROFILES:
+        raise ValueError(
+            f"Unknown {PROFILE_PARAMETER} {profile}, must be one of "
+            f"{', '.join(PROFILES)}"
+        )
+
+    command = ["mkfs." + fs_type] + PROFILES[profile].get(fs_type, [])
+
+    inode_ratio = volume_context.get(INODE_RATIO_PARAMETER)
+    if inode_ratio:
+        if fs_type not in EXT_FILESYSTEMS:
+            raise ValueError(
+                f"{INODE_RATIO_PARAMETER} is not supported for {fs_type}"
+            )
+        if not inode_ratio.isdigit():
+            raise ValueError(
+                f"Invalid {INODE_RATIO_PARAMETER} {inode_ratio}, must be a "
+                "number of bytes"
+            )
+        command += ["-i", inode_ratio]
+
+    return command + [device]
+
+
+def format_device(
+    device: str, fs_type: str, volume_context: dict, default_profile: str
+) -> None:
+    """
+    Formats a volume with the profile selected by its StorageClass
+    :param device: The block device
+    :type device: str
+    :param fs_type: The filesystem to create
+    :type fs_type: str
+    :param volume_context: The volume context with the StorageClass
+        parameters
+    :type volume_context: dict
+    :param default_profile: Profile of volumes without mkfsProfile
+    :type default_profile: str
+    :raises ValueError: if the parameters are invalid for the filesystem
+    :raises FormatError: if mkfs fails
+    """
+    command = mkfs_command(device, fs_type, volume_context, default_profile)
+    profile = volume_context.get(PROFILE_PARAMETER) or default_profile
+    logger.debug("Formatting %s with %s", device, " ".join(command))
+
+    started = time.monotonic()
+    try:
+        result = subprocess.run(
+            command,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            encoding="utf-8",
+            check=False,
+        )
+    except OSError as error:
+        _formats.inc(fs_type=fs_type, profile=profile, result="error")
+        raise FormatError(str(error)) from error
+
+    _formatted(device, fs_type, profile, started, result)
+
+
+async def format_device_async(
+    device: str, fs_type: str, volume_context: dict, default_profile: str
+) -> None:
+    """
+    Formats a volume like format_device, for the asyncio server
+    :param device: The block device
+    :type device: str
+    :param fs_type: The filesystem to create
+    :type fs_type: str
+    :param volume_context: The volume context with the StorageClass
+        parameters
+    :type volume_context: dict
+    :param default_profile: Profile of volumes without mkfsProfile
+    :type default_profile: str
+    :raises ValueError: if the parameters are invalid for the filesystem
+    :raises FormatError: if mkfs fails
+    """
+    command = mkfs_command(device, fs_type, volume_context, default_profile)
+    profile = volume_context.get(PROFILE_PARAMETER) or default_profile
+    logger.debug("Formatting %s with %s", device, " ".join(command))
+
+    started = time.monotonic()
+    try:
+        result = await aio_subprocess.run(command, stdout=subprocess.DEVNULL)
+    except OSError as error:
+        _formats.inc(fs_type=fs_type, profile=profile, result="error")
+        raise FormatError(str(error)) from error
+
+    _formatted(device, fs_type, profile, started, result)
+
+
+def _formatted(
+    device: str,
+    fs_type: str,
+    profile: str,
+    started: float,
+    result: subprocess.CompletedProcess,
+) -> None:
+    elapsed = time.monotonic() - started
+    if result.returncode != 0:
+        _formats.inc(fs_type=fs_type, profile=profile, result="error")
+        raise FormatError(result.stderr.strip())
+
+    _formats.inc(fs_type=fs_type, profile=profile, result="ok")
+    _format_seconds.observe(elapsed, fs_type=fs_type, profile=profile)
+    logger.info(
+        "Formatted %s with %s (profile %s) in %.1fs",
+        device,
+        fs_type,
+        profile,
+        elapsed,
+    )
+
+
+def cloned_fs_uuid(volume_id: str) -> str:
+    """
+    Returns the filesystem UUID of a volume cloned from a formatted
+    snapshot. It is derived from the volume id, so that it is unique and
+    only set on the first staging of the volume.
+    :param volume_id: The globalId of the volume
+    :type volume_id: str
+    :rtype: str
+    """
+    return str(uuid.uuid5(CLONED_FS_UUID_NAMESPACE, volume_id))
+
+
+def set_uuid(device: str, fs_type: str, fs_uuid: str) -> None:
+    """
+    Sets the UUID of the unmounted filesystem on a volume
+    :param device: The block device
+    :type device: str
+    :param fs_type: The filesystem on the device
+    :type fs_type: str
+    :param fs_uuid: The new UUID
+    :type fs_uuid: str
+    :raises FormatError: if the filesystem is not supported or the UUID
+        could not be set
+    """
+    command = _set_uuid_command(device, fs_type, fs_uuid)
+    try:
+        result = subprocess.run(
+            command,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            encoding="utf-8",
+            check=False,
+        )
+    except OSError as error:
+        raise FormatError(str(error)) from error
+
+    _uuid_set(device, fs_type, fs_uuid, result)
+
+
+async def set_uuid_async(device: str, fs_type: str, fs_uuid: str) -> None:
+    """
+    Sets the UUID of a filesystem like set_uuid, for the asyncio server
+    :param device: The block device
+    :type device: str
+    :param fs_type: The filesystem on the device
+    :type fs_type: str
+    :param fs_uuid: The new UUID
+    :type fs_uuid: str
+    :raises FormatError: if the filesystem is not supported or the UUID
+        could not be set
+    """
+    command = _set_uuid_command(device, fs_type, fs_uuid)
+    try:
+        result = await aio_subprocess.run(command, stdout=subprocess.DEVNULL)
+    except OSError as error:
+        raise FormatError(str(error)) from error
+
+    _uuid_set(device, fs_type, fs_uuid, result)
+
+
+def _set_uuid_command(device: str, fs_type: str, fs_uuid: str) -> list:
+    if fs_type not in SET_UUID_COMMANDS:
+        raise FormatError(f"Cannot set the UUID of a {fs_type} filesystem")
+
+    command = SET_UUID_COMMANDS[fs_type] + [fs_uuid, device]
+    logger.debug("Setting the UUID of %s with %s", device, " ".join(command))
+    return command
+
+
+def _uuid_set(
+    device: str,
+    fs_type: str,
+    fs_uuid: str,
+    result: subprocess.CompletedProcess,
+) -> None:
+    if result.returncode != 0:
+        raise FormatError(result.stderr.strip())
+
+    logger.info("Set the UUID of the %s on %s to %s", fs_type, device, fs_uuid)
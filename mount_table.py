@@ -0,0 +1,182 @@
+"""
+Indexed view of the mount table of the current mount namespace
+"""
+
+import logging
+import os
+import re
+import select
+import threading
+from typing import NamedTuple, Optional
+
+import metrics
+
+logger = logging.getLogger("MountTable")
+
+MOUNTINFO = "/proc/self/mountinfo"
+
+_ESCAPE = re.compile(r"\\([0-7]{3})")
+
+_reloads = metrics.counter(
+    "mount_table_reloads_total", "Times the mount table was parsed"
+)
+_entries = metrics.gauge("mount_table_entries", "Number of mounts")
+
+
+class Mount(NamedTuple):
+    """
+    A single line of /proc/self/mountinfo
+    """
+
+    mount_id: int
+    parent_id: int
+    device: int
+    root: str
+    target: str
+    mount_options: str
+    fs_type: str
+    source: str
+    super_options: str
+
+    @property
+    def options(self) -> str:
+        """
+        The mount options followed by the filesystem specific ones, as in
+        /proc/mounts
+        """
+        fs_options = self.super_options.split(",")[1:]
+        return ",".join([self.mount_options] + fs_options)
+
+
+def _unescape(field: str) -> str:
+    return _ESCAPE.sub(lambda match: chr(int(match.group(1), 8)), field)
+
+
+def parse_mountinfo(text: str) -> list:
+    """
+    Parses the contents of a mountinfo file
+    :param text: The contents of the file
+    :type text: str
+    :return: The mounts in mount order
+    :rtype: list[Mount]
+    """
+    mounts = []
+    for line in text.splitlines():
+        fields = line.split(" ")
+        separator = fields.index("-", 6)
+        major, minor = fields[2].split(":")
+        mounts.append(
+            Mount(
+                int(fields[0]),
+                int(fields[1]),
+                os.makedev(int(major), int(minor)),
+                _unescape(fields[3]),
+                _unescape(fields[4]),
+                fields[5],
+                fields[separator + 1],
+                _unescape(fields[separator + 2]),
+                fields[separator + 3],
+            )
+        )
+    return mounts
+
+
+class MountTable:
+    """
+    Keeps the mount table indexed by device, by source and by mount point.
+
+    The table is parsed again only after the kernel reports a change by
+    signalling POLLPRI on the open mountinfo file, so lookups between
+    changes cost a single non-blocking poll.
+    """
+
+    def __init__(self, path: str = MOUNTINFO):
+        self._lock = threading.Lock()
+        self._file = open(path, encoding="utf-8")  # pylint: disable=R1732
+        self._poll = select.poll()
+        self._poll.register(self._file, select.POLLPRI | select.POLLERR)
+        self._mounts = []
+        self._position = {}
+        self._by_device = {}
+        self._by_source = {}
+        self._by_target = {}
+        self._load()
+
+    def mounts(self) -> list:
+        """
+        Returns all mounts, in mount order
+        :rtype: list[Mount]
+        """
+        with self._lock:
+            self._refresh()
+            return list(self._mounts)
+
+    def device_mounts(self, device: int, source: str = None) -> list:
+        """
+        Returns the mounts of a block device, in mount order.
+
+        Filesystems such as btrfs report an anonymous device number instead
+        of that of their block device, so their mounts are only found by
+        the mount source.
+        :param device: The device number, e.g. st_rdev of the device node
+        :type device: int
+        :param source: The path of the device node, e.g. /dev/sp-3
+        :type source: str
+        :rtype: list[Mount]
+        """
+        with self._lock:
+            self._refresh()
+            mounts = {
+                mount.mount_id: mount
+                for mount in self._by_device.get(device, [])
+                + self._by_source.get(source, [])
+            }
+            return sorted(
+                mounts.values(),
+                key=lambda mount: self._position[mount.mount_id],
+            )
+
+    def at(self, target: str) -> Optional[Mount]:
+        """
+        Returns the topmost mount at a mount point
+        :param target: The path of the mount point
+        :type target: str
+        :return: The mount, None if nothing is mounted there
+        :rtype: Mount
+        """
+        with self._lock:
+            self._refresh()
+            return self._by_target.get(os.path.normpath(target))
+
+    def is_mount_point(self, target: str) -> bool:
+        """
+        Whether something is mounted at the path
+        """
+        return self.at(target) is not None
+
+    def _refresh(self) -> None:
+        if self._poll.poll(0):
+            self._load()
+
+    def _load(self) -> None:
+        self._file.seek(0)
+        mounts = parse_mountinfo(self._file.read())
+
+        position = {}
+        by_device = {}
+        by_source = {}
+        by_target = {}
+        for index, mount in enumerate(mounts):
+            position[mount.mount_id] = index
+            by_device.setdefault(mount.device, []).append(mount)
+            by_source.setdefault(mount.source, []).append(mount)
+            by_target[mount.target] = mount
+
+        self._mounts = mounts
+        self._position = position
+        self._by_device = by_device
+        self._by_source = by_source
+        self._by_target = by_target
+        _reloads.inc()
+        _entries.set(len(mounts))
+        logger.debug("Loaded %d mounts", len(mounts))
@@ -0,0 +1,332 @@
+"""
+Mounting and unmounting volumes on the node
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import functools
+import logging
+import os
+import subprocess
+from typing import Optional
+
+import aio_subprocess
+
+logger = logging.getLogger("Mounter")
+
+MS_RDONLY = 1
+MS_NOSUID = 2
+MS_NODEV = 4
+MS_NOEXEC = 8
+MS_SYNCHRONOUS = 16
+MS_REMOUNT = 32
+MS_MANDLOCK = 64
+MS_DIRSYNC = 128
+MS_NOATIME = 1024
+MS_NODIRATIME = 2048
+MS_BIND = 4096
+MS_REC = 16384
+MS_RELATIME = 1 << 21
+MS_STRICTATIME = 1 << 24
+MS_LAZYTIME = 1 << 25
+
+# Flags which apply to a single mount point rather than to the filesystem,
+# they have to be set with a remount for bind mounts.
+MS_PER_MOUNT = (
+    MS_RDONLY
+    | MS_NOSUID
+    | MS_NODEV
+    | MS_NOEXEC
+    | MS_NOATIME
+    | MS_NODIRATIME
+    | MS_RELATIME
+    | MS_STRICTATIME
+)
+
+# Option name: (flags to set, flags to clear)
+MOUNT_FLAGS = {
+    "defaults": (0, 0),
+    "ro": (MS_RDONLY, 0),
+    "rw": (0, MS_RDONLY),
+    "nosuid": (MS_NOSUID, 0),
+    "suid": (0, MS_NOSUID),
+    "nodev": (MS_NODEV, 0),
+    "dev": (0, MS_NODEV),
+    "noexec": (MS_NOEXEC, 0),
+    "exec": (0, MS_NOEXEC),
+    "sync": (MS_SYNCHRONOUS, 0),
+    "async": (0, MS_SYNCHRONOUS),
+    "dirsync": (MS_DIRSYNC, 0),
+    "mand": (MS_MANDLOCK, 0),
+    "nomand": (0, MS_MANDLOCK),
+    "noatime": (MS_NOATIME, 0),
+    "atime": (0, MS_NOATIME),
+    "nodiratime": (MS_NODIRATIME, 0),
+    "diratime": (0, MS_NODIRATIME),
+    "relatime": (MS_RELATIME, 0),
+    "norelatime": (0, MS_RELATIME),
+    "strictatime": (MS_STRICTATIME, 0),
+    "lazytime": (MS_LAZYTIME, 0),
+    "nolazytime": (0, MS_LAZYTIME),
+    "bind": (MS_BIND, 0),
+    "rbind": (MS_BIND | MS_REC, 0),
+    "remount": (MS_REMOUNT, 0),
+}
+
+
+class MountError(Exception):
+    """
+    Raised when mounting, unmounting or removing a mount point fails
+    """
+
+
+def parse_options(options: list) -> tuple:
+    """
+    Splits mount options into mount(2) flags and filesystem specific data
+    :param options: The options as given to mount -o
+    :type options: list
+    :return: The flags and the comma separated data
+    :rtype: tuple
+    """
+    flags = 0
+    data = []
+    for option in options:
+        if option in MOUNT_FLAGS:
+            set_flags, clear_flags = MOUNT_FLAGS[option]
+            flags = (flags | set_flags) & ~clear_flags
+        elif option:
+            data.append(option)
+
+    return flags, ",".join(data)
+
+
+class SyscallMounter:
+    """
+    Mounts with the mount(2) and umount2(2) system calls, without forking
+    """
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._mount = libc.mount
+        self._mount.argtypes = (
+            ctypes.c_char_p,
+            ctypes.c_char_p,
+            ctypes.c_char_p,
+            ctypes.c_ulong,
+            ctypes.c_char_p,
+        )
+        self._umount2 = libc.umount2
+        self._umount2.argtypes = (ctypes.c_char_p, ctypes.c_int)
+
+    def mount(
+        self, source: str, target: str, fs_type: str, options: list
+    ) -> None:
+        """
+        Mounts a block device
+        :param source: The block device
+        :param target: The mount point
+        :param fs_type: The filesystem on the device
+        :param options: The mount options
+        """
+        flags, data = parse_options(options)
+        self._call_mount(source, target, fs_type, flags, data)
+
+    def bind(self, source: str, target: str, options: list) -> None:
+        """
+        Bind mounts a directory, applying the per-mount options with a
+        remount as mount(8) does
+        :param source: The directory to bind
+        :param target: The mount point
+        :param options: The mount options
+        """
+        flags, _ = parse_options(options)
+        self._call_mount(source, target, None, MS_BIND | (flags & MS_REC), "")
+        if flags & MS_PER_MOUNT:
+            self._call_mount(
+                None,
+                target,
+                None,
+                MS_REMOUNT | MS_BIND | (flags & MS_PER_MOUNT),
+                "",
+            )
+
+    def remount_readonly(self, target: str) -> None:
+        """
+        Makes a mount point read-only
+        :param target: The mount point
+        """
+        self._call_mount(None, target, None, MS_REMOUNT | MS_RDONLY, "")
+
+    def umount(self, target: str) -> None:
+        """
+        Unmounts a mount point
+        :param target: The mount point
+        """
+        if self._umount2(os.fsencode(target), 0) != 0:
+            self._raise(f"umount {target}")
+
+    @staticmethod
+    def rmdir(path: str) -> None:
+        """
+        Removes an empty mount point directory
+        :param path: The directory
+        """
+        try:
+            os.rmdir(path)
+        except OSError as error:
+            raise MountError(f"rmdir {path}: {error.strerror}") from error
+
+    def _call_mount(
+        self,
+        source: Optional[str],
+        target: str,
+        fs_type: Optional[str],
+        flags: int,
+        data: str,
+    ) -> None:
+        result = self._mount(
+            os.fsencode(source) if source is not None else None,
+            os.fsencode(target),
+            fs_type.encode() if fs_type is not None else None,
+            flags,
+            data.encode() if data else None,
+        )
+        if result != 0:
+            self._raise(f"mount {source or ''} {target}")
+
+    @staticmethod
+    def _raise(operation: str) -> None:
+        error = ctypes.get_errno()
+        raise MountError(f"{operation}: {os.strerror(error)}")
+
+
+class SubprocessMounter:
+    """
+    Mounts by running the mount, umount and rmdir binaries.
+
+    Every method returns what `_run` returns, so that AsyncSubprocessMounter
+    only has to replace it.
+    """
+
+    def mount(
+        self, source: str, target: str, fs_type: str, options: list
+    ) -> None:
+        """
+        Mounts a block device
+        :param source: The block device
+        :param target: The mount point
+        :param fs_type: The filesystem on the device
+        :param options: The mount options
+        """
+        return self._run(
+            ["mount", "-t", fs_type, "-o", ",".join(options), source, target]
+        )
+
+    def bind(self, source: str, target: str, options: list) -> None:
+        """
+        Bind mounts a directory
+        :param source: The directory to bind
+        :param target: The mount point
+        :param options: The mount options
+        """
+        return self._run(
+            ["mount", "-o", ",".join(["bind"] + options), source, target]
+        )
+
+    def remount_readonly(self, target: str) -> None:
+        """
+        Makes a mount point read-only
+        :param target: The mount point
+        """
+        return self._run(["mount", "-o", "remount,ro", target])
+
+    def umount(self, target: str) -> None:
+        """
+        Unmounts a mount point
+        :param target: The mount point
+        """
+        return self._run(["umount", target])
+
+    def rmdir(self, path: str) -> None:
+        """
+        Removes an empty mount point directory
+        :param path: The directory
+        """
+        return self._run(["rmdir", path])
+
+    @staticmethod
+    def _run(command: list) -> None:
+        result = subprocess.run(
+            command, encoding="utf-8", capture_output=True, check=False
+        )
+        if result.returncode != 0:
+            raise MountError(result.stderr.strip())
+
+
+class AsyncSubprocessMounter(SubprocessMounter):
+    """
+    SubprocessMounter for the asyncio server, whose methods are awaited and
+    run the binaries as asyncio subprocesses
+    """
+
+    @staticmethod
+    async def _run(command: list) -> None:
+        result = await aio_subprocess.run(command)
+        if result.returncode != 0:
+            raise MountError(result.stderr.strip())
+
+
+class ExecutorMounter:
+    """
+    Runs the methods of a mounter in the loop's executor, for the asyncio
+    server. Used for the system calls, which do not wait for long.
+    """
+
+    def __init__(self, mounter):
+        self._mounter = mounter
+
+    def __getattr__(self, name):
+        method = getattr(self._mounter, name)
+
+        async def call(*args):
+            return await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(method, *args)
+            )
+
+        return call
+
+
+def get_mounter(backend: str):
+    """
+    Returns the mounter for a backend, falling back to the mount binaries
+    if the C library does not provide the system calls
+    :param backend: Either "syscall" or "subprocess"
+    :type backend: str
+    :return: The mounter
+    :rtype: SyscallMounter or SubprocessMounter
+    """
+    if backend == "syscall":
+        try:
+            return SyscallMounter()
+        except (OSError, AttributeError, TypeError) as error:
+            logger.warning(
+                "Cannot use the mount system calls, using mount(8): %s", error
+            )
+
+    return SubprocessMounter()
+
+
+def get_async_mounter(backend: str):
+    """
+    Returns the mounter for a backend like get_mounter, with methods to be
+    awaited from the asyncio server
+    :param backend: Either "syscall" or "subprocess"
+    :type backend: str
+    :return: The mounter
+    :rtype: ExecutorMounter or AsyncSubprocessMounter
+    """
+    mounter = get_mounter(backend)
+    if isinstance(mounter, SubprocessMounter):
+        return AsyncSubprocessMounter()
+    return ExecutorMounter(mounter)
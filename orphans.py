@@ -0,0 +1,180 @@
+"""
+Background detection and cleanup of CSI volumes no longer referenced by
+any persistent volume
+"""
+
+import fcntl
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+import metrics
+from periodic import PeriodicTask
+from volume_index import CSI_NAME_TAG
+
+logger = logging.getLogger("OrphanReconciler")
+
+_orphans = metrics.gauge(
+    "orphan_volumes", "CSI volumes not referenced by any known volume handle"
+)
+_orphan_bytes = metrics.gauge(
+    "orphan_volume_bytes", "Provisioned size of the orphaned CSI volumes"
+)
+_deleted = metrics.counter(
+    "orphan_volumes_deleted_total", "Orphaned CSI volumes deleted, by result"
+)
+
+
+class OrphanReconciler:
+    """
+    Periodically compares the CSI volumes in StorPool with the volume
+    handles of the persistent volumes, listed one per line in a file kept
+    up to date by the operator (e.g. from `kubectl get pv`).
+
+    A volume is an orphan only if it is missing from the file and was
+    created more than `grace_period` seconds before the file was last
+    written, so that volumes provisioned after the last export are never
+    touched. Orphans are reported, and in delete mode removed at most
+    `batch_size` per scan and `rate` per second.
+
+    Only the process holding the lock file reconciles, so that several
+    controller replicas do not race each other. The file must be on
+    storage shared by all replicas, e.g. a ReadWriteMany volume, as a
+    lock is only seen by the processes locking the same file.
+    """
+
+    def __init__(
+        self,
+        fetch,
+        delete,
+        known_handles: str,
+        lock_file: str,
+        interval: float,
+        grace_period: float,
+        batch_size: int,
+        rate: float,
+        delete_orphans: bool,
+    ):
+        """
+        :param fetch: Callable returning the CSI volumes
+        :param delete: Callable deleting a volume by its globalId
+        :param known_handles: Path of the file with the known volume handles
+        :param lock_file: Path of the file locked by the leader
+        :param interval: Seconds between scans
+        :param grace_period: Minimum age of an orphan in seconds
+        :param batch_size: Maximum number of deletions per scan
+        :param rate: Maximum number of deletions per second
+        :param delete_orphans: Whether to delete or only report orphans
+        """
+        self._fetch = fetch
+        self._delete = delete
+        self._known_handles = Path(known_handles)
+        self._lock_file = lock_file
+        self._lock_fd = None
+        self._grace_period = grace_period
+        self._batch_size = batch_size
+        self._rate = rate
+        self._delete_orphans = delete_orphans
+        self._task = PeriodicTask(
+            "orphan-reconciler", interval, self.reconcile
+        ).start()
+
+    def reconcile(self) -> None:
+        """
+        Finds the orphaned volumes and reports or deletes them
+        """
+        if not self._is_leader():
+            logger.debug("Not holding %s, skipping the scan", self._lock_file)
+            return
+
+        known = self._read_known_handles()
+        if known is None:
+            return
+        handles, exported_at = known
+
+        orphans = [
+            volume
+            for volume in self._fetch()
+            if (volume.tags or {}).get(CSI_NAME_TAG)
+            and str(volume.globalId) not in handles
+            and volume.creationTimestamp < exported_at - self._grace_period
+        ]
+        orphans.sort(key=lambda volume: volume.creationTimestamp)
+
+        _orphans.set(len(orphans))
+        _orphan_bytes.set(sum(volume.size for volume in orphans))
+
+        for volume in orphans:
+            logger.warning(
+                "Volume %s (%s, %d bytes) is not referenced by any known "
+                "volume handle",
+                volume.globalId,
+                volume.tags[CSI_NAME_TAG],
+                volume.size,
+            )
+
+        if self._delete_orphans:
+            self._delete_batch(orphans[: self._batch_size])
+
+    def _delete_batch(self, orphans: list) -> None:
+        for volume in orphans:
+            started = time.monotonic()
+            try:
+                self._delete(str(volume.globalId))
+            except Exception as error:  # pylint: disable=W0703
+                logger.error(
+                    "Failed to delete orphaned volume %s: %s",
+                    volume.globalId,
+                    error,
+                )
+                _deleted.inc(result="error")
+            else:
+                logger.info("Deleted orphaned volume %s", volume.globalId)
+                _deleted.inc(result="ok")
+
+            if self._rate > 0:
+                time.sleep(
+                    max(0.0, 1 / self._rate - (time.monotonic() - started))
+                )
+
+    def _read_known_handles(self) -> Optional[tuple]:
+        try:
+            with self._known_handles.open(encoding="utf-8") as handles_file:
+                exported_at = os.fstat(handles_file.fileno()).st_mtime
+                handles = {line.strip() for line in handles_file} - {""}
+        except OSError as error:
+            logger.error(
+                "Cannot read the known volume handles, skipping the scan: %s",
+                error,
+            )
+            return None
+
+        if not handles:
+            # An empty export is far more likely to be a failed one than a
+            # cluster without volumes, never treat everything as orphaned.
+            logger.error(
+                "%s lists no volume handles, skipping the scan",
+                self._known_handles,
+            )
+            return None
+
+        return handles, exported_at
+
+    def _is_leader(self) -> bool:
+        if self._lock_fd is not None:
+            return True
+
+        fd = os.open(self._lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+
+        logger.info(
+            "Acquired %s, reconciling orphaned volumes", self._lock_file
+        )
+        self._lock_fd = fd
+        return True
@@ -0,0 +1,68 @@
+"""
+Runs functions periodically in a background thread
+"""
+
+import logging
+import random
+import threading
+from typing import Optional
+
+logger = logging.getLogger("PeriodicTask")
+
+
+class PeriodicTask:
+    """
+    Calls a function every `interval` seconds in a daemon thread. Errors
+    are logged and do not stop the task.
+
+    With a `jitter` fraction each delay is randomly lengthened or shortened
+    by up to that fraction of the interval, so that tasks started at the
+    same time on several hosts drift apart.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        interval: float,
+        function,
+        initial_delay: Optional[float] = None,
+        jitter: float = 0.0,
+    ):
+        self._name = name
+        self._interval = interval
+        self._jitter = jitter
+        self._initial_delay = (
+            interval if initial_delay is None else initial_delay
+        )
+        self._function = function
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=name, daemon=True
+        )
+
+    def start(self) -> "PeriodicTask":
+        """
+        Starts the background thread, unless the interval is not positive
+        :return: The task itself
+        :rtype: PeriodicTask
+        """
+        if self._interval > 0:
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stops the background thread after the current run completes
+        """
+        self._stopped.set()
+
+    def _run(self) -> None:
+        delay = self._initial_delay
+        while not self._stopped.wait(delay):
+            delay = self._interval * (
+                1 + random.uniform(-self._jitter, self._jitter)
+            )
+            try:
+                self._function()
+            except Exception:  # pylint: disable=W0703
+                logger.exception("Periodic task %s failed", self._name)
@@ -0,0 +1,463 @@
+"""
+Batches volume reassignments sent to the StorPool API
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent import futures
+from typing import Optional
+
+from grpc_interceptor.exceptions import DeadlineExceeded
+
+logger = logging.getLogger("ReassignBatcher")
+
+
+class _Operation:
+    """
+    A single caller's reassignment and the time its caller gives up
+    """
+
+    def __init__(self, volume_reassign: dict, deadline: float):
+        self.volume_reassign = volume_reassign
+        self.deadline = deadline
+        self.future = futures.Future()
+
+
+class _PendingBatch:
+    """
+    Reassignments collected for a single cluster and not yet sent
+    """
+
+    def __init__(self):
+        self.operations = []
+        self.volumes = set()
+        self.closed = threading.Event()
+
+
+class ReassignBatcher:
+    """
+    Coalesces concurrent reassignments into a single volumesReassignWait
+    call per cluster, or volumesReassign call if not waiting for the
+    clients to apply them.
+
+    The first caller for a cluster opens a batch, waits for the batching
+    window to pass (or for the batch to fill up) and then sends every
+    reassignment collected in the meantime. Each caller receives the result
+    of its own reassignment.
+
+    The API rejects the whole request if a single reassignment fails, so a
+    failed batch is split in half and both halves are sent again at the
+    same time, until the failing reassignments are left on their own. Every
+    caller waits at most until its own deadline, and a reassignment is not
+    sent again once its caller has given up.
+
+    Admission control applies to every API call rather than to every
+    caller, so a batch takes a single slot however many volumes it holds.
+    """
+
+    def __init__(
+        self,
+        sp_api,
+        window: float,
+        max_size: int,
+        wait: bool = True,
+        admit=None,
+        timeout: Optional[float] = None,
+    ):
+        """
+        :param sp_api: The StorPool API client
+        :param window: Seconds to collect reassignments for a batch
+        :param max_size: Maximum reassignments in a batch
+        :param wait: Whether to wait for the clients with
+            volumesReassignWait
+        :param admit: Callable taking the cluster name and "publish" or
+            "unpublish" and returning a context manager to hold while the
+            API call runs
+        :param timeout: Maximum seconds a caller without a timeout waits
+            for its reassignment, None to wait without a limit
+        """
+        self._sp_api = sp_api
+        self._wait = wait
+        self._admit = admit
+        self._window = window
+        self._max_size = max_size
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def reassign(
+        self,
+        cluster_name: str,
+        volume_reassign: dict,
+        timeout: Optional[float] = None,
+    ) -> Optional[int]:
+        """
+        Reassigns a single volume, possibly together with other volumes
+        :param cluster_name: StorPool cluster name, as passed to clusterName
+        :type cluster_name: str
+        :param volume_reassign: A single entry of the "reassign" list
+        :type volume_reassign: dict
+        :param timeout: Maximum seconds to wait, the batcher's timeout if
+            None
+        :type timeout: float
+        :return: The configuration generation the clients must reach, None
+            if the clients already applied the reassignment
+        :rtype: int
+        :raises spapi.ApiError: if the reassignment of this volume failed
+        :raises DeadlineExceeded: if it did not complete in time
+        """
+        if self._window <= 0 or self._max_size <= 1:
+            return self._send(cluster_name, [volume_reassign])
+
+        if timeout is None:
+            timeout = self._timeout
+        operation = _Operation(
+            volume_reassign,
+            time.monotonic() + timeout if timeout is not None else None,
+        )
+
+        while True:
+            with self._lock:
+                batch = self._pending.get(cluster_name)
+                leader = batch is None
+
+                if leader:
+                    batch = _PendingBatch()
+                    self._pending[cluster_name] = batch
+                elif volume_reassign["volume"] in batch.volumes:
+                    # The same volume cannot appear twice in one request,
+                    # wait for the pending batch to go out and retry.
+                    batch = None
+
+                if batch is not None:
+                    batch.operations.append(operation)
+                    batch.volumes.add(volume_reassign["volume"])
+
+                    if len(batch.operations) >= self._max_size:
+                        self._close(cluster_name, batch)
+
+            if batch is not None:
+                break
+
+            self._pending_closed(cluster_name, operation)
+
+        if leader:
+            batch.closed.wait(self._window)
+            with self._lock:
+                self._close(cluster_name, batch)
+            # Sent from another thread, so that the leader too gives up at
+            # its own deadline
+            threading.Thread(
+                target=self._execute,
+                args=(cluster_name, batch.operations),
+                name=f"reassign-{cluster_name}",
+                daemon=True,
+            ).start()
+
+        try:
+            return operation.future.result(_remaining(operation))
+        except futures.TimeoutError as error:
+            raise _timed_out(operation) from error
+
+    def _pending_closed(
+        self, cluster_name: str, operation: _Operation
+    ) -> None:
+        with self._lock:
+            batch = self._pending.get(cluster_name)
+        if batch is not None:
+            batch.closed.wait(_remaining(operation))
+        if _remaining(operation) == 0:
+            raise _timed_out(operation)
+
+    def _close(self, cluster_name: str, batch: _PendingBatch) -> None:
+        if self._pending.get(cluster_name) is batch:
+            del self._pending[cluster_name]
+        batch.closed.set()
+
+    def _execute(self, cluster_name: str, operations: list) -> None:
+        operations = _unexpired(operations)
+        if not operations:
+            return
+
+        logger.debug(
+            "Sending %d reassignments to cluster %s",
+            len(operations),
+            cluster_name,
+        )
+
+        try:
+            generation = self._send(
+                cluster_name,
+                [operation.volume_reassign for operation in operations],
+            )
+        except Exception as error:  # pylint: disable=W0703
+            if len(operations) == 1:
+                operations[0].future.set_exception(error)
+                return
+
+            # A single volume or client may be at fault, send each half
+            # again until every caller gets the result of its own volume.
+            logger.debug(
+                "Batch of %d reassignments failed with %s, splitting it",
+                len(operations),
+                error,
+            )
+            middle = len(operations) // 2
+            other_half = threading.Thread(
+                target=self._execute,
+                args=(cluster_name, operations[middle:]),
+                name=f"reassign-{cluster_name}",
+                daemon=True,
+            )
+            other_half.start()
+            self._execute(cluster_name, operations[:middle])
+            other_half.join()
+        else:
+            for operation in operations:
+                operation.future.set_result(generation)
+
+    def _send(self, cluster_name: str, reassign: list) -> Optional[int]:
+        if self._admit is None:
+            return self._call(cluster_name, reassign)
+
+        with self._admit(cluster_name, _admission_operation(reassign)):
+            return self._call(cluster_name, reassign)
+
+    def _call(self, cluster_name: str, reassign: list) -> Optional[int]:
+        if not self._wait:
+            return self._sp_api.volumesReassign(
+                reassign, clusterName=cluster_name
+            ).generation
+
+        self._sp_api.volumesReassignWait(
+            {"reassign": reassign}, clusterName=cluster_name
+        )
+        return None
+
+
+class _AsyncPendingBatch:
+    """
+    Reassignments collected for a single cluster by the asyncio batcher
+    """
+
+    def __init__(self):
+        self.operations = []
+        self.volumes = set()
+        self.closed = asyncio.Event()
+
+
+class AsyncReassignBatcher:
+    """
+    Batches reassignments like ReassignBatcher for the asyncio server,
+    sending them with the AsyncApi client. Waiting for a batch, for its
+    result or for the API takes no thread.
+    """
+
+    def __init__(
+        self,
+        sp_api,
+        window: float,
+        max_size: int,
+        wait: bool = True,
+        admit=None,
+        timeout: Optional[float] = None,
+    ):
+        """
+        :param sp_api: The AsyncApi StorPool API client
+        :param window: Seconds to collect reassignments for a batch
+        :param max_size: Maximum reassignments in a batch
+        :param wait: Whether to wait for the clients with
+            volumesReassignWait
+        :param admit: Callable taking the cluster name and "publish" or
+            "unpublish" and returning an async context manager to hold
+            while the API call runs
+        :param timeout: Maximum seconds a caller without a timeout waits
+            for its reassignment, None to wait without a limit
+        """
+        self._sp_api = sp_api
+        self._wait = wait
+        self._admit = admit
+        self._window = window
+        self._max_size = max_size
+        self._timeout = timeout
+        self._pending = {}
+        self._sending = set()
+
+    async def reassign(
+        self,
+        cluster_name: str,
+        volume_reassign: dict,
+        timeout: Optional[float] = None,
+    ) -> Optional[int]:
+        """
+        Reassigns a single volume, possibly together with other volumes
+        :param cluster_name: StorPool cluster name, as passed to clusterName
+        :type cluster_name: str
+        :param volume_reassign: A single entry of the "reassign" list
+        :type volume_reassign: dict
+        :param timeout: Maximum seconds to wait, the batcher's timeout if
+            None
+        :type timeout: float
+        :return: The configuration generation the clients must reach, None
+            if the clients already applied the reassignment
+        :rtype: int
+        :raises spapi.ApiError: if the reassignment of this volume failed
+        :raises DeadlineExceeded: if it did not complete in time
+        """
+        if self._window <= 0 or self._max_size <= 1:
+            return await self._send(cluster_name, [volume_reassign])
+
+        if timeout is None:
+            timeout = self._timeout
+        operation = _Operation(
+            volume_reassign,
+            time.monotonic() + timeout if timeout is not None else None,
+        )
+
+        while True:
+            batch = self._pending.get(cluster_name)
+            leader = batch is None
+            if leader:
+                batch = _AsyncPendingBatch()
+                self._pending[cluster_name] = batch
+            elif volume_reassign["volume"] in batch.volumes:
+                # The same volume cannot appear twice in one request, wait
+                # for the pending batch to go out and retry.
+                try:
+                    await asyncio.wait_for(
+                        batch.closed.wait(), _remaining(operation)
+                    )
+                except asyncio.TimeoutError as error:
+                    raise _timed_out(operation) from error
+                continue
+
+            batch.operations.append(operation)
+            batch.volumes.add(volume_reassign["volume"])
+            if len(batch.operations) >= self._max_size:
+                self._close(cluster_name, batch)
+            break
+
+        if leader:
+            try:
+                await asyncio.wait_for(batch.closed.wait(), self._window)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                # Sent from its own task, so that the leader too gives up
+                # at its own deadline, and the batch goes out even if the
+                # leader is cancelled
+                self._close(cluster_name, batch)
+                task = asyncio.ensure_future(
+                    self._execute(cluster_name, batch.operations)
+                )
+                self._sending.add(task)
+                task.add_done_callback(self._sending.discard)
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(operation.future)),
+                _remaining(operation),
+            )
+        except asyncio.TimeoutError as error:
+            raise _timed_out(operation) from error
+
+    def _close(self, cluster_name: str, batch: _AsyncPendingBatch) -> None:
+        if self._pending.get(cluster_name) is batch:
+            del self._pending[cluster_name]
+        batch.closed.set()
+
+    async def _execute(self, cluster_name: str, operations: list) -> None:
+        operations = _unexpired(operations)
+        if not operations:
+            return
+
+        logger.debug(
+            "Sending %d reassignments to cluster %s",
+            len(operations),
+            cluster_name,
+        )
+
+        try:
+            generation = await self._send(
+                cluster_name,
+                [operation.volume_reassign for operation in operations],
+            )
+        except Exception as error:  # pylint: disable=W0703
+            if len(operations) == 1:
+                operations[0].future.set_exception(error)
+                return
+
+            logger.debug(
+                "Batch of %d reassignments failed with %s, splitting it",
+                len(operations),
+                error,
+            )
+            middle = len(operations) // 2
+            await asyncio.gather(
+                self._execute(cluster_name, operations[:middle]),
+                self._execute(cluster_name, operations[middle:]),
+            )
+        else:
+            for operation in operations:
+                operation.future.set_result(generation)
+
+    async def _send(self, cluster_name: str, reassign: list) -> Optional[int]:
+        if self._admit is None:
+            return await self._call(cluster_name, reassign)
+
+        async with self._admit(cluster_name, _admission_operation(reassign)):
+            return await self._call(cluster_name, reassign)
+
+    async def _call(self, cluster_name: str, reassign: list) -> Optional[int]:
+        if not self._wait:
+            result = await self._sp_api.volumesReassign(
+                reassign, clusterName=cluster_name
+            )
+            return result.generation
+
+        await self._sp_api.volumesReassignWait(
+            {"reassign": reassign}, clusterName=cluster_name
+        )
+        return None
+
+
+def _admission_operation(reassign: list) -> str:
+    """
+    Detaching has priority, a batch which only detaches some of its volumes
+    is admitted as an unpublish
+    """
+    return (
+        "unpublish"
+        if any(
+            "rw" not in volume_reassign and "ro" not in volume_reassign
+            for volume_reassign in reassign
+        )
+        else "publish"
+    )
+
+
+def _remaining(operation: _Operation) -> Optional[float]:
+    if operation.deadline is None:
+        return None
+    return max(0.0, operation.deadline - time.monotonic())
+
+
+def _timed_out(operation: _Operation) -> DeadlineExceeded:
+    return DeadlineExceeded(
+        f"Timed out reassigning {operation.volume_reassign['volume']}"
+    )
+
+
+def _unexpired(operations: list) -> list:
+    """
+    Fails the operations whose callers gave up and returns the others
+    """
+    unexpired = []
+    for operation in operations:
+        if _remaining(operation) == 0:
+            operation.future.set_exception(_timed_out(operation))
+        else:
+            unexpired.append(operation)
+    return unexpired
@@ -0,0 +1,147 @@
+"""
+Growing mounted filesystems with the kernel's online resize ioctls
+"""
+
+import fcntl
+import logging
+import os
+import struct
+import time
+from typing import Optional
+
+import metrics
+from fs_probe import probe
+
+logger = logging.getLogger("Resize")
+
+# _IOW('f', 16, __u64)
+EXT4_IOC_RESIZE_FS = 0x40086610
+# _IOR('X', 100, struct xfs_fsop_geom_v1)
+XFS_IOC_FSGEOMETRY_V1 = 0x80705864
+# _IOW('X', 110, struct xfs_growfs_data)
+XFS_IOC_FSGROWFSDATA = 0x4010586E
+# _IOW(0x94, 3, struct btrfs_ioctl_vol_args)
+BTRFS_IOC_RESIZE = 0x50009403
+BTRFS_PATH_NAME_MAX = 4087
+
+_resize_seconds = metrics.summary(
+    "resize_seconds", "Time spent growing filesystems, by filesystem"
+)
+_resizes = metrics.counter(
+    "resizes_total", "Filesystem resizes, by filesystem and result"
+)
+
+
+class ResizeError(Exception):
+    """
+    Raised when the kernel refuses to grow a filesystem
+    """
+
+
+def device_size(device: str) -> int:
+    """
+    Returns the size of a block device in bytes
+    """
+    fd = os.open(device, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        return os.lseek(fd, 0, os.SEEK_END)
+    finally:
+        os.close(fd)
+
+
+def _ioctl(mount_point: str, request: int, arg: bytes) -> bytes:
+    fd = os.open(mount_point, os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+    try:
+        return fcntl.ioctl(fd, request, arg)
+    finally:
+        os.close(fd)
+
+
+def _grow_ext(mount_point: str, device: str) -> Optional[int]:
+    block_size = os.statvfs(mount_point).f_bsize
+    blocks = device_size(device) // block_size
+    if blocks * block_size <= (probe(device).size or 0):
+        return None
+
+    _ioctl(mount_point, EXT4_IOC_RESIZE_FS, struct.pack("Q", blocks))
+    return blocks * block_size
+
+
+def _grow_xfs(mount_point: str, device: str) -> Optional[int]:
+    geometry = _ioctl(mount_point, XFS_IOC_FSGEOMETRY_V1, bytes(112))
+    (block_size,) = struct.unpack_from("I", geometry, 0)
+    imaxpct, data_blocks = struct.unpack_from("=IQ", geometry, 28)
+    blocks = device_size(device) // block_size
+    if blocks <= data_blocks:
+        return None
+
+    _ioctl(
+        mount_point, XFS_IOC_FSGROWFSDATA, struct.pack("QI4x", blocks, imaxpct)
+    )
+    return blocks * block_size
+
+
+def _grow_btrfs(mount_point: str, device: str) -> Optional[int]:
+    sector_size = os.statvfs(mount_point).f_bsize
+    size = device_size(device)
+    size -= size % sector_size
+    if size <= (probe(device).size or 0):
+        return None
+
+    _ioctl(
+        mount_point,
+        BTRFS_IOC_RESIZE,
+        struct.pack(f"q{BTRFS_PATH_NAME_MAX + 1}s", 0, b"max"),
+    )
+    return size
+
+
+GROW_FUNCTIONS = {
+    "ext3": _grow_ext,
+    "ext4": _grow_ext,
+    "xfs": _grow_xfs,
+    "btrfs": _grow_btrfs,
+}
+
+
+def grow(mount_point: str, fs_type: str, device: str) -> Optional[int]:
+    """
+    Grows a mounted filesystem to fill its block device
+    :param mount_point: Where the filesystem is mounted
+    :type mount_point: str
+    :param fs_type: The filesystem type
+    :type fs_type: str
+    :param device: The block device
+    :type device: str
+    :return: The new filesystem size, None if it already filled the device
+    :rtype: int
+    :raises KeyError: if the filesystem cannot be grown online
+    :raises ResizeError: if the kernel failed to grow the filesystem
+    """
+    grow_function = GROW_FUNCTIONS[fs_type]
+
+    started = time.monotonic()
+    try:
+        new_size = grow_function(mount_point, device)
+    except OSError as error:
+        _resizes.inc(fs_type=fs_type, result="error")
+        raise ResizeError(
+            f"Growing {fs_type} at {mount_point} failed: {error}"
+        ) from error
+
+    if new_size is None:
+        _resizes.inc(fs_type=fs_type, result="skipped")
+        logger.debug("%s at %s already fills %s", fs_type, mount_point, device)
+        return None
+
+    elapsed = time.monotonic() - started
+    _resizes.inc(fs_type=fs_type, result="ok")
+    _resize_seconds.observe(elapsed, fs_type=fs_type)
+    logger.info(
+        "Grew %s at %s to %d bytes in %.1fs",
+        fs_type,
+        mount_point,
+        new_size,
+        elapsed,
+    )
+    return new_size
@@ -5,6 +5,7 @@ Main entrypoint of the driver, starts the gRPC server
 """
 
 import argparse
+import functools
 import logging
 import os
 from concurrent import futures
@@ -13,7 +14,24 @@ import grpc
 from grpc_interceptor import ExceptionToStatusInterceptor
 from pb import csi_pb2_grpc
 
+import aio_server
+import constant
+import metrics
+import mkfs
 import services
+import trim
+from admission import OperationLimit, PRIORITIES
+
+MODES = ("controller", "node", "all")
+
+
+def pool_bucket(spec: str):
+    """
+    Parses a --warm-pool bucket, loading the warm pool only when it is used
+    """
+    from warm_pool import PoolBucket  # pylint: disable=C0415
+
+    return PoolBucket.parse(spec)
 
 
 def getargs() -> argparse.Namespace:
@@ -41,18 +59,423 @@ def getargs() -> argparse.Namespace:
         help="StorPool API authentication token",
     )
 
+    parser.add_argument(
+        "--sp-api-timeout",
+        type=float,
+        default=constant.SP_API_TIMEOUT,
+        help="Seconds to wait for a StorPool API call",
+    )
+
+    parser.add_argument(
+        "--sp-api-long-timeout",
+        type=float,
+        default=constant.SP_API_LONG_TIMEOUT,
+        help="Seconds to wait for the clients to apply a reassignment, in a "
+        "StorPool API call or, with --attach-wait poll, when the request has "
+        "no deadline",
+    )
+
+    parser.add_argument(
+        "--sp-api-retries",
+        type=int,
+        default=constant.SP_API_RETRIES,
+        help="Maximum retries of a failed idempotent StorPool API call",
+    )
+
+    parser.add_argument(
+        "--sp-api-pool-size",
+        type=int,
+        default=constant.SP_API_POOL_SIZE,
+        help="Maximum idle connections kept open to the StorPool API",
+    )
+
+    parser.add_argument(
+        "--sp-api-breaker-threshold",
+        type=int,
+        default=constant.SP_API_BREAKER_THRESHOLD,
+        help="Consecutive StorPool API failures after which calls fail "
+        "fast, 0 disables the circuit breaker",
+    )
+
+    parser.add_argument(
+        "--sp-api-breaker-reset",
+        type=float,
+        default=constant.SP_API_BREAKER_RESET,
+        help="Seconds between trial calls while the StorPool API is failing",
+    )
+
     parser.add_argument("--log", type=str, default="WARNING", help="Log level")
 
+    parser.add_argument(
+        "--mode",
+        choices=MODES,
+        default="all",
+        help="CSI services to run besides the identity service",
+    )
+
     parser.add_argument(
         "--worker-threads",
         type=int,
-        default=10,
-        help="Worker thread count for the gRPC server",
+        default=32,
+        help="Worker thread count for the gRPC server, or for the blocking "
+        "filesystem calls with --async",
+    )
+
+    parser.add_argument(
+        "--async",
+        dest="async_mode",
+        action="store_true",
+        help="Serve the CSI services from an asyncio event loop, so that "
+        "waiting for the StorPool API, for devices and for commands takes "
+        "no thread",
+    )
+
+    parser.add_argument(
+        "--reassign-batch-window",
+        type=float,
+        default=constant.REASSIGN_BATCH_WINDOW,
+        help="Seconds to collect concurrent attach/detach requests before "
+        "sending them to the StorPool API as a single batch, 0 disables "
+        "batching",
+    )
+
+    parser.add_argument(
+        "--reassign-batch-size",
+        type=int,
+        default=constant.REASSIGN_BATCH_SIZE,
+        help="Maximum number of attach/detach requests in a single batch",
+    )
+
+    parser.add_argument(
+        "--attach-wait",
+        choices=("reassign-wait", "poll"),
+        default=constant.ATTACH_WAIT,
+        help="How publish and unpublish wait for the clients: block in "
+        "volumesReassignWait or poll the client status until the request "
+        "deadline",
+    )
+
+    parser.add_argument(
+        "--attach-poll-initial-interval",
+        type=float,
+        default=constant.ATTACH_POLL_INITIAL_INTERVAL,
+        help="Seconds before the first client status poll, doubled on every "
+        "poll",
+    )
+
+    parser.add_argument(
+        "--attach-poll-max-interval",
+        type=float,
+        default=constant.ATTACH_POLL_MAX_INTERVAL,
+        help="Maximum seconds between client status polls",
+    )
+
+    parser.add_argument(
+        "--volume-index-resync-interval",
+        type=float,
+        default=constant.VOLUME_INDEX_RESYNC_INTERVAL,
+        help="Seconds between resyncs of the CSI volume name index with the "
+        "StorPool API, 0 disables resyncing",
+    )
+
+    parser.add_argument(
+        "--volume-list-refresh-interval",
+        type=float,
+        default=constant.VOLUME_LIST_REFRESH_INTERVAL,
+        help="Seconds between refreshes of the volume listing served by "
+        "ListVolumes",
+    )
+
+    parser.add_argument(
+        "--snapshot-list-refresh-interval",
+        type=float,
+        default=constant.SNAPSHOT_LIST_REFRESH_INTERVAL,
+        help="Seconds between refreshes of the snapshot listing served by "
+        "ListSnapshots",
+    )
+
+    parser.add_argument(
+        "--capacity-refresh-interval",
+        type=float,
+        default=constant.CAPACITY_REFRESH_INTERVAL,
+        help="Seconds between refreshes of the template capacity served by "
+        "GetCapacity",
+    )
+
+    parser.add_argument(
+        "--warm-pool",
+        type=pool_bucket,
+        action="append",
+        default=[],
+        metavar="TEMPLATE:SIZE:COUNT[:PARENT]",
+        help="Keep COUNT spare volumes of SIZE bytes in TEMPLATE, optionally "
+        "cloned from the PARENT snapshot holding a pre-created default "
+        "filesystem. May be repeated",
+    )
+
+    parser.add_argument(
+        "--warm-pool-refill-interval",
+        type=float,
+        default=constant.WARM_POOL_REFILL_INTERVAL,
+        help="Seconds between refills of the warm pool",
+    )
+
+    parser.add_argument(
+        "--volume-info-cache-ttl",
+        type=float,
+        default=constant.VOLUME_INFO_CACHE_TTL,
+        help="Seconds volume details are served from memory, 0 disables "
+        "the cache",
+    )
+
+    parser.add_argument(
+        "--volume-info-cache-size",
+        type=int,
+        default=constant.VOLUME_INFO_CACHE_SIZE,
+        help="Maximum number of volumes whose details are kept in memory",
+    )
+
+    parser.add_argument(
+        "--attachment-index-resync-interval",
+        type=float,
+        default=constant.ATTACHMENT_INDEX_RESYNC_INTERVAL,
+        help="Seconds between resyncs of the in-memory attachment index",
+    )
+
+    parser.add_argument(
+        "--admission-cluster-limit",
+        type=int,
+        default=constant.ADMISSION_CLUSTER_LIMIT,
+        help="Maximum controller operations running at once per cluster",
+    )
+
+    parser.add_argument(
+        "--admission-limit",
+        type=OperationLimit.parse,
+        action="append",
+        default=[],
+        metavar="OPERATION=RUNNING[:QUEUED]",
+        help="Maximum running and waiting operations of a class per cluster, "
+        "OPERATION is one of: " + ", ".join(PRIORITIES) + ". May be repeated",
+    )
+
+    parser.add_argument(
+        "--orphan-known-handles",
+        type=str,
+        default=None,
+        help="File listing the handles of all persistent volumes, one per "
+        "line. Enables reporting CSI volumes missing from it",
+    )
+
+    parser.add_argument(
+        "--orphan-delete",
+        action="store_true",
+        help="Delete the orphaned CSI volumes instead of only reporting them",
+    )
+
+    parser.add_argument(
+        "--orphan-lock-file",
+        type=str,
+        help="File on storage shared by all controller replicas, locked by "
+        "the only one looking for orphans. Orphans are not looked for "
+        "without it",
+    )
+
+    parser.add_argument(
+        "--orphan-scan-interval",
+        type=float,
+        default=constant.ORPHAN_SCAN_INTERVAL,
+        help="Seconds between scans for orphaned volumes",
+    )
+
+    parser.add_argument(
+        "--orphan-grace-period",
+        type=float,
+        default=constant.ORPHAN_GRACE_PERIOD,
+        help="Seconds a volume must have existed before the known handles "
+        "were written to be considered orphaned",
+    )
+
+    parser.add_argument(
+        "--orphan-batch-size",
+        type=int,
+        default=constant.ORPHAN_BATCH_SIZE,
+        help="Maximum orphaned volumes deleted per scan",
+    )
+
+    parser.add_argument(
+        "--orphan-delete-rate",
+        type=float,
+        default=constant.ORPHAN_DELETE_RATE,
+        help="Maximum orphaned volumes deleted per second",
+    )
+
+    parser.add_argument(
+        "--mount-backend",
+        choices=("syscall", "subprocess"),
+        default=constant.MOUNT_BACKEND,
+        help="Mount and unmount with the mount(2) and umount2(2) system calls "
+        "or by running mount(8) and umount(8)",
+    )
+
+    parser.add_argument(
+        "--device-wait-timeout",
+        type=float,
+        default=constant.DEVICE_WAIT_TIMEOUT,
+        help="Maximum seconds NodeStageVolume waits for the volume's device "
+        "to appear, bounded by the request deadline",
+    )
+
+    parser.add_argument(
+        "--node-lock-timeout",
+        type=float,
+        default=constant.NODE_LOCK_TIMEOUT,
+        help="Maximum seconds a node operation waits for another one on the "
+        "same volume or path before failing with ABORTED",
+    )
+
+    parser.add_argument(
+        "--mkfs-profile",
+        choices=tuple(mkfs.PROFILES),
+        default=constant.MKFS_PROFILE,
+        help="mkfs profile of volumes whose StorageClass does not set "
+        f"{mkfs.PROFILE_PARAMETER}",
+    )
+
+    parser.add_argument(
+        "--discard-mode",
+        choices=trim.DISCARD_MODES,
+        default=constant.DISCARD_MODE,
+        help="How volumes whose StorageClass does not set "
+        f"{trim.DISCARD_MODE_PARAMETER} discard freed blocks: online with the "
+        "discard mount option or with scheduled trims",
+    )
+
+    parser.add_argument(
+        "--trim-interval",
+        type=float,
+        default=constant.TRIM_INTERVAL,
+        help="Seconds between scheduled trims of the volumes mounted without "
+        "discard, 0 disables them",
+    )
+
+    parser.add_argument(
+        "--trim-rate",
+        type=float,
+        default=constant.TRIM_RATE,
+        help="Maximum bytes of filesystem space trimmed per second",
+    )
+
+    parser.add_argument(
+        "--kubelet-dir",
+        type=str,
+        default=constant.KUBELET_DIR,
+        help="The kubelet root directory, only volumes staged below it are "
+        "trimmed",
+    )
+
+    parser.add_argument(
+        "--metrics-endpoint",
+        type=str,
+        default=None,
+        help="Address to serve Prometheus metrics on, e.g. :9809",
     )
 
     return parser.parse_args()
 
 
+def identity_servicer(servicer_class):
+    """
+    Creates the IdentityServicer, reporting the driver as ready
+    :param servicer_class: The class of the servicer
+    :type servicer_class: type
+    :return: The identity servicer
+    :rtype: services.IdentityServicer
+    """
+    servicer = servicer_class()
+    servicer.set_ready(True)
+    return servicer
+
+
+def controller_servicer(args: argparse.Namespace, servicer_class):
+    """
+    Creates the ControllerServicer along with the StorPool API client
+    :param args: The parsed command line arguments
+    :type args: argparse.Namespace
+    :param servicer_class: The class of the servicer
+    :type servicer_class: type
+    :return: The controller servicer
+    :rtype: services.ControllerServicer
+    """
+    import spclient  # pylint: disable=C0415
+
+    spclient.configure(
+        timeout=args.sp_api_timeout,
+        long_timeout=args.sp_api_long_timeout,
+        retries=args.sp_api_retries,
+        pool_size=args.sp_api_pool_size,
+        breaker_threshold=args.sp_api_breaker_threshold,
+        breaker_reset=args.sp_api_breaker_reset,
+    )
+
+    return servicer_class(
+        sp_api_endpoint=os.environ.get(
+            "SP_API_ENDPOINT", args.sp_api_endpoint
+        ),
+        sp_api_token=os.environ.get("SP_API_TOKEN", args.sp_api_token),
+        reassign_batch_window=args.reassign_batch_window,
+        reassign_batch_size=args.reassign_batch_size,
+        volume_index_resync_interval=args.volume_index_resync_interval,
+        volume_list_refresh_interval=args.volume_list_refresh_interval,
+        capacity_refresh_interval=args.capacity_refresh_interval,
+        snapshot_list_refresh_interval=args.snapshot_list_refresh_interval,
+        warm_pool_buckets=args.warm_pool,
+        warm_pool_refill_interval=args.warm_pool_refill_interval,
+        volume_info_cache_ttl=args.volume_info_cache_ttl,
+        volume_info_cache_size=args.volume_info_cache_size,
+        attachment_index_resync_interval=(
+            args.attachment_index_resync_interval
+        ),
+        admission_cluster_limit=args.admission_cluster_limit,
+        admission_limits=args.admission_limit,
+        orphan_known_handles=os.environ.get(
+            "ORPHAN_KNOWN_HANDLES", args.orphan_known_handles
+        ),
+        orphan_delete=args.orphan_delete,
+        orphan_lock_file=args.orphan_lock_file,
+        orphan_scan_interval=args.orphan_scan_interval,
+        orphan_grace_period=args.orphan_grace_period,
+        orphan_batch_size=args.orphan_batch_size,
+        orphan_delete_rate=args.orphan_delete_rate,
+        attach_wait=args.attach_wait,
+        attach_poll_initial_interval=args.attach_poll_initial_interval,
+        attach_poll_max_interval=args.attach_poll_max_interval,
+        attach_wait_timeout=args.sp_api_long_timeout,
+    )
+
+
+def node_servicer(args: argparse.Namespace, servicer_class):
+    """
+    Creates the NodeServicer
+    :param args: The parsed command line arguments
+    :type args: argparse.Namespace
+    :param servicer_class: The class of the servicer
+    :type servicer_class: type
+    :return: The node servicer
+    :rtype: services.NodeServicer
+    """
+    return servicer_class(
+        mount_backend=args.mount_backend,
+        device_wait_timeout=args.device_wait_timeout,
+        lock_timeout=args.node_lock_timeout,
+        mkfs_profile=args.mkfs_profile,
+        discard_mode=args.discard_mode,
+        trim_interval=args.trim_interval,
+        trim_rate=args.trim_rate,
+        kubelet_dir=args.kubelet_dir,
+    )
+
+
 def main() -> None:
     """
     Main function running the gRPC server
@@ -67,6 +490,62 @@ def main() -> None:
         level=log_level,
     )
 
+    mode = os.environ.get("CSI_MODE", args.mode)
+    if mode not in MODES:
+        raise RuntimeError(f"Invalid CSI_MODE {mode}, must be one of {MODES}")
+
+    if args.async_mode:
+        servicer_classes = (
+            services.AsyncIdentityServicer,
+            services.AsyncControllerServicer,
+            services.AsyncNodeServicer,
+        )
+    else:
+        servicer_classes = (
+            services.IdentityServicer,
+            services.ControllerServicer,
+            services.NodeServicer,
+        )
+
+    # The servicers are created by the server, the asyncio ones must be
+    # created in its event loop
+    servicers = [
+        (
+            csi_pb2_grpc.add_IdentityServicer_to_server,
+            functools.partial(identity_servicer, servicer_classes[0]),
+        )
+    ]
+
+    if mode in ("controller", "all"):
+        servicers.append(
+            (
+                csi_pb2_grpc.add_ControllerServicer_to_server,
+                functools.partial(
+                    controller_servicer, args, servicer_classes[1]
+                ),
+            )
+        )
+
+    if mode in ("node", "all"):
+        servicers.append(
+            (
+                csi_pb2_grpc.add_NodeServicer_to_server,
+                functools.partial(node_servicer, args, servicer_classes[2]),
+            )
+        )
+
+    metrics_endpoint = os.environ.get(
+        "METRICS_ENDPOINT", args.metrics_endpoint
+    )
+    if metrics_endpoint:
+        metrics.start_http_server(metrics_endpoint)
+
+    csi_endpoint = os.environ.get("CSI_ENDPOINT", args.csi_endpoint)
+
+    if args.async_mode:
+        aio_server.serve(csi_endpoint, args.worker_threads, servicers)
+        return
+
     interceptors = [
         ExceptionToStatusInterceptor(
             status_on_unknown_exception=grpc.StatusCode.INTERNAL
@@ -78,26 +557,10 @@ def main() -> None:
         interceptors=interceptors,
     )
 
-    identity_servicer = services.IdentityServicer()
-    identity_servicer.set_ready(True)
+    for add_to_server, create_servicer in servicers:
+        add_to_server(create_servicer(), grpc_server)
 
-    csi_pb2_grpc.add_IdentityServicer_to_server(identity_servicer, grpc_server)
-    csi_pb2_grpc.add_ControllerServicer_to_server(
-        services.ControllerServicer(
-            sp_api_endpoint=os.environ.get(
-                "SP_API_ENDPOINT", args.sp_api_endpoint
-            ),
-            sp_api_token=os.environ.get("SP_API_TOKEN", args.sp_api_token),
-        ),
-        grpc_server,
-    )
-    csi_pb2_grpc.add_NodeServicer_to_server(
-        services.NodeServicer(), grpc_server
-    )
-
-    grpc_server.add_insecure_port(
-        os.environ.get("CSI_ENDPOINT", args.csi_endpoint)
-    )
+    grpc_server.add_insecure_port(csi_endpoint)
     grpc_server.start()
     grpc_server.wait_for_termination()
 
@@ -1,11 +1,44 @@
 """
 Contains all the services the driver must implement via gRPC
+
+The servicers are imported on first use, so that a process running only
+the node or only the controller service does not load the other one and
+its dependencies.
 """
 
-from . import identity
-from . import controller
-from . import node
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .aio_controller import AsyncControllerServicer
+    from .aio_identity import AsyncIdentityServicer
+    from .aio_node import AsyncNodeServicer
+    from .controller import ControllerServicer
+    from .identity import IdentityServicer
+    from .node import NodeServicer
+
+_SERVICERS = {
+    "IdentityServicer": "identity",
+    "ControllerServicer": "controller",
+    "NodeServicer": "node",
+    "AsyncIdentityServicer": "aio_identity",
+    "AsyncControllerServicer": "aio_controller",
+    "AsyncNodeServicer": "aio_node",
+}
+
+__all__ = [
+    "IdentityServicer",
+    "ControllerServicer",
+    "NodeServicer",
+    "AsyncIdentityServicer",
+    "AsyncControllerServicer",
+    "AsyncNodeServicer",
+]
+
+
+def __getattr__(name):
+    if name not in _SERVICERS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-IdentityServicer = identity.IdentityServicer
-ControllerServicer = controller.ControllerServicer
-NodeServicer = node.NodeServicer
+    module = importlib.import_module(f".{_SERVICERS[name]}", __name__)
+    return getattr(module, name)
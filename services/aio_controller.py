@@ -0,0 +1,362 @@
+"""
+Implement the ControllerService of the CSI spec for the asyncio server
+"""
+import asyncio
+import functools
+import logging
+
+from storpool import spapi
+from grpc_interceptor.exceptions import InvalidArgument
+
+from pb import csi_pb2
+
+import constant
+import spclient
+from admission import admitted
+from attach_wait import AsyncAttachWaiter
+from reassign import AsyncReassignBatcher
+from singleflight import deduplicated
+
+from .controller import LOCAL_CLUSTER, ControllerServicer, _volume_cluster
+
+logger = logging.getLogger("AsyncControllerService")
+
+
+# The handlers are coroutines overriding the methods of ControllerServicer
+# pylint: disable=W0236,W0246
+class AsyncControllerServicer(ControllerServicer):
+    """
+    Implements the ControllerService with coroutine handlers for the
+    grpc.aio server.
+
+    StorPool API calls, reassignment batches, admission and the waits for
+    the clients take no thread. The indexes and listings are still
+    refreshed by the threads of ControllerServicer, the listing RPCs answered
+    from them run in the loop's executor, as their cache may be cold.
+    """
+
+    def __init__(
+        self,
+        sp_api_endpoint: str,
+        sp_api_token: str,
+        reassign_batch_window: float = constant.REASSIGN_BATCH_WINDOW,
+        reassign_batch_size: int = constant.REASSIGN_BATCH_SIZE,
+        attach_wait: str = constant.ATTACH_WAIT,
+        attach_poll_initial_interval: float = (
+            constant.ATTACH_POLL_INITIAL_INTERVAL
+        ),
+        attach_poll_max_interval: float = constant.ATTACH_POLL_MAX_INTERVAL,
+        attach_wait_timeout: float = constant.SP_API_LONG_TIMEOUT,
+        **kwargs,
+    ):
+        """
+        Takes the arguments of ControllerServicer, must be called from the
+        event loop the servicer runs in
+        """
+        super().__init__(
+            sp_api_endpoint,
+            sp_api_token,
+            reassign_batch_window=reassign_batch_window,
+            reassign_batch_size=reassign_batch_size,
+            attach_wait=attach_wait,
+            attach_poll_initial_interval=attach_poll_initial_interval,
+            attach_poll_max_interval=attach_poll_max_interval,
+            attach_wait_timeout=attach_wait_timeout,
+            **kwargs,
+        )
+
+        self._async_api = spclient.get_async_api(sp_api_endpoint, sp_api_token)
+        self._reassign_batcher = AsyncReassignBatcher(
+            self._async_api,
+            reassign_batch_window,
+            reassign_batch_size,
+            wait=attach_wait == "reassign-wait",
+            admit=self._admit_reassign_async,
+            timeout=attach_wait_timeout,
+        )
+        self._attach_waiter = AsyncAttachWaiter(
+            self._async_api,
+            attach_poll_initial_interval,
+            attach_poll_max_interval,
+            attach_wait_timeout,
+        )
+
+    async def ControllerGetCapabilities(self, request, context):
+        return super().ControllerGetCapabilities(request, context)
+
+    @deduplicated(lambda request: f"name:{request.name}")
+    @admitted("create", lambda request: LOCAL_CLUSTER)
+    async def CreateVolume(self, request, context):
+        volume_size, volume_source = self._check_create_volume(request)
+
+        existing = self._existing_volume_response(request, volume_source)
+        if existing is not None:
+            return existing
+
+        parent_size = (
+            await self._volume_source_size_async(request)
+            if volume_source
+            else None
+        )
+        volume_create = self._volume_create(
+            request, volume_size, volume_source, parent_size
+        )
+        volume_size = volume_create["size"]
+
+        if self._warm_pool is not None and not volume_source:
+            spare = await self._warm_pool.claim_async(
+                self._async_api,
+                request.parameters["template"],
+                volume_size,
+                self._default_fs_requested(request),
+                volume_create["tags"],
+            )
+            if spare is not None:
+                return self._spare_response(request, spare, volume_size)
+
+        self._check_template_space(request, volume_size)
+
+        try:
+            volume_create_result = await self._async_api.volumeCreate(
+                volume_create
+            )
+        except spapi.ApiError as error:
+            raise self._create_volume_error(error) from error
+
+        return self._created_volume_response(
+            request, volume_create_result, volume_size, volume_source
+        )
+
+    @deduplicated(lambda request: f"volume:{request.volume_id}")
+    @admitted("delete", _volume_cluster)
+    async def DeleteVolume(self, request, context):
+        if not request.volume_id:
+            raise InvalidArgument("Missing volume name")
+
+        logger.info("Deleting volume %s", request.volume_id)
+
+        try:
+            await self._async_api.volumeDelete(f"~{request.volume_id}")
+            logger.debug("Successfully deleted volume %s", request.volume_id)
+        except spapi.ApiError as error:
+            self._check_delete_volume_error(request, error)
+
+        return self._deleted_volume_response(request)
+
+    async def ValidateVolumeCapabilities(self, request, context):
+        self._check_validate_volume_capabilities(request)
+
+        try:
+            await self._volume_info.get_async(
+                request.volume_id, self._fetch_volume_info
+            )
+        except spapi.ApiError as error:
+            self._check_validated_volume_error(request, error)
+
+        return self._validate_volume_capabilities_response(request)
+
+    async def ListVolumes(self, request, context):
+        return await self._in_executor(super().ListVolumes, request, context)
+
+    async def GetCapacity(self, request, context):
+        return await self._in_executor(super().GetCapacity, request, context)
+
+    @deduplicated(lambda request: f"volume:{request.volume_id}")
+    async def ControllerPublishVolume(self, request, context):
+        sp_cluster_id, sp_node_id, rights = self._publish_target(request)
+
+        if await self._attachment_index.attached_only_async(
+            request.volume_id,
+            sp_cluster_id,
+            sp_node_id,
+            rights,
+            self._async_api.attachmentsList,
+        ):
+            return self._already_published_response(request)
+
+        volume_reassign = {
+            "volume": f"~{request.volume_id}",
+            rights: [sp_node_id],
+            "detach": "all",
+        }
+
+        try:
+            generation = await self._reassign_batcher.reassign(
+                f"~{sp_cluster_id}",
+                volume_reassign,
+                context.time_remaining() if context is not None else None,
+            )
+            await self._wait_for_clients_async(
+                f"~{sp_cluster_id}", sp_node_id, generation, context
+            )
+        except spapi.ApiError as error:
+            self._attachment_index.forget(request.volume_id)
+            raise self._publish_error(request, error) from error
+        except BaseException:
+            self._attachment_index.forget(request.volume_id)
+            raise
+
+        self._attachment_index.attached(
+            request.volume_id, sp_cluster_id, sp_node_id, rights
+        )
+
+        return csi_pb2.ControllerPublishVolumeResponse(
+            publish_context={"readonly": str(request.readonly)}
+        )
+
+    @deduplicated(lambda request: f"volume:{request.volume_id}")
+    async def ControllerUnpublishVolume(self, request, context):
+        (
+            cluster_name,
+            sp_cluster_id,
+            sp_node_id,
+            volume_reassign,
+        ) = self._unpublish_target(request)
+
+        if self._attachment_index.detached(
+            request.volume_id, sp_cluster_id, sp_node_id
+        ):
+            logger.debug("Volume %s is already detached", request.volume_id)
+            return csi_pb2.ControllerUnpublishVolumeResponse()
+
+        try:
+            generation = await self._reassign_batcher.reassign(
+                cluster_name,
+                volume_reassign,
+                context.time_remaining() if context is not None else None,
+            )
+            await self._wait_for_clients_async(
+                cluster_name, sp_node_id, generation, context, detach=True
+            )
+        except spapi.ApiError as error:
+            self._attachment_index.forget(request.volume_id)
+            raise self._unpublish_error(request, error) from error
+        except BaseException:
+            self._attachment_index.forget(request.volume_id)
+            raise
+
+        self._attachment_index.detach(
+            request.volume_id, sp_cluster_id, sp_node_id
+        )
+
+        return csi_pb2.ControllerUnpublishVolumeResponse()
+
+    @deduplicated(lambda request: f"snapshot:{request.name}")
+    async def CreateSnapshot(self, request, context):
+        existing = self._existing_snapshot_response(request)
+        if existing is not None:
+            return existing
+
+        try:
+            # A snapshot is the size of its source volume
+            volume = await self._volume_info.get_async(
+                request.source_volume_id, self._fetch_volume_info
+            )
+            snapshot_create_result = await self._async_api.snapshotCreate(
+                f"~{request.source_volume_id}",
+                self._snapshot_create(request),
+            )
+        except spapi.ApiError as error:
+            raise self._create_snapshot_error(request, error) from error
+
+        return self._created_snapshot_response(
+            request, snapshot_create_result, volume.size
+        )
+
+    async def DeleteSnapshot(self, request, context):
+        if not request.snapshot_id:
+            raise InvalidArgument("Missing snapshot id")
+
+        logger.info("Deleting snapshot %s", request.snapshot_id)
+
+        try:
+            await self._async_api.snapshotDelete(f"~{request.snapshot_id}")
+            logger.debug(
+                "Successfully deleted snapshot %s", request.snapshot_id
+            )
+        except spapi.ApiError as error:
+            self._check_delete_snapshot_error(request, error)
+
+        self._snapshot_index.remove(request.snapshot_id)
+
+        return csi_pb2.DeleteSnapshotResponse()
+
+    async def ListSnapshots(self, request, context):
+        return await self._in_executor(super().ListSnapshots, request, context)
+
+    @deduplicated(lambda request: f"volume:{request.volume_id}")
+    @admitted("expand", _volume_cluster)
+    async def ControllerExpandVolume(self, request, context):
+        expand_volume_response, new_volume_size = self._expand_volume(request)
+
+        try:
+            volume = await self._volume_info.get_async(
+                request.volume_id, self._fetch_volume_info
+            )
+            if volume.size >= new_volume_size:
+                return self._already_expanded_response(
+                    request, expand_volume_response, volume.size
+                )
+
+            try:
+                await self._async_api.volumeUpdate(
+                    f"~{request.volume_id}", {"size": new_volume_size}
+                )
+            finally:
+                self._volume_info.invalidate(request.volume_id)
+        except spapi.ApiError as error:
+            raise self._expand_volume_error(error) from error
+
+        expand_volume_response.capacity_bytes = new_volume_size
+
+        return expand_volume_response
+
+    @staticmethod
+    async def _in_executor(method, request, context):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(method, request, context)
+        )
+
+    async def _fetch_volume_info(self, global_id):
+        return await self._async_api.volumeInfo(f"~{global_id}")
+
+    async def _volume_source_size_async(self, request):
+        source = request.volume_content_source
+        try:
+            if source.HasField("snapshot"):
+                snapshot = await self._async_api.snapshotInfo(
+                    f"~{source.snapshot.snapshot_id}"
+                )
+                return snapshot.size
+            volume = await self._volume_info.get_async(
+                source.volume.volume_id, self._fetch_volume_info
+            )
+            return volume.size
+        except spapi.ApiError as error:
+            raise self._volume_source_error(error) from error
+
+    def _admit_reassign_async(self, cluster_name, operation):
+        # Reassignments go to "~<cluster id>", or to the local cluster
+        return self._admission.admit_async(
+            cluster_name[1:] if cluster_name else LOCAL_CLUSTER, operation
+        )
+
+    async def _wait_for_clients_async(
+        self, cluster_name, client, generation, context, detach=False
+    ):
+        if generation is None:
+            return
+
+        await self._attach_waiter.wait(
+            cluster_name,
+            client,
+            generation,
+            context.time_remaining() if context is not None else None,
+            detach,
+        )
+
+    def _delete_orphan(self, global_id):
+        # Called from the thread of the orphan reconciler
+        ControllerServicer.DeleteVolume(
+            self, csi_pb2.DeleteVolumeRequest(volume_id=global_id), None
+        )
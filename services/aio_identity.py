@@ -0,0 +1,22 @@
+"""
+Implement the Identity service for the asyncio server
+"""
+from .identity import IdentityServicer
+
+
+# The handlers are coroutines overriding the methods of IdentityServicer
+# pylint: disable=W0236,W0246
+class AsyncIdentityServicer(IdentityServicer):
+    """
+    Implements IdentityService with coroutine handlers for the grpc.aio
+    server
+    """
+
+    async def GetPluginInfo(self, request, context):
+        return super().GetPluginInfo(request, context)
+
+    async def GetPluginCapabilities(self, request, context):
+        return super().GetPluginCapabilities(request, context)
+
+    async def Probe(self, request, context):
+        return super().Probe(request, context)
@@ -0,0 +1,209 @@
+"""
+Implement the NodeService of the CSI spec for the asyncio server
+"""
+import asyncio
+import functools
+import logging
+from pathlib import Path
+
+from grpc_interceptor.exceptions import InvalidArgument
+
+from pb import csi_pb2
+
+import constant
+from fs_probe import probe_async
+from keyed_lock import locked
+from mkfs import FormatError, format_device_async, set_uuid_async
+from mounter import MountError, get_async_mounter
+
+from .node import NodeServicer, volume_is_mounted
+
+logger = logging.getLogger("AsyncNodeService")
+
+
+# The handlers are coroutines overriding the methods of NodeServicer
+# pylint: disable=W0236,W0246
+class AsyncNodeServicer(NodeServicer):
+    """
+    Implements the NodeService with coroutine handlers for the grpc.aio
+    server.
+
+    Waiting for a device, for a lock and for mkfs, mount and the other
+    commands takes no thread. Reading the mount table, the superblocks and
+    the other short filesystem calls run in the loop's executor.
+    """
+
+    def __init__(self, mount_backend: str = constant.MOUNT_BACKEND, **kwargs):
+        """
+        Takes the arguments of NodeServicer, must be called from the event
+        loop the servicer runs in
+        """
+        super().__init__(mount_backend=mount_backend, **kwargs)
+        self._async_mounter = get_async_mounter(mount_backend)
+
+    async def NodeGetInfo(self, request, context):
+        return super().NodeGetInfo(request, context)
+
+    async def NodeGetCapabilities(self, request, context):
+        return super().NodeGetCapabilities(request, context)
+
+    @locked(
+        lambda request: [
+            f"volume:{request.volume_id}",
+            f"path:{request.staging_target_path}",
+        ]
+    )
+    async def NodeStageVolume(self, request, context):
+        self._check_stage_volume(request)
+
+        # The device may show up a moment after ControllerPublishVolume
+        # returns, wait for it rather than fail into the CO's backoff.
+        device = await self._devices.wait_async(
+            request.volume_id, self._device_wait_time(context)
+        )
+        if device is None:
+            raise self._device_missing_error(request)
+
+        if request.volume_capability.WhichOneof("access_type") != "mount":
+            # Raw block volumes are published straight from their device
+            logger.info(
+                "Staging block volume %s, nothing to do", request.volume_id
+            )
+            return csi_pb2.NodeStageVolumeResponse()
+
+        volume_requested_fs, mount_options = self._stage_options(request)
+
+        if await self._in_executor(
+            volume_is_mounted, self._mounts, request.volume_id
+        ):
+            await self._in_executor(self._check_staged, request, mount_options)
+            return csi_pb2.NodeStageVolumeResponse()
+
+        superblock = await probe_async(device)
+        if not superblock.formatted:
+            logger.debug(
+                "Volume %s is not formatted, formatting with %s",
+                request.volume_id,
+                volume_requested_fs,
+            )
+            try:
+                await format_device_async(
+                    device,
+                    volume_requested_fs,
+                    request.volume_context,
+                    self._mkfs_profile,
+                )
+            except ValueError as error:
+                raise InvalidArgument(str(error)) from error
+            except FormatError as error:
+                raise self._format_error(request, error) from error
+        else:
+            self._check_formatted(request, superblock, volume_requested_fs)
+
+            fs_uuid = self._cloned_fs_uuid(request, superblock)
+            if fs_uuid is not None:
+                try:
+                    await set_uuid_async(device, superblock.fs_type, fs_uuid)
+                except FormatError as error:
+                    raise self._set_uuid_error(request, error) from error
+
+        logger.debug(
+            "Volume %s is not mounted, mounting at %s",
+            request.volume_id,
+            request.staging_target_path,
+        )
+
+        try:
+            await self._async_mounter.mount(
+                device,
+                request.staging_target_path,
+                volume_requested_fs,
+                mount_options.split(","),
+            )
+        except MountError as error:
+            raise self._mount_error(request, error) from error
+
+        return csi_pb2.NodeStageVolumeResponse()
+
+    @locked(
+        lambda request: [
+            f"volume:{request.volume_id}",
+            f"path:{request.staging_target_path}",
+        ]
+    )
+    async def NodeUnstageVolume(self, request, context):
+        if not await self._in_executor(self._check_unstage_volume, request):
+            raise self._not_attached_error(request)
+
+        if await self._in_executor(
+            volume_is_mounted, self._mounts, request.volume_id
+        ):
+            logger.debug("Volume %s is mounted, unmounting", request.volume_id)
+            try:
+                await self._async_mounter.umount(request.staging_target_path)
+            except MountError as error:
+                raise self._umount_error(request, error) from error
+
+        return csi_pb2.NodeUnstageVolumeResponse()
+
+    @locked(
+        lambda request: [
+            f"volume:{request.volume_id}",
+            f"path:{request.target_path}",
+        ]
+    )
+    async def NodePublishVolume(self, request, context):
+        source = self._publish_source(request)
+
+        if await self._in_executor(self._prepare_target, request):
+            try:
+                await self._async_mounter.bind(
+                    source,
+                    request.target_path,
+                    self._bind_options(request),
+                )
+            except MountError as error:
+                raise self._bind_error(request, error) from error
+
+        return csi_pb2.NodePublishVolumeResponse()
+
+    @locked(
+        lambda request: [
+            f"volume:{request.volume_id}",
+            f"path:{request.target_path}",
+        ]
+    )
+    async def NodeUnpublishVolume(self, request, context):
+        if await self._in_executor(self._check_unpublish_volume, request):
+            logger.debug(
+                "Volume %s is mounted, unmounting it", request.volume_id
+            )
+            try:
+                await self._async_mounter.umount(request.target_path)
+            except MountError as error:
+                raise self._unbind_error(request, error) from error
+
+        if await self._in_executor(Path(request.target_path).is_dir):
+            logger.debug(
+                "Volume target path %s exists, removing it",
+                request.target_path,
+            )
+            try:
+                await self._async_mounter.rmdir(request.target_path)
+            except MountError as error:
+                raise self._remove_target_error(request, error) from error
+        else:
+            await self._in_executor(self._remove_target_file, request)
+
+        return csi_pb2.NodeUnpublishVolumeResponse()
+
+    @locked(lambda request: [f"volume:{request.volume_id}"])
+    async def NodeExpandVolume(self, request, context):
+        # Growing a mounted filesystem is a single ioctl
+        return await self._in_executor(self._expand_volume, request)
+
+    @staticmethod
+    async def _in_executor(function, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(function, *args)
+        )
@@ -3,9 +3,7 @@ Implement the ControllerService of the CSI spec
 """
 import logging
 import re
-
-from pathlib import Path
-from urllib.parse import urlparse
+import time
 
 from storpool import spapi
 from grpc_interceptor.exceptions import (
@@ -15,6 +13,8 @@ from grpc_interceptor.exceptions import (
     FailedPrecondition,
     ResourceExhausted,
     OutOfRange,
+    AlreadyExists,
+    Aborted,
 )
 
 from pb import csi_pb2
@@ -22,35 +22,177 @@ from pb import csi_pb2_grpc
 
 import utils
 import constant
+import mkfs
+import spclient
+import trim
+from admission import AdmissionScheduler, admitted
+from attach_wait import AttachWaiter
+from attachments import AttachmentIndex
+from capacity import TemplateCapacity
+from listing import ListingCache, InvalidTokenError
+from orphans import OrphanReconciler
+from periodic import PeriodicTask
+from reassign import ReassignBatcher
+from singleflight import SingleFlight, deduplicated
+from ttl_cache import TTLCache
+from warm_pool import WarmPool
+from volume_index import (
+    VolumeIndex,
+    IndexedVolume,
+    CSI_NAME_TAG,
+    CSI_SNAPSHOT_NAME_TAG,
+    CSI_SOURCE_TAG,
+)
 
 logger = logging.getLogger("ControllerService")
 
+LOCAL_CLUSTER = "local"
+
+
+def _volume_cluster(request):
+    return (
+        utils.sp_global_id_to_sp_cluster_id(request.volume_id) or LOCAL_CLUSTER
+    )
+
 
 class ControllerServicer(csi_pb2_grpc.ControllerServicer):
     """
     Implement the ControllerService as a gRPC Servicer
     """
 
-    def __init__(self, sp_api_endpoint: str, sp_api_token: str):
-        if Path("/etc/storpool.conf").exists():
-            logger.debug(
-                "Found /etc/storpool.conf, loading API endpoint and token from it"
+    def __init__(
+        self,
+        sp_api_endpoint: str,
+        sp_api_token: str,
+        reassign_batch_window: float = constant.REASSIGN_BATCH_WINDOW,
+        reassign_batch_size: int = constant.REASSIGN_BATCH_SIZE,
+        volume_index_resync_interval: float = (
+            constant.VOLUME_INDEX_RESYNC_INTERVAL
+        ),
+        volume_list_refresh_interval: float = (
+            constant.VOLUME_LIST_REFRESH_INTERVAL
+        ),
+        capacity_refresh_interval: float = (
+            constant.CAPACITY_REFRESH_INTERVAL
+        ),
+        snapshot_list_refresh_interval: float = (
+            constant.SNAPSHOT_LIST_REFRESH_INTERVAL
+        ),
+        warm_pool_buckets: list = None,
+        warm_pool_refill_interval: float = (
+            constant.WARM_POOL_REFILL_INTERVAL
+        ),
+        volume_info_cache_ttl: float = constant.VOLUME_INFO_CACHE_TTL,
+        volume_info_cache_size: int = constant.VOLUME_INFO_CACHE_SIZE,
+        attachment_index_resync_interval: float = (
+            constant.ATTACHMENT_INDEX_RESYNC_INTERVAL
+        ),
+        admission_cluster_limit: int = constant.ADMISSION_CLUSTER_LIMIT,
+        admission_limits: list = (),
+        orphan_known_handles: str = None,
+        orphan_delete: bool = False,
+        orphan_lock_file: str = None,
+        orphan_scan_interval: float = constant.ORPHAN_SCAN_INTERVAL,
+        orphan_grace_period: float = constant.ORPHAN_GRACE_PERIOD,
+        orphan_batch_size: int = constant.ORPHAN_BATCH_SIZE,
+        orphan_delete_rate: float = constant.ORPHAN_DELETE_RATE,
+        attach_wait: str = constant.ATTACH_WAIT,
+        attach_poll_initial_interval: float = (
+            constant.ATTACH_POLL_INITIAL_INTERVAL
+        ),
+        attach_poll_max_interval: float = constant.ATTACH_POLL_MAX_INTERVAL,
+        attach_wait_timeout: float = constant.SP_API_LONG_TIMEOUT,
+    ):
+        self._sp_api = spclient.get_api(sp_api_endpoint, sp_api_token)
+
+        self._inflight = SingleFlight()
+        self._admission = AdmissionScheduler(
+            admission_cluster_limit, admission_limits
+        )
+
+        self._reassign_batcher = ReassignBatcher(
+            self._sp_api,
+            reassign_batch_window,
+            reassign_batch_size,
+            wait=attach_wait == "reassign-wait",
+            admit=self._admit_reassign,
+            timeout=attach_wait_timeout,
+        )
+        self._attach_waiter = AttachWaiter(
+            self._sp_api,
+            attach_poll_initial_interval,
+            attach_poll_max_interval,
+            attach_wait_timeout,
+        )
+
+        self._volume_index = self._start_index(
+            "volumes",
+            VolumeIndex("volumes", self._sp_api.volumesList, CSI_NAME_TAG),
+            volume_index_resync_interval,
+        )
+        self._snapshot_index = self._start_index(
+            "snapshots",
+            VolumeIndex(
+                "snapshots", self._list_snapshots, CSI_SNAPSHOT_NAME_TAG
+            ),
+            volume_index_resync_interval,
+        )
+        self._attachment_index = self._start_index(
+            "attachments",
+            AttachmentIndex(self._sp_api.attachmentsList),
+            attachment_index_resync_interval,
+        )
+
+        self._volume_listing = ListingCache(
+            "volumes",
+            self._list_csi_volumes,
+            key=lambda volume: volume.globalId,
+            interval=volume_list_refresh_interval,
+            token_pattern=constant.SP_GLOBAL_ID_REGEX,
+        )
+
+        self._volume_info = TTLCache(
+            "volume_info",
+            lambda global_id: self._sp_api.volumeInfo(f"~{global_id}"),
+            volume_info_cache_ttl,
+            volume_info_cache_size,
+        )
+
+        self._template_capacity = TemplateCapacity(
+            self._sp_api, capacity_refresh_interval
+        )
+
+        self._snapshot_listing = ListingCache(
+            "snapshots",
+            self._list_csi_snapshots,
+            key=lambda snapshot: snapshot.globalId,
+            interval=snapshot_list_refresh_interval,
+            token_pattern=constant.SP_GLOBAL_ID_REGEX,
+        )
+
+        self._warm_pool = None
+        if warm_pool_buckets:
+            self._warm_pool = WarmPool(
+                self._sp_api, warm_pool_buckets, warm_pool_refill_interval
             )
-            self._sp_api = spapi.Api.fromConfig()
-        else:
-            if sp_api_endpoint is None or sp_api_token is None:
-                raise RuntimeError(
-                    "StorPool API endpoint or authentication token not specified"
-                )
 
-            url = urlparse(sp_api_endpoint, "http")
-            logger.debug(
-                "Connection to StorPool API at %s with token %s",
-                sp_api_endpoint,
-                sp_api_token,
+        self._orphan_reconciler = None
+        if orphan_known_handles and not orphan_lock_file:
+            logger.warning(
+                "No orphan lock file shared by the controller replicas is "
+                "set, not looking for orphaned volumes"
             )
-            self._sp_api = spapi.Api(
-                host=url.hostname, port=url.port, auth=sp_api_token, multiCluster=True,
+        elif orphan_known_handles:
+            self._orphan_reconciler = OrphanReconciler(
+                self._list_csi_volumes,
+                self._delete_orphan,
+                orphan_known_handles,
+                orphan_lock_file,
+                orphan_scan_interval,
+                orphan_grace_period,
+                orphan_batch_size,
+                orphan_delete_rate,
+                orphan_delete,
             )
 
     def ControllerGetCapabilities(self, request, context):
@@ -76,9 +218,339 @@ class ControllerServicer(csi_pb2_grpc.ControllerServicer):
             publish_readonly_cap.RPC.EXPAND_VOLUME
         )
 
+        list_volumes_cap = response.capabilities.add()
+        list_volumes_cap.rpc.type = list_volumes_cap.RPC.LIST_VOLUMES
+
+        get_capacity_cap = response.capabilities.add()
+        get_capacity_cap.rpc.type = get_capacity_cap.RPC.GET_CAPACITY
+
+        create_delete_snapshot_cap = response.capabilities.add()
+        create_delete_snapshot_cap.rpc.type = (
+            create_delete_snapshot_cap.RPC.CREATE_DELETE_SNAPSHOT
+        )
+
+        list_snapshots_cap = response.capabilities.add()
+        list_snapshots_cap.rpc.type = list_snapshots_cap.RPC.LIST_SNAPSHOTS
+
+        clone_volume_cap = response.capabilities.add()
+        clone_volume_cap.rpc.type = clone_volume_cap.RPC.CLONE_VOLUME
+
         return response
 
+    @deduplicated(lambda request: f"name:{request.name}")
+    @admitted("create", lambda request: LOCAL_CLUSTER)
     def CreateVolume(self, request, context):
+        volume_size, volume_source = self._check_create_volume(request)
+
+        existing = self._existing_volume_response(request, volume_source)
+        if existing is not None:
+            return existing
+
+        parent_size = (
+            self._volume_source_size(request) if volume_source else None
+        )
+        volume_create = self._volume_create(
+            request, volume_size, volume_source, parent_size
+        )
+        volume_size = volume_create["size"]
+
+        if self._warm_pool is not None and not volume_source:
+            spare = self._warm_pool.claim(
+                request.parameters["template"],
+                volume_size,
+                self._default_fs_requested(request),
+                volume_create["tags"],
+            )
+            if spare is not None:
+                return self._spare_response(request, spare, volume_size)
+
+        self._check_template_space(request, volume_size)
+
+        try:
+            volume_create_result = self._sp_api.volumeCreate(volume_create)
+        except spapi.ApiError as error:
+            raise self._create_volume_error(error) from error
+
+        return self._created_volume_response(
+            request, volume_create_result, volume_size, volume_source
+        )
+
+    @deduplicated(lambda request: f"volume:{request.volume_id}")
+    @admitted("delete", _volume_cluster)
+    def DeleteVolume(self, request, context):
+        if not request.volume_id:
+            raise InvalidArgument("Missing volume name")
+
+        logger.info(f"Deleting volume {request.volume_id}")
+
+        try:
+            self._sp_api.volumeDelete(f"~{request.volume_id}")
+            logger.debug(f"Successfully deleted volume {request.volume_id}")
+        except spapi.ApiError as error:
+            self._check_delete_volume_error(request, error)
+
+        return self._deleted_volume_response(request)
+
+    def ValidateVolumeCapabilities(self, request, context):
+        self._check_validate_volume_capabilities(request)
+
+        try:
+            self._volume_info.get(request.volume_id)
+        except spapi.ApiError as error:
+            self._check_validated_volume_error(request, error)
+
+        return self._validate_volume_capabilities_response(request)
+
+    def ListVolumes(self, request, context):
+        if request.max_entries < 0:
+            raise InvalidArgument("Negative max entries")
+
+        try:
+            volumes, next_token = self._volume_listing.page(
+                request.max_entries, request.starting_token
+            )
+        except InvalidTokenError as error:
+            raise Aborted(str(error))
+        except spapi.ApiError as error:
+            logger.error(f"StorPool API error {error.name}: {error.desc}")
+            raise Internal(error.desc)
+
+        response = csi_pb2.ListVolumesResponse(next_token=next_token)
+        for volume in volumes:
+            entry = response.entries.add()
+            entry.volume.volume_id = volume.globalId
+            entry.volume.capacity_bytes = volume.size
+
+        return response
+
+    def GetCapacity(self, request, context):
+        """
+        Reports the free space in the requested template, or in the template
+        with the most free space if no template is specified
+        :param request:
+        :param context:
+        :return:
+        """
+        template_name = request.parameters.get("template")
+
+        try:
+            if template_name:
+                template_space = self._template_capacity.get(template_name)
+                if template_space is None:
+                    logger.error(
+                        f"Requested capacity of unknown template {template_name}"
+                    )
+                available_capacity = (
+                    template_space.free if template_space is not None else 0
+                )
+            else:
+                available_capacity = self._template_capacity.largest_free()
+        except spapi.ApiError as error:
+            logger.error(f"StorPool API error {error.name}: {error.desc}")
+            raise Internal(error.desc)
+
+        return csi_pb2.GetCapacityResponse(
+            available_capacity=max(available_capacity, 0)
+        )
+
+    @deduplicated(lambda request: f"volume:{request.volume_id}")
+    def ControllerPublishVolume(self, request, context):
+        sp_cluster_id, sp_node_id, rights = self._publish_target(request)
+
+        if self._attachment_index.attached_only(
+            request.volume_id, sp_cluster_id, sp_node_id, rights
+        ):
+            return self._already_published_response(request)
+
+        volume_reassign = {
+            "volume": f"~{request.volume_id}",
+            rights: [sp_node_id],
+            "detach": "all"
+        }
+
+        try:
+            generation = self._reassign_batcher.reassign(
+                f"~{sp_cluster_id}",
+                volume_reassign,
+                context.time_remaining() if context is not None else None,
+            )
+            self._wait_for_clients(
+                f"~{sp_cluster_id}", sp_node_id, generation, context
+            )
+        except spapi.ApiError as error:
+            self._attachment_index.forget(request.volume_id)
+            raise self._publish_error(request, error) from error
+        except Exception:
+            self._attachment_index.forget(request.volume_id)
+            raise
+
+        self._attachment_index.attached(
+            request.volume_id, sp_cluster_id, sp_node_id, rights
+        )
+
+        return csi_pb2.ControllerPublishVolumeResponse(
+            publish_context={"readonly": str(request.readonly)}
+        )
+
+    @deduplicated(lambda request: f"volume:{request.volume_id}")
+    def ControllerUnpublishVolume(self, request, context):
+        (
+            cluster_name,
+            sp_cluster_id,
+            sp_node_id,
+            volume_reassign,
+        ) = self._unpublish_target(request)
+
+        if self._attachment_index.detached(
+            request.volume_id, sp_cluster_id, sp_node_id
+        ):
+            logger.debug("Volume %s is already detached", request.volume_id)
+            return csi_pb2.ControllerUnpublishVolumeResponse()
+
+        try:
+            generation = self._reassign_batcher.reassign(
+                cluster_name,
+                volume_reassign,
+                context.time_remaining() if context is not None else None,
+            )
+            self._wait_for_clients(
+                cluster_name, sp_node_id, generation, context, detach=True
+            )
+        except spapi.ApiError as error:
+            self._attachment_index.forget(request.volume_id)
+            raise self._unpublish_error(request, error) from error
+        except Exception:
+            self._attachment_index.forget(request.volume_id)
+            raise
+
+        self._attachment_index.detach(
+            request.volume_id, sp_cluster_id, sp_node_id
+        )
+
+        return csi_pb2.ControllerUnpublishVolumeResponse()
+
+    @deduplicated(lambda request: f"snapshot:{request.name}")
+    def CreateSnapshot(self, request, context):
+        existing = self._existing_snapshot_response(request)
+        if existing is not None:
+            return existing
+
+        try:
+            # A snapshot is the size of its source volume
+            volume_size = self._volume_info.get(request.source_volume_id).size
+            snapshot_create_result = self._sp_api.snapshotCreate(
+                f"~{request.source_volume_id}",
+                self._snapshot_create(request),
+            )
+        except spapi.ApiError as error:
+            raise self._create_snapshot_error(request, error) from error
+
+        return self._created_snapshot_response(
+            request, snapshot_create_result, volume_size
+        )
+
+    def DeleteSnapshot(self, request, context):
+        if not request.snapshot_id:
+            raise InvalidArgument("Missing snapshot id")
+
+        logger.info(f"Deleting snapshot {request.snapshot_id}")
+
+        try:
+            self._sp_api.snapshotDelete(f"~{request.snapshot_id}")
+            logger.debug(f"Successfully deleted snapshot {request.snapshot_id}")
+        except spapi.ApiError as error:
+            self._check_delete_snapshot_error(request, error)
+
+        self._snapshot_index.remove(request.snapshot_id)
+
+        return csi_pb2.DeleteSnapshotResponse()
+
+    def ListSnapshots(self, request, context):
+        if request.max_entries < 0:
+            raise InvalidArgument("Negative max entries")
+
+        try:
+            if request.snapshot_id:
+                snapshots = [
+                    snapshot
+                    for snapshot in self._snapshot_listing.entries()
+                    if snapshot.globalId == request.snapshot_id
+                ]
+                next_token = ""
+            else:
+                snapshots, next_token = self._snapshot_listing.page(
+                    0 if request.source_volume_id else request.max_entries,
+                    request.starting_token,
+                )
+        except InvalidTokenError as error:
+            raise Aborted(str(error))
+        except spapi.ApiError as error:
+            logger.error(f"StorPool API error {error.name}: {error.desc}")
+            raise Internal(error.desc)
+
+        if request.source_volume_id:
+            snapshots = [
+                snapshot
+                for snapshot in snapshots
+                if snapshot.tags.get(CSI_SOURCE_TAG) == request.source_volume_id
+            ]
+            if 0 < request.max_entries < len(snapshots):
+                next_token = snapshots[request.max_entries - 1].globalId
+                snapshots = snapshots[: request.max_entries]
+
+        response = csi_pb2.ListSnapshotsResponse(next_token=next_token)
+        for snapshot in snapshots:
+            response.entries.add().snapshot.CopyFrom(
+                self._snapshot_message(
+                    IndexedVolume(
+                        snapshot.globalId,
+                        snapshot.size,
+                        snapshot.tags.get(CSI_SOURCE_TAG, ""),
+                        snapshot.creationTimestamp,
+                    )
+                )
+            )
+
+        return response
+
+    @deduplicated(lambda request: f"volume:{request.volume_id}")
+    @admitted("expand", _volume_cluster)
+    def ControllerExpandVolume(self, request, context):
+        """
+        Handles requests to expand a volume
+        :param request:
+        :param context:
+        :return:
+        """
+
+        expand_volume_response, new_volume_size = self._expand_volume(request)
+
+        try:
+            volume_size = self._volume_info.get(request.volume_id).size
+            if volume_size >= new_volume_size:
+                return self._already_expanded_response(
+                    request, expand_volume_response, volume_size
+                )
+
+            try:
+                self._sp_api.volumeUpdate(f"~{request.volume_id}",
+                                          {
+                                              "size": new_volume_size
+                                          })
+            finally:
+                self._volume_info.invalidate(request.volume_id)
+
+            expand_volume_response.capacity_bytes = new_volume_size
+
+            return expand_volume_response
+        except spapi.ApiError as error:
+            raise self._expand_volume_error(error) from error
+
+    def _check_create_volume(self, request):
+        """
+        Validates a CreateVolume request, returns the requested size and
+        the tag of its content source
+        """
         if not request.name:
             raise InvalidArgument("Missing volume name")
 
@@ -95,79 +567,158 @@ class ControllerServicer(csi_pb2_grpc.ControllerServicer):
         )
 
         for requested_capability in request.volume_capabilities:
-            if requested_capability.WhichOneof("access_type") == "mount":
-                if (requested_capability.access_mode.mode
-                        != requested_capability.AccessMode.SINGLE_NODE_WRITER
-                        and requested_capability.access_mode.mode
-                        != requested_capability.AccessMode.SINGLE_NODE_READER_ONLY):
-                    raise InvalidArgument(f"Requested unsupported access mode: {requested_capability.access_mode.mode}")
-            else:
-                raise InvalidArgument("Requested unsupported block access mode")
+            if requested_capability.WhichOneof("access_type") not in ("mount", "block"):
+                raise InvalidArgument("Requested unsupported access type")
+            if (requested_capability.access_mode.mode
+                    != requested_capability.AccessMode.SINGLE_NODE_WRITER
+                    and requested_capability.access_mode.mode
+                    != requested_capability.AccessMode.SINGLE_NODE_READER_ONLY):
+                raise InvalidArgument(f"Requested unsupported access mode: {requested_capability.access_mode.mode}")
 
-        try:
-            volume_create_result = self._sp_api.volumeCreate(
-                {
-                    "template": request.parameters["template"],
-                    "size": volume_size,
-                    "tags": {"csi_name": request.name},
-                }
+        return volume_size, self._volume_source_tag(request)
+
+    def _existing_volume_response(self, request, volume_source):
+        """
+        Returns the response for a volume created by an earlier call, None
+        if there is no such volume
+        """
+        existing_volume = self._volume_index.lookup(request.name)
+        if existing_volume is not None:
+            if not self._size_in_range(
+                existing_volume.size, request.capacity_range
+            ):
+                raise AlreadyExists(
+                    f"Volume {request.name} already exists with size {existing_volume.size}"
+                )
+
+            if existing_volume.source != volume_source:
+                raise AlreadyExists(
+                    f"Volume {request.name} already exists with a different content source"
+                )
+
+            logger.info(
+                f"Volume {request.name} already exists as {existing_volume.global_id}"
+            )
+            return self._create_volume_response(
+                request, existing_volume.global_id, existing_volume.size
             )
+        return None
 
-            response = csi_pb2.CreateVolumeResponse()
+    @staticmethod
+    def _volume_create(request, volume_size, volume_source, parent_size):
+        volume_create = {
+            "template": request.parameters["template"],
+            "tags": {CSI_NAME_TAG: request.name},
+        }
 
-            response.volume.volume_id = str(volume_create_result.globalId)
-            response.volume.capacity_bytes = volume_size
+        if volume_source:
+            if not request.HasField("capacity_range"):
+                volume_size = parent_size
+            elif volume_size < parent_size:
+                raise OutOfRange(
+                    f"Requested size {volume_size} is smaller than the content source size {parent_size}"
+                )
 
-            return response
-        except spapi.ApiError as error:
-            logger.error(f"StorPool API error {error.name}: {error.desc}")
-            if error.name == "insufficientResources":
-                raise OutOfRange(error.desc)
-            elif error.name == "objectDoesNotExist":
-                raise InvalidArgument(error.desc)
+            source = request.volume_content_source
+            if source.HasField("snapshot"):
+                volume_create["parent"] = f"~{source.snapshot.snapshot_id}"
             else:
-                raise Internal(error.desc)
+                volume_create["baseOn"] = f"~{source.volume.volume_id}"
+            volume_create["tags"][CSI_SOURCE_TAG] = volume_source
 
-    def DeleteVolume(self, request, context):
-        if not request.volume_id:
-            raise InvalidArgument("Missing volume name")
+        volume_create["size"] = volume_size
+        return volume_create
 
-        logger.info(f"Deleting volume {request.volume_id}")
+    def _spare_response(self, request, spare, volume_size):
+        self._volume_info.invalidate(spare.global_id)
+        self._volume_index.add(
+            request.name, IndexedVolume(spare.global_id, volume_size)
+        )
+        response = self._create_volume_response(
+            request, spare.global_id, volume_size
+        )
+        if spare.formatted:
+            response.volume.volume_context[mkfs.CLONED_FS_PARAMETER] = "true"
+        return response
 
-        try:
-            self._sp_api.volumeDelete(f"~{request.volume_id}")
-            logger.debug(f"Successfully deleted volume {request.volume_id}")
-        except spapi.ApiError as error:
-            logger.error(f"StorPool API error {error.name}: {error.desc}")
-            if error.name == "objectDoesNotExist":
-                logger.debug(f"Tried to delete an non-existing volume: {request.volume_id}")
-            elif error.name == "busy":
-                logger.error(f"Tried to delete an attached volume: {request.volume_id}")
-                raise FailedPrecondition(error.desc)
-            else:
-                raise Internal(error.desc)
+    def _check_template_space(self, request, volume_size):
+        template_space = self._template_capacity.cached(
+            request.parameters["template"]
+        )
+        if template_space is not None and volume_size > template_space.free:
+            logger.error(
+                f"Template {request.parameters['template']} has only {template_space.free} bytes free"
+            )
+            raise OutOfRange(
+                f"Not enough free space in template {request.parameters['template']}"
+            )
 
-        return csi_pb2.DeleteVolumeResponse()
+    def _created_volume_response(
+        self, request, volume_create_result, volume_size, volume_source
+    ):
+        self._volume_index.add(
+            request.name,
+            IndexedVolume(
+                str(volume_create_result.globalId),
+                volume_size,
+                volume_source,
+            ),
+        )
 
-    def ValidateVolumeCapabilities(self, request, context):
-        response = csi_pb2.ValidateVolumeCapabilitiesResponse()
+        return self._create_volume_response(
+            request, str(volume_create_result.globalId), volume_size
+        )
+
+    @staticmethod
+    def _create_volume_error(error):
+        logger.error(f"StorPool API error {error.name}: {error.desc}")
+        if error.name == "insufficientResources":
+            return OutOfRange(error.desc)
+        elif error.name == "objectDoesNotExist":
+            return InvalidArgument(error.desc)
+        else:
+            return Internal(error.desc)
+
+    @staticmethod
+    def _check_delete_volume_error(request, error):
+        """
+        Raises the gRPC error of a failed delete, unless the volume is gone
+        """
+        logger.error(f"StorPool API error {error.name}: {error.desc}")
+        if error.name == "objectDoesNotExist":
+            logger.debug(f"Tried to delete an non-existing volume: {request.volume_id}")
+        elif error.name == "busy":
+            logger.error(f"Tried to delete an attached volume: {request.volume_id}")
+            raise FailedPrecondition(error.desc) from error
+        else:
+            raise Internal(error.desc) from error
+
+    def _deleted_volume_response(self, request):
+        self._volume_info.invalidate(request.volume_id)
+        self._volume_index.remove(request.volume_id)
+        return csi_pb2.DeleteVolumeResponse()
 
+    @staticmethod
+    def _check_validate_volume_capabilities(request):
         if not request.volume_id:
             raise InvalidArgument("Missing volume Id")
 
         if not request.volume_capabilities:
             raise InvalidArgument("Missing volume capabilities")
 
-        try:
-            self._sp_api.volumeInfo(f"~{request.volume_id}")
-        except spapi.ApiError as error:
-            if error.name == "objectDoesNotExist":
-                logger.error(
-                    f"Cannot validate volume {request.volume_id} because it doesn't exist."
-                )
-                raise NotFound(
-                    f"StorPool volume {request.volume_id} does not exist."
-                )
+    @staticmethod
+    def _check_validated_volume_error(request, error):
+        if error.name == "objectDoesNotExist":
+            logger.error(
+                f"Cannot validate volume {request.volume_id} because it doesn't exist."
+            )
+            raise NotFound(
+                f"StorPool volume {request.volume_id} does not exist."
+            ) from error
+
+    @staticmethod
+    def _validate_volume_capabilities_response(request):
+        response = csi_pb2.ValidateVolumeCapabilitiesResponse()
 
         if hasattr(request.parameters, "template"):
             response.confirmed.parameters["template"] = request.parameters[
@@ -176,9 +727,15 @@ class ControllerServicer(csi_pb2_grpc.ControllerServicer):
 
         for requested_capability in request.volume_capabilities:
             confirmed_capability = csi_pb2.VolumeCapability()
-            if requested_capability.WhichOneof("access_type") == "mount":
-                logger.debug("Volume %s is of type mount.", request.volume_id)
-                confirmed_capability.mount.SetInParent()
+            access_type = requested_capability.WhichOneof("access_type")
+            if access_type in ("mount", "block"):
+                logger.debug(
+                    "Volume %s is of type %s.", request.volume_id, access_type
+                )
+                if access_type == "mount":
+                    confirmed_capability.mount.SetInParent()
+                else:
+                    confirmed_capability.block.SetInParent()
                 if (
                         requested_capability.access_mode.mode
                         == confirmed_capability.AccessMode.SINGLE_NODE_WRITER
@@ -194,7 +751,12 @@ class ControllerServicer(csi_pb2_grpc.ControllerServicer):
 
         return response
 
-    def ControllerPublishVolume(self, request, context):
+    @staticmethod
+    def _publish_target(request):
+        """
+        Validates a ControllerPublishVolume request, returns the cluster
+        and the client to attach the volume to and the attachment rights
+        """
         if not request.volume_id:
             raise InvalidArgument("Missing volume Id")
 
@@ -220,55 +782,76 @@ class ControllerServicer(csi_pb2_grpc.ControllerServicer):
             )
 
         sp_node_id = utils.csi_node_id_to_sp_node_id(request.node_id)
+        sp_cluster_id = utils.csi_node_id_to_sp_cluster_id(request.node_id)
 
-        volume_reassign = {
-            "volume": f"~{request.volume_id}",
-            "rw": [sp_node_id],
-            "detach": "all"
-        }
+        # A raw block volume is only read-only if StorPool attaches it so, a
+        # filesystem is formatted and staged read-write and made read-only
+        # by the node publish.
+        rights = (
+            "ro"
+            if request.readonly and request.volume_capability.HasField("block")
+            else "rw"
+        )
 
-        try:
-            self._sp_api.volumesReassignWait({"reassign": [volume_reassign]},
-                                             clusterName=f"~{utils.csi_node_id_to_sp_cluster_id(request.node_id)}")
-        except spapi.ApiError as error:
-            logger.error(f"StorPool API error {error.name}: {error.desc}")
-            if error.name == "objectDoesNotExist":
-                logger.error(
-                    f"Tried publishing volume {request.volume_id} but it doesn't exist."
-                )
-                raise NotFound(f"StorPool volume {request.volume_id} not found.")
-            elif error.name == "invalidParam":
-                if error.desc == "No such client registered":
-                    error_message = f"StorPool node {request.node_id} doesn't have a block service running."
-                    logger.error(error_message)
-                    raise NotFound(error_message)
-                else:
-                    error_message = f"No more volumes can be attached to node {request.node_id}"
-                    logger.error(error_message)
-                    raise ResourceExhausted(error_message)
-            elif error.name == "busy":
-                error_message = f"StorPool volume {request.volume_id} is already attach to another node."
-                logger.error(error_message)
-                raise FailedPrecondition(error_message)
-            else:
-                raise Internal(error.desc)
+        return sp_cluster_id, sp_node_id, rights
 
+    @staticmethod
+    def _already_published_response(request):
+        logger.debug(
+            "Volume %s is already attached to %s",
+            request.volume_id,
+            request.node_id,
+        )
         return csi_pb2.ControllerPublishVolumeResponse(
             publish_context={"readonly": str(request.readonly)}
         )
 
-    def ControllerUnpublishVolume(self, request, context):
+    @staticmethod
+    def _publish_error(request, error):
+        logger.error(f"StorPool API error {error.name}: {error.desc}")
+        if error.name == "objectDoesNotExist":
+            logger.error(
+                f"Tried publishing volume {request.volume_id} but it doesn't exist."
+            )
+            return NotFound(f"StorPool volume {request.volume_id} not found.")
+        elif error.name == "invalidParam":
+            if error.desc == "No such client registered":
+                error_message = f"StorPool node {request.node_id} doesn't have a block service running."
+                logger.error(error_message)
+                return NotFound(error_message)
+            else:
+                error_message = f"No more volumes can be attached to node {request.node_id}"
+                logger.error(error_message)
+                return ResourceExhausted(error_message)
+        elif error.name == "busy":
+            error_message = f"StorPool volume {request.volume_id} is already attach to another node."
+            logger.error(error_message)
+            return FailedPrecondition(error_message)
+        else:
+            return Internal(error.desc)
+
+    @staticmethod
+    def _unpublish_target(request):
+        """
+        Validates a ControllerUnpublishVolume request, returns the cluster
+        name, the cluster and the client to detach the volume from, and the
+        reassignment doing it
+        """
         if not request.volume_id:
             raise InvalidArgument("Missing volume Id")
 
         logger.info(f"Unpublishing volume {request.volume_id}")
 
         volume_reassign = {"volume": f"~{request.volume_id}"}
+        cluster_name = None
+        sp_cluster_id = None
+        sp_node_id = None
 
         if request.node_id:
-            volume_reassign["detach"] = [
-                utils.csi_node_id_to_sp_node_id(request.node_id)
-            ]
+            sp_cluster_id = utils.csi_node_id_to_sp_cluster_id(request.node_id)
+            sp_node_id = utils.csi_node_id_to_sp_node_id(request.node_id)
+            cluster_name = f"~{sp_cluster_id}"
+            volume_reassign["detach"] = [sp_node_id]
             logger.debug(
                 "Detaching volume %s from node %s",
                 request.volume_id,
@@ -279,54 +862,274 @@ class ControllerServicer(csi_pb2_grpc.ControllerServicer):
             logger.debug(
                 "Detaching volume %s from all nodes", request.volume_id
             )
-        try:
-            self._sp_api.volumesReassignWait({"reassign": [volume_reassign]},
-                                             clusterName=f"~{utils.csi_node_id_to_sp_cluster_id(request.node_id)}")
-        except spapi.ApiError as error:
-            logger.error(f"StorPool API error {error.name}: {error.desc}")
-            if error.name == "objectDoesNotExist":
-                error_message = f"StorPool volume {request.volume_id} does not exist"
-                logger.error(error_message)
-                raise NotFound(error_message)
-            else:
-                raise Internal(error.desc)
 
-        return csi_pb2.ControllerUnpublishVolumeResponse()
+        return cluster_name, sp_cluster_id, sp_node_id, volume_reassign
 
-    def ControllerExpandVolume(self, request, context):
+    @staticmethod
+    def _unpublish_error(request, error):
+        logger.error(f"StorPool API error {error.name}: {error.desc}")
+        if error.name == "objectDoesNotExist":
+            error_message = f"StorPool volume {request.volume_id} does not exist"
+            logger.error(error_message)
+            return NotFound(error_message)
+        else:
+            return Internal(error.desc)
+
+    def _existing_snapshot_response(self, request):
         """
-        Handles requests to expand a volume
-        :param request:
-        :param context:
-        :return:
+        Validates a CreateSnapshot request, returns the response for a
+        snapshot created by an earlier call, None if there is no such
+        snapshot
+        """
+        if not request.name:
+            raise InvalidArgument("Missing snapshot name")
+
+        if not request.source_volume_id:
+            raise InvalidArgument("Missing source volume id")
+
+        existing_snapshot = self._snapshot_index.lookup(request.name)
+        if existing_snapshot is not None:
+            if existing_snapshot.source != request.source_volume_id:
+                raise AlreadyExists(
+                    f"Snapshot {request.name} already exists for volume {existing_snapshot.source}"
+                )
+
+            logger.info(
+                f"Snapshot {request.name} already exists as {existing_snapshot.global_id}"
+            )
+            return csi_pb2.CreateSnapshotResponse(
+                snapshot=self._snapshot_message(existing_snapshot)
+            )
+
+        logger.info(
+            f"Creating snapshot {request.name} of volume {request.source_volume_id}"
+        )
+        return None
+
+    @staticmethod
+    def _snapshot_create(request):
+        return {
+            "tags": {
+                CSI_SNAPSHOT_NAME_TAG: request.name,
+                CSI_SOURCE_TAG: request.source_volume_id,
+            }
+        }
+
+    @staticmethod
+    def _create_snapshot_error(request, error):
+        logger.error(f"StorPool API error {error.name}: {error.desc}")
+        if error.name == "objectDoesNotExist":
+            return NotFound(
+                f"StorPool volume {request.source_volume_id} does not exist"
+            )
+        elif error.name == "insufficientResources":
+            return ResourceExhausted(error.desc)
+        else:
+            return Internal(error.desc)
+
+    def _created_snapshot_response(
+        self, request, snapshot_create_result, volume_size
+    ):
+        snapshot = IndexedVolume(
+            str(snapshot_create_result.snapshotGlobalId),
+            volume_size,
+            request.source_volume_id,
+            int(time.time()),
+        )
+        self._snapshot_index.add(request.name, snapshot)
+
+        return csi_pb2.CreateSnapshotResponse(
+            snapshot=self._snapshot_message(snapshot)
+        )
+
+    @staticmethod
+    def _check_delete_snapshot_error(request, error):
         """
+        Raises the gRPC error of a failed delete, unless the snapshot is
+        gone
+        """
+        logger.error(f"StorPool API error {error.name}: {error.desc}")
+        if error.name == "objectDoesNotExist":
+            logger.debug(f"Tried to delete a non-existing snapshot: {request.snapshot_id}")
+        elif error.name == "busy":
+            raise FailedPrecondition(error.desc) from error
+        else:
+            raise Internal(error.desc) from error
 
+    def _expand_volume(self, request):
+        """
+        Validates a ControllerExpandVolume request, returns the response to
+        fill in and the requested size
+        """
         if not request.volume_id:
             raise InvalidArgument("Missing volume ID")
 
         if not request.capacity_range:
             raise InvalidArgument("Missing new volume capacity range")
 
+        new_volume_size = self._determine_volume_size(request.capacity_range)
+
+        expand_volume_response = csi_pb2.ControllerExpandVolumeResponse()
+        # Raw block volumes have no file system to grow
+        expand_volume_response.node_expansion_required = (
+            request.volume_capability.WhichOneof("access_type") != "block"
+        )
+
+        return expand_volume_response, new_volume_size
+
+    @staticmethod
+    def _already_expanded_response(
+        request, expand_volume_response, volume_size
+    ):
+        logger.info(
+            f"Volume {request.volume_id} is already {volume_size} bytes"
+        )
+        expand_volume_response.capacity_bytes = volume_size
+        return expand_volume_response
+
+    @staticmethod
+    def _expand_volume_error(error):
+        logger.error(f"StorPool API error {error.name}: {error.desc}")
+        if error.name == "insufficientResources":
+            return OutOfRange(error.desc)
+        elif error.name == "objectDoesNotExist":
+            return NotFound(error.desc)
+        else:
+            return Internal(error.desc)
+
+    @staticmethod
+    def _start_index(name, index, resync_interval):
         try:
-            new_volume_size = self._determine_volume_size(request.capacity_range)
-            self._sp_api.volumeUpdate(f"~{request.volume_id}",
-                                      {
-                                          "size": new_volume_size
-                                      })
+            index.resync()
+        except Exception as error:  # pylint: disable=W0703
+            logger.error(f"Failed to build the {name} index: {error}")
+        PeriodicTask(
+            f"{name}-index-resync", resync_interval, index.resync
+        ).start()
+        return index
 
-            expand_volume_response = csi_pb2.ControllerExpandVolumeResponse()
-            expand_volume_response.capacity_bytes = new_volume_size
-            expand_volume_response.node_expansion_required = True
+    def _list_snapshots(self):
+        return [
+            snapshot
+            for snapshot in self._sp_api.snapshotsList()
+            if not snapshot.deleted
+        ]
 
-            return expand_volume_response
+    def _list_csi_snapshots(self):
+        return [
+            snapshot
+            for snapshot in self._list_snapshots()
+            if (snapshot.tags or {}).get(CSI_SNAPSHOT_NAME_TAG)
+        ]
+
+    @staticmethod
+    def _create_volume_response(request, global_id, volume_size):
+        response = csi_pb2.CreateVolumeResponse()
+
+        response.volume.volume_id = global_id
+        response.volume.capacity_bytes = volume_size
+        for parameter in mkfs.PARAMETERS + (trim.DISCARD_MODE_PARAMETER,):
+            if parameter in request.parameters:
+                response.volume.volume_context[parameter] = request.parameters[
+                    parameter
+                ]
+        if request.HasField("volume_content_source"):
+            response.volume.content_source.CopyFrom(
+                request.volume_content_source
+            )
+
+        return response
+
+    @staticmethod
+    def _default_fs_requested(request):
+        # The formatted spares were made with the default mkfs options
+        if any(
+            parameter in request.parameters for parameter in mkfs.PARAMETERS
+        ):
+            return False
+
+        return all(
+            capability.WhichOneof("access_type") == "mount"
+            and capability.mount.fs_type in ("", constant.DEFAULT_FS_TYPE)
+            for capability in request.volume_capabilities
+        )
+
+    @staticmethod
+    def _volume_source_tag(request):
+        if not request.HasField("volume_content_source"):
+            return ""
+
+        source = request.volume_content_source
+        if source.HasField("snapshot"):
+            if not source.snapshot.snapshot_id:
+                raise InvalidArgument("Missing content source snapshot id")
+            return f"snapshot:{source.snapshot.snapshot_id}"
+
+        if source.HasField("volume"):
+            if not source.volume.volume_id:
+                raise InvalidArgument("Missing content source volume id")
+            return f"volume:{source.volume.volume_id}"
+
+        raise InvalidArgument("Unsupported volume content source")
+
+    def _volume_source_size(self, request):
+        source = request.volume_content_source
+        try:
+            if source.HasField("snapshot"):
+                return self._sp_api.snapshotInfo(
+                    f"~{source.snapshot.snapshot_id}"
+                ).size
+            return self._volume_info.get(source.volume.volume_id).size
         except spapi.ApiError as error:
-            logger.error(f"StorPool API error {error.name}: {error.desc}")
-            if error.name == "insufficientResources":
-                raise OutOfRange(error.desc)
-            elif error.name == "objectDoesNotExist":
-                raise NotFound(error.desc)
-            else:
-                raise Internal(error.desc)
+            raise self._volume_source_error(error) from error
+
+    @staticmethod
+    def _volume_source_error(error):
+        logger.error(f"StorPool API error {error.name}: {error.desc}")
+        if error.name == "objectDoesNotExist":
+            return NotFound(f"Volume content source does not exist: {error.desc}")
+        return Internal(error.desc)
+
+    @staticmethod
+    def _snapshot_message(snapshot):
+        message = csi_pb2.Snapshot(
+            snapshot_id=snapshot.global_id,
+            source_volume_id=snapshot.source,
+            size_bytes=snapshot.size,
+            ready_to_use=True,
+        )
+        message.creation_time.FromSeconds(snapshot.created)
+        return message
+
+    def _admit_reassign(self, cluster_name, operation):
+        # Reassignments go to "~<cluster id>", or to the local cluster
+        return self._admission.admit(
+            cluster_name[1:] if cluster_name else LOCAL_CLUSTER, operation
+        )
+
+    def _wait_for_clients(
+        self, cluster_name, client, generation, context, detach=False
+    ):
+        if generation is None:
+            return
+
+        self._attach_waiter.wait(
+            cluster_name,
+            client,
+            generation,
+            context.time_remaining() if context is not None else None,
+            detach,
+        )
+
+    def _delete_orphan(self, global_id):
+        self.DeleteVolume(csi_pb2.DeleteVolumeRequest(volume_id=global_id), None)
+
+    def _list_csi_volumes(self):
+        return [
+            volume
+            for volume in self._sp_api.volumesList()
+            if (volume.tags or {}).get(CSI_NAME_TAG)
+        ]
 
     @staticmethod
     def _determine_volume_size(capacity_range):
@@ -335,3 +1138,11 @@ class ControllerServicer(csi_pb2_grpc.ControllerServicer):
             return max(capacity_range.required_bytes, capacity_range.limit_bytes)
         else:
             return constant.DEFAULT_VOLUME_SIZE
+
+    @staticmethod
+    def _size_in_range(size, capacity_range):
+        if size < capacity_range.required_bytes:
+            return False
+        if 0 < capacity_range.limit_bytes < size:
+            return False
+        return True
@@ -4,26 +4,36 @@ Bla-bla
 import distutils.util
 import logging
 import os.path
-import subprocess
 
 from pathlib import Path
 
-from storpool import spapi, spconfig, sptypes
+from storpool import spconfig
 
 from grpc_interceptor.exceptions import (
     NotFound,
     Internal,
     AlreadyExists,
     InvalidArgument,
+    FailedPrecondition,
 )
 from pb import csi_pb2
 from pb import csi_pb2_grpc
 
-import utils
-
-RESIZE_TOOL_MAP = {
-    "ext4": "/sbin/resize2fs"
-}
+import constant
+from device_watch import DeviceWatcher
+from fs_probe import probe
+from keyed_lock import KeyedLock, locked
+from mkfs import (
+    CLONED_FS_PARAMETER,
+    FormatError,
+    cloned_fs_uuid,
+    format_device,
+    set_uuid,
+)
+from mount_table import Mount, MountTable
+from mounter import MountError, get_mounter
+from resize import GROW_FUNCTIONS, ResizeError, grow
+from trim import DISCARD_MODE_PARAMETER, DISCARD_MODES, TrimScheduler
 
 logger = logging.getLogger("NodeService")
 
@@ -39,67 +49,48 @@ def volume_get_real_path(volume_name: str) -> str:
     """
     Returns the "/dev/sp-X" device which represents the volume_name
     """
-    return str(Path("/dev/storpool-byid/" + volume_name).readlink())
+    return os.path.realpath("/dev/storpool-byid/" + volume_name)
 
 
-def volume_is_formatted(volume_name: str) -> bool:
+def volume_get_device(volume_name: str) -> int:
     """
-    Checks whether a StorPool volume is formatted
+    Returns the device number of the volume's block device
     """
-    return (
-            subprocess.run(
-                ["blkid", volume_get_real_path(volume_name)], check=False
-            ).returncode
-            == 0
-    )
+    return os.stat("/dev/storpool-byid/" + volume_name).st_rdev
 
 
-def volume_get_fs(volume_name: str) -> str:
+def volume_get_mounts(mounts: MountTable, volume_name: str) -> list:
     """
-    Returns the filesystem of a volume
+    Returns the mounts of a volume, by device number or by "/dev/sp-X"
+    source
     """
-    return subprocess.run(
-        ["blkid", "-o", "value", "-s", "TYPE", volume_get_real_path(volume_name)],
-        check=False,
-        capture_output=True,
-        encoding="utf-8",
-    ).stdout.strip()
+    return mounts.device_mounts(
+        volume_get_device(volume_name), volume_get_real_path(volume_name)
+    )
 
 
-def volume_is_mounted(volume_name: str) -> bool:
+def volume_is_mounted(mounts: MountTable, volume_name: str) -> bool:
     """
     Checks if a volume is mounted
     """
-    system_mounts = utils.get_mounted_devices()
-    return (
-            len(
-                [
-                    mount
-                    for mount in system_mounts
-                    if mount["device"] == volume_get_real_path(volume_name)
-                ]
-            )
-            > 0
-    )
+    return bool(volume_get_mounts(mounts, volume_name))
 
 
-def volume_get_mount_info(volume_name: str) -> dict:
+def volume_get_mount_info(mounts: MountTable, volume_name: str) -> Mount:
     """
-    Retrieves information about a mount
+    Retrieves information about the first mount of a volume
     """
-    system_mounts = utils.get_mounted_devices()
-    return [
-        mount
-        for mount in system_mounts
-        if mount["device"] == volume_get_real_path(volume_name)
-    ][0]
+    return volume_get_mounts(mounts, volume_name)[0]
 
 
-def generate_mount_options(readonly: bool, mount_flags) -> str:
+def generate_mount_options(
+        readonly: bool, mount_flags, discard: bool = True
+) -> str:
     """
     Generates mount options taking into account if the volume is read-only
+    and whether freed blocks are discarded online
     """
-    mount_options = ["discard"]
+    mount_options = ["discard"] if discard else []
 
     if readonly:
         mount_options.append("ro")
@@ -119,9 +110,28 @@ class NodeServicer(csi_pb2_grpc.NodeServicer):
     Provides NodeService implementation
     """
 
-    def __init__(self):
+    def __init__(
+            self,
+            mount_backend: str = constant.MOUNT_BACKEND,
+            device_wait_timeout: float = constant.DEVICE_WAIT_TIMEOUT,
+            lock_timeout: float = constant.NODE_LOCK_TIMEOUT,
+            mkfs_profile: str = constant.MKFS_PROFILE,
+            discard_mode: str = constant.DISCARD_MODE,
+            trim_interval: float = constant.TRIM_INTERVAL,
+            trim_rate: float = constant.TRIM_RATE,
+            kubelet_dir: str = constant.KUBELET_DIR,
+    ):
         self._config = spconfig.SPConfig(os.environ.get("SP_NODE_NAME", None))
-        self._sp_api = spapi.Api.fromConfig()
+        self._mounts = MountTable()
+        self._mounter = get_mounter(mount_backend)
+        self._devices = DeviceWatcher()
+        self._device_wait_timeout = device_wait_timeout
+        self._locks = KeyedLock(lock_timeout)
+        self._mkfs_profile = mkfs_profile
+        self._discard_mode = discard_mode
+        self._trimmer = TrimScheduler(
+            self._mounts, self._locks, trim_interval, trim_rate, kubelet_dir
+        )
         self._node_id = (
                 str(self._config["SP_CLUSTER_ID"]).lower()
                 + "."
@@ -129,6 +139,10 @@ class NodeServicer(csi_pb2_grpc.NodeServicer):
         )
 
     def NodeGetInfo(self, request, context):
+        # The type definitions are large and only needed here, so they are
+        # not loaded at startup.
+        from storpool import sptypes  # pylint: disable=C0415
+
         return csi_pb2.NodeGetInfoResponse(
             node_id=self._node_id,
             max_volumes_per_node=sptypes.MAX_CLIENT_DISKS,
@@ -145,7 +159,216 @@ class NodeServicer(csi_pb2_grpc.NodeServicer):
 
         return response
 
+    @locked(
+        lambda request: [
+            f"volume:{request.volume_id}",
+            f"path:{request.staging_target_path}",
+        ]
+    )
     def NodeStageVolume(self, request, context):
+        self._check_stage_volume(request)
+
+        # The device may show up a moment after ControllerPublishVolume
+        # returns, wait for it rather than fail into the CO's backoff.
+        device = self._devices.wait(
+            request.volume_id, self._device_wait_time(context)
+        )
+        if device is None:
+            raise self._device_missing_error(request)
+
+        if request.volume_capability.WhichOneof("access_type") == "mount":
+            volume_requested_fs, mount_options = self._stage_options(request)
+
+            if not volume_is_mounted(self._mounts, request.volume_id):
+                superblock = probe(device)
+                if not superblock.formatted:
+                    logger.debug(
+                        """Volume %s is not formatted, formatting with %s""",
+                        request.volume_id,
+                        volume_requested_fs,
+                    )
+                    try:
+                        format_device(
+                            device,
+                            volume_requested_fs,
+                            request.volume_context,
+                            self._mkfs_profile,
+                        )
+                    except ValueError as error:
+                        raise InvalidArgument(str(error)) from error
+                    except FormatError as error:
+                        raise self._format_error(request, error) from error
+                else:
+                    self._check_formatted(
+                        request, superblock, volume_requested_fs
+                    )
+
+                    fs_uuid = self._cloned_fs_uuid(request, superblock)
+                    if fs_uuid is not None:
+                        try:
+                            set_uuid(device, superblock.fs_type, fs_uuid)
+                        except FormatError as error:
+                            raise self._set_uuid_error(
+                                request, error
+                            ) from error
+
+                logger.debug(
+                    """Volume %s is not mounted, mounting at %s""",
+                    request.volume_id,
+                    request.staging_target_path,
+                )
+
+                try:
+                    self._mounter.mount(
+                        device,
+                        request.staging_target_path,
+                        volume_requested_fs,
+                        mount_options.split(","),
+                    )
+                except MountError as error:
+                    raise self._mount_error(request, error) from error
+            else:
+                self._check_staged(request, mount_options)
+        else:
+            # Raw block volumes are published straight from their device
+            logger.info(
+                "Staging block volume %s, nothing to do", request.volume_id
+            )
+
+        return csi_pb2.NodeStageVolumeResponse()
+
+    @locked(
+        lambda request: [
+            f"volume:{request.volume_id}",
+            f"path:{request.staging_target_path}",
+        ]
+    )
+    def NodeUnstageVolume(self, request, context):
+        if not self._check_unstage_volume(request):
+            raise self._not_attached_error(request)
+
+        if volume_is_mounted(self._mounts, request.volume_id):
+            logger.debug("Volume %s is mounted, unmounting", request.volume_id)
+            try:
+                self._mounter.umount(request.staging_target_path)
+            except MountError as error:
+                raise self._umount_error(request, error) from error
+
+        return csi_pb2.NodeUnstageVolumeRequest()
+
+    @locked(
+        lambda request: [
+            f"volume:{request.volume_id}",
+            f"path:{request.target_path}",
+        ]
+    )
+    def NodePublishVolume(self, request, context):
+        source = self._publish_source(request)
+
+        if self._prepare_target(request):
+            try:
+                self._mounter.bind(
+                    source,
+                    request.target_path,
+                    self._bind_options(request),
+                )
+            except MountError as error:
+                raise self._bind_error(request, error) from error
+
+        return csi_pb2.NodePublishVolumeResponse()
+
+    @locked(
+        lambda request: [
+            f"volume:{request.volume_id}",
+            f"path:{request.target_path}",
+        ]
+    )
+    def NodeUnpublishVolume(self, request, context):
+        if self._check_unpublish_volume(request):
+            logger.debug(
+                "Volume %s is mounted, unmounting it", request.volume_id
+            )
+            try:
+                self._mounter.umount(request.target_path)
+            except MountError as error:
+                raise self._unbind_error(request, error) from error
+
+        target_path = Path(request.target_path)
+        if target_path.is_dir():
+            logger.debug(
+                "Volume target path %s exists, removing it",
+                request.target_path,
+            )
+            try:
+                self._mounter.rmdir(request.target_path)
+            except MountError as error:
+                raise self._remove_target_error(request, error) from error
+        else:
+            self._remove_target_file(request)
+
+        return csi_pb2.NodeUnpublishVolumeResponse()
+
+    @locked(lambda request: [f"volume:{request.volume_id}"])
+    def NodeExpandVolume(self, request, context):
+        """
+        Handles FS resize accordingly
+        :param request:
+        :param context:
+        :return:
+        """
+        return self._expand_volume(request)
+
+    def _expand_volume(self, request):
+        if not request.volume_id:
+            raise InvalidArgument("Missing volume id.")
+
+        if not volume_is_attached(request.volume_id):
+            raise self._not_attached_error(request)
+
+        if request.volume_capability.WhichOneof("access_type") == "block":
+            logger.info(f"Volume {request.volume_id} is a raw block volume, nothing to extend")
+            return csi_pb2.NodeExpandVolumeResponse()
+
+        logger.info(f"Extending volume {request.volume_id} file system")
+
+        mounts = volume_get_mounts(self._mounts, request.volume_id)
+        if not mounts:
+            raise FailedPrecondition(
+                f"StorPool volume {request.volume_id} is not staged"
+            )
+
+        # The staging mount comes first, the bind mounts follow it
+        mount = mounts[0]
+        logger.debug(
+            f"Volume {request.volume_id} has a {mount.fs_type} file system "
+            f"mounted at {mount.target}"
+        )
+
+        if mount.fs_type not in GROW_FUNCTIONS:
+            logger.error(f"CO requested to extend an unsupported file system: {mount.fs_type}")
+            raise Internal(f"Unsupported file system: {mount.fs_type}")
+
+        try:
+            new_size = grow(
+                mount.target,
+                mount.fs_type,
+                volume_get_real_path(request.volume_id),
+            )
+        except ResizeError as error:
+            error_message = f"Extending the file system for volume {request.volume_id} failed with: {error}"
+            logger.error(error_message)
+            raise Internal(error_message) from error
+
+        if new_size is None:
+            logger.debug(
+                f"The file system of volume {request.volume_id} already "
+                "fills it"
+            )
+
+        return csi_pb2.NodeExpandVolumeResponse()
+
+    @staticmethod
+    def _check_stage_volume(request):
         if not request.volume_id:
             raise InvalidArgument("Missing volume id.")
 
@@ -155,153 +378,191 @@ class NodeServicer(csi_pb2_grpc.NodeServicer):
         if not request.staging_target_path:
             raise InvalidArgument("Missing staging path.")
 
-        if not volume_is_attached(request.volume_id):
-            logger.error(
-                "Volume %s is not attached to %s.",
-                request.volume_id,
-                self._node_id,
-            )
-            raise NotFound(
-                f"""StorPool volume {request.volume_id} is not attached to node {self._node_id}."""
-            )
+    def _device_wait_time(self, context):
+        wait_timeout = self._device_wait_timeout
+        if context is not None and context.time_remaining() is not None:
+            wait_timeout = min(wait_timeout, context.time_remaining())
+        return wait_timeout
 
-        if request.volume_capability.WhichOneof("access_type") == "mount":
-            logger.info(
-                "Staging mount volume: %s to path: %s",
-                request.volume_id,
-                request.staging_target_path,
-            )
+    def _device_missing_error(self, request):
+        logger.error(
+            "Volume %s is not attached to %s.",
+            request.volume_id,
+            self._node_id,
+        )
+        return NotFound(
+            f"""StorPool volume {request.volume_id} is not attached to node {self._node_id}."""
+        )
 
-            volume_requested_fs = "ext4"
-            logger.debug("Assuming file system %s", volume_requested_fs)
+    def _not_attached_error(self, request):
+        return NotFound(
+            f"""StorPool volume {request.volume_id} is not attached to node {self._node_id}"""
+        )
 
-            if request.volume_capability.mount.fs_type:
-                volume_requested_fs = request.volume_capability.mount.fs_type
-                logger.debug(
-                    "CO specified file system: %s", volume_requested_fs
-                )
+    def _stage_options(self, request):
+        """
+        Returns the filesystem and the mount options to stage a volume with
+        """
+        logger.info(
+            "Staging mount volume: %s to path: %s",
+            request.volume_id,
+            request.staging_target_path,
+        )
+
+        volume_requested_fs = constant.DEFAULT_FS_TYPE
+        logger.debug("Assuming file system %s", volume_requested_fs)
 
+        if request.volume_capability.mount.fs_type:
+            volume_requested_fs = request.volume_capability.mount.fs_type
             logger.debug(
-                "CO specified readonly: %r",
-                request.publish_context["readonly"],
+                "CO specified file system: %s", volume_requested_fs
             )
 
-            if request.volume_capability.mount.mount_flags:
-                logger.debug(
-                    """CO specified the following mount options: %r""",
-                    request.volume_capability.mount.mount_flags,
-                )
+        logger.debug(
+            "CO specified readonly: %r",
+            request.publish_context["readonly"],
+        )
 
-            mount_options = generate_mount_options(
-                bool(
-                    distutils.util.strtobool(
-                        request.publish_context["readonly"]
-                    )
-                ),
+        if request.volume_capability.mount.mount_flags:
+            logger.debug(
+                """CO specified the following mount options: %r""",
                 request.volume_capability.mount.mount_flags,
             )
 
-            if not volume_is_mounted(request.volume_id):
-                if not volume_is_formatted(request.volume_id):
-                    logger.debug(
-                        """Volume %s is not formatted, formatting with %s""",
-                        request.volume_id,
-                        volume_requested_fs,
-                    )
-                    format_command = subprocess.run(
-                        [
-                            "mkfs." + volume_requested_fs,
-                            "/dev/storpool-byid/" + request.volume_id,
-                        ],
-                        stdout=subprocess.DEVNULL,
-                        encoding="utf-8",
-                        capture_output=False,
-                        check=False,
-                    )
-                    if format_command.returncode != 0:
-                        logger.error(
-                            """Failed to format volume %s with the following error: %s""",
-                            request.volume_id,
-                            format_command.stderr,
-                        )
-                        raise Internal(
-                            f"""StorPool volume {request.volume_id} format
-                             failed with error: {format_command.stderr}"""
-                        )
-                else:
-                    volume_current_fs = volume_get_fs(request.volume_id)
-                    if volume_requested_fs != volume_current_fs:
-                        logger.error(
-                            """Volume %s is already formatted with %s""",
-                            request.volume_id,
-                            volume_current_fs,
-                        )
-                        raise AlreadyExists(
-                            f"""StorPool volume {request.volume_id} is already formatted
-                             with {volume_current_fs} but CO tried to
-                             stage it with {volume_requested_fs}"""
-                        )
+        discard_mode = (
+                request.volume_context.get(DISCARD_MODE_PARAMETER)
+                or self._discard_mode
+        )
+        if discard_mode not in DISCARD_MODES:
+            raise InvalidArgument(
+                f"Unknown {DISCARD_MODE_PARAMETER} {discard_mode}, must "
+                f"be one of {', '.join(DISCARD_MODES)}"
+            )
 
-                logger.debug(
-                    """Volume %s is not mounted, mounting at %s""",
-                    request.volume_id,
-                    request.staging_target_path,
+        mount_options = generate_mount_options(
+            bool(
+                distutils.util.strtobool(
+                    request.publish_context["readonly"]
                 )
+            ),
+            request.volume_capability.mount.mount_flags,
+            discard_mode == "online",
+        )
 
-                mount_command = subprocess.run(
-                    [
-                        "mount",
-                        "-o",
-                        mount_options,
-                        volume_get_real_path(request.volume_id),
-                        request.staging_target_path,
-                    ],
-                    encoding="utf-8",
-                    capture_output=True,
-                    check=False,
-                )
+        return volume_requested_fs, mount_options
 
-                if mount_command.returncode != 0:
-                    logger.error(
-                        """Failed to mount volume %s with the following error: %s""",
-                        request.volume_id,
-                        mount_command.stderr,
-                    )
-                    raise Internal(
-                        f"""The following error occurred while
-                        mounting StorPool volume {request.volume_id}: {mount_command.stderr}"""
-                    )
-            else:
-                volume_mount_info = volume_get_mount_info(request.volume_id)
+    @staticmethod
+    def _format_error(request, error):
+        logger.error(
+            """Failed to format volume %s with the following error: %s""",
+            request.volume_id,
+            error,
+        )
+        return Internal(
+            f"""StorPool volume {request.volume_id} format
+             failed with error: {error}"""
+        )
 
-                if volume_mount_info["target"] != request.staging_target_path:
-                    logger.error(
-                        """Volume %s is already mounted at %s""",
-                        request.volume_id,
-                        request.staging_target_path,
-                    )
-                    raise AlreadyExists(
-                        f"""StorPool volume {request.volume_id} is
-                         already mounted at {volume_mount_info['target']}"""
-                    )
+    @staticmethod
+    def _check_formatted(request, superblock, volume_requested_fs):
+        volume_current_fs = superblock.fs_type
+        if volume_requested_fs != volume_current_fs:
+            logger.error(
+                """Volume %s is already formatted with %s""",
+                request.volume_id,
+                volume_current_fs,
+            )
+            raise AlreadyExists(
+                f"""StorPool volume {request.volume_id} is already formatted
+                 with {volume_current_fs} but CO tried to
+                 stage it with {volume_requested_fs}"""
+            )
 
-                if (
-                        request.volume_capability.mount.mount_flags
-                        and volume_mount_info["options"] != mount_options
-                ):
-                    logger.error(
-                        """Volume %s is already mounted with %s""",
-                        request.volume_id,
-                        volume_mount_info["options"],
-                    )
-                    raise AlreadyExists(
-                        f"""StorPool volume {request.volume_id} is
-                         already mounted with {volume_mount_info['options']}"""
-                    )
+    @staticmethod
+    def _cloned_fs_uuid(request, superblock):
+        """
+        Returns the filesystem UUID to give a volume cloned from a formatted
+        snapshot, so that the clones of the snapshot can be mounted
+        together, None if it already has it or is no such clone. The UUID
+        is derived from the volume id, so it is only set on the first
+        staging of the volume.
+        """
+        if not request.volume_context.get(CLONED_FS_PARAMETER):
+            return None
 
-        return csi_pb2.NodeStageVolumeResponse()
+        fs_uuid = cloned_fs_uuid(request.volume_id)
+        if superblock.uuid == fs_uuid:
+            return None
 
-    def NodeUnstageVolume(self, request, context):
+        logger.debug(
+            "Volume %s has the filesystem UUID %s of its snapshot",
+            request.volume_id,
+            superblock.uuid,
+        )
+        return fs_uuid
+
+    @staticmethod
+    def _set_uuid_error(request, error):
+        logger.error(
+            "Failed to set the filesystem UUID of volume %s: %s",
+            request.volume_id,
+            error,
+        )
+        return Internal(
+            f"Failed to set the filesystem UUID of StorPool volume "
+            f"{request.volume_id}: {error}"
+        )
+
+    @staticmethod
+    def _mount_error(request, error):
+        logger.error(
+            """Failed to mount volume %s with the following error: %s""",
+            request.volume_id,
+            error,
+        )
+        return Internal(
+            f"""The following error occurred while
+            mounting StorPool volume {request.volume_id}: {error}"""
+        )
+
+    def _check_staged(self, request, mount_options):
+        """
+        Checks that the mounted volume is staged as requested
+        """
+        volume_mount_info = volume_get_mount_info(
+            self._mounts, request.volume_id
+        )
+
+        if volume_mount_info.target != request.staging_target_path:
+            logger.error(
+                """Volume %s is already mounted at %s""",
+                request.volume_id,
+                request.staging_target_path,
+            )
+            raise AlreadyExists(
+                f"""StorPool volume {request.volume_id} is
+                 already mounted at {volume_mount_info.target}"""
+            )
+
+        if (
+                request.volume_capability.mount.mount_flags
+                and volume_mount_info.options != mount_options
+        ):
+            logger.error(
+                """Volume %s is already mounted with %s""",
+                request.volume_id,
+                volume_mount_info.options,
+            )
+            raise AlreadyExists(
+                f"""StorPool volume {request.volume_id} is
+                 already mounted with {volume_mount_info.options}"""
+            )
+
+    def _check_unstage_volume(self, request):
+        """
+        Validates a NodeUnstageVolume request, returns whether the volume
+        is attached
+        """
         if not request.volume_id:
             raise InvalidArgument("Missing volume id")
 
@@ -309,40 +570,32 @@ class NodeServicer(csi_pb2_grpc.NodeServicer):
             raise InvalidArgument("Missing stating target path")
 
         if not volume_is_attached(request.volume_id):
-            raise NotFound(
-                f"""StorPool volume {request.volume_id} is not attached to node {self._node_id}"""
-            )
+            return False
 
         logger.info(
             """Unstaging volume %s from path %s""",
             request.volume_id,
             request.staging_target_path,
         )
+        return True
 
-        if volume_is_mounted(request.volume_id):
-            logger.debug("Volume %s is mounted, unmounting", request.volume_id)
-            unmount_command = subprocess.run(
-                ["umount", request.staging_target_path],
-                encoding="utf-8",
-                capture_output=True,
-                check=False,
-            )
-            if unmount_command.returncode != 0:
-                logger.error(
-                    """Failed to unmount volume %s with the following error: %s""",
-                    request.volume_id,
-                    unmount_command.stderr,
-                )
-                raise Internal(
-                    context.set_details(
-                        f"""The following error occurred while unmounting
-                         StorPool volume {request.volume_id}: {unmount_command.stderr}"""
-                    )
-                )
-
-        return csi_pb2.NodeUnstageVolumeRequest()
+    @staticmethod
+    def _umount_error(request, error):
+        logger.error(
+            """Failed to unmount volume %s with the following error: %s""",
+            request.volume_id,
+            error,
+        )
+        return Internal(
+            f"""The following error occurred while unmounting
+             StorPool volume {request.volume_id}: {error}"""
+        )
 
-    def NodePublishVolume(self, request, context):
+    def _publish_source(self, request):
+        """
+        Validates a NodePublishVolume request, returns what to bind mount
+        at the target path
+        """
         if not request.volume_id:
             raise InvalidArgument("Missing volume id")
 
@@ -358,56 +611,69 @@ class NodeServicer(csi_pb2_grpc.NodeServicer):
             request.target_path,
         )
 
-        target_path = Path(request.target_path)
+        if request.volume_capability.WhichOneof("access_type") != "block":
+            return request.staging_target_path
+
+        source = self._devices.resolve(request.volume_id)
+        if source is None:
+            raise self._not_attached_error(request)
+        return source
 
+    def _prepare_target(self, request):
+        """
+        Creates the target path of a NodePublishVolume request, returns
+        whether it still has to be mounted
+        """
+        target_path = Path(request.target_path)
         if not target_path.exists():
             logger.debug(
                 "Target path %s doesn't exist, creating it.",
                 request.target_path,
             )
-            target_path.mkdir(mode=755, parents=True, exist_ok=True)
+            if request.volume_capability.WhichOneof("access_type") == "block":
+                # The device is bind mounted onto a file
+                target_path.parent.mkdir(mode=755, parents=True, exist_ok=True)
+                target_path.touch(mode=0o600)
+            else:
+                target_path.mkdir(mode=755, parents=True, exist_ok=True)
 
-        if not target_path.is_mount():
-            logger.debug(
-                "Volume %s is not mounted, mounting it.", request.volume_id
-            )
-            mount_options = ["bind"]
+        if self._mounts.is_mount_point(request.target_path):
+            return False
 
-            if request.readonly:
-                mount_options.append("ro")
-            else:
-                mount_options.append("rw")
+        logger.debug(
+            "Volume %s is not mounted, mounting it.", request.volume_id
+        )
+        return True
 
-            mount_options.extend(request.volume_capability.mount.mount_flags)
+    @staticmethod
+    def _bind_options(request):
+        mount_options = []
 
-            mount_command = subprocess.run(
-                [
-                    "mount",
-                    "-o",
-                    ",".join(mount_options),
-                    request.staging_target_path,
-                    request.target_path,
-                ],
-                encoding="utf-8",
-                capture_output=False,
-                check=False,
-                stdout=subprocess.DEVNULL,
-            )
+        if request.readonly:
+            mount_options.append("ro")
+        else:
+            mount_options.append("rw")
 
-            if mount_command.returncode != 0:
-                logger.error(
-                    "Binding volume %s failed with: %s",
-                    request.volume_id,
-                    mount_command.stderr,
-                )
-                raise Internal(
-                    f"""The following error occurred
-                     while binding StorPool volume {request.volume_id}: {mount_command.stderr}"""
-                )
+        mount_options.extend(request.volume_capability.mount.mount_flags)
+        return mount_options
 
-        return csi_pb2.NodePublishVolumeResponse()
+    @staticmethod
+    def _bind_error(request, error):
+        logger.error(
+            "Binding volume %s failed with: %s",
+            request.volume_id,
+            error,
+        )
+        return Internal(
+            f"""The following error occurred
+             while binding StorPool volume {request.volume_id}: {error}"""
+        )
 
-    def NodeUnpublishVolume(self, request, context):
+    def _check_unpublish_volume(self, request):
+        """
+        Validates a NodeUnpublishVolume request, returns whether the target
+        path is mounted
+        """
         if not request.volume_id:
             raise InvalidArgument("Missing volume id")
 
@@ -420,97 +686,45 @@ class NodeServicer(csi_pb2_grpc.NodeServicer):
             request.target_path,
         )
 
-        target_path = Path(request.target_path)
-
-        if target_path.is_mount():
-            logger.debug(
-                "Volume %s is mounted, unmounting it", request.volume_id
-            )
-            unmount_command = subprocess.run(
-                ["umount", request.target_path],
-                encoding="utf-8",
-                capture_output=False,
-                check=False,
-                stdout=subprocess.DEVNULL,
-            )
-
-            if unmount_command.returncode != 0:
-                logger.error(
-                    "Unbinding volume %s failed with: %s",
-                    request.volume_id,
-                    unmount_command.stderr,
-                )
-                raise Internal(
-                    f"""The following error occurred while unbinding
-                     StorPool volume {request.volume_id}: {unmount_command.stderr}"""
-                )
-
-        if target_path.is_dir():
-            logger.debug(
-                "Volume target path %s exists, removing it",
-                request.target_path,
-            )
-            remove_target_path_command = subprocess.run(
-                ["rmdir", request.target_path],
-                encoding="utf-8",
-                capture_output=False,
-                check=False,
-                stdout=subprocess.DEVNULL,
-            )
-
-            if remove_target_path_command.returncode != 0:
-                logger.error(
-                    """Failed to remove target path %s, error: %s""",
-                    request.volume_id,
-                    remove_target_path_command.stderr,
-                )
-                raise Internal(
-                    f"""The following error occurred while removing
-                     the target path {request.volume_id}: {remove_target_path_command.stderr}"""
-                )
+        return self._mounts.is_mount_point(request.target_path)
 
-        return csi_pb2.NodeUnpublishVolumeResponse()
+    @staticmethod
+    def _unbind_error(request, error):
+        logger.error(
+            "Unbinding volume %s failed with: %s",
+            request.volume_id,
+            error,
+        )
+        return Internal(
+            f"""The following error occurred while unbinding
+             StorPool volume {request.volume_id}: {error}"""
+        )
 
-    def NodeExpandVolume(self, request, context):
+    def _remove_target_file(self, request):
         """
-        Handles FS resize accordingly
-        :param request:
-        :param context:
-        :return:
+        Removes the target file a block volume was bind mounted onto
         """
+        target_path = Path(request.target_path)
+        if not target_path.is_file():
+            return
 
-        if not request.volume_id:
-            raise InvalidArgument("Missing volume id.")
-
-        logger.info(f"Extending volume {request.volume_id} file system")
-
-        volume_fs = volume_get_fs(request.volume_id)
-
-        logger.debug(f"Detected volume {request} file system type: {volume_fs}")
-
+        logger.debug(
+            "Block volume target file %s exists, removing it",
+            request.target_path,
+        )
         try:
-            extend_fs_tool = RESIZE_TOOL_MAP[volume_fs]
-
-            logger.debug(f"Using {extend_fs_tool} to extend the file system")
-
-            extend_command = subprocess.run([
-                extend_fs_tool,
-                volume_get_real_path(request.volume_id)
-            ],
-                encoding="utf-8",
-                capture_output=True,
-                check=False,
-            )
-
-            if extend_command.returncode != 0:
-                error_message = f"Extending the file system for volume {request.volume_id} failed with: {extend_command.stderr}"
-                logger.error(error_message)
-                raise Internal(error_message)
-
-            logger.debug(f"Resize tool output: {extend_command.stdout}")
-
-            expand_volume_response = csi_pb2.NodeExpandVolumeResponse()
-            return expand_volume_response
-        except KeyError:
-            logger.error(f"CO requested to extend an unsupported file system: {volume_fs}")
-            raise Internal(f"Unsupported file system: {volume_fs}")
+            target_path.unlink()
+        except OSError as error:
+            raise self._remove_target_error(request, error) from error
+
+    @staticmethod
+    def _remove_target_error(request, error):
+        logger.error(
+            """Failed to remove target path %s, error: %s""",
+            request.volume_id,
+            error,
+        )
+        return Internal(
+            f"""The following error occurred while removing
+             the target path {request.volume_id}: {error}"""
+        )
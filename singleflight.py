@@ -0,0 +1,173 @@
+"""
+Deduplication of concurrent operations on the same volume
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+from concurrent import futures
+
+from grpc_interceptor.exceptions import Aborted, DeadlineExceeded
+
+import metrics
+
+logger = logging.getLogger("SingleFlight")
+
+_deduplicated = metrics.counter(
+    "singleflight_deduplicated_total",
+    "Calls which waited for an identical call already in progress",
+)
+_aborted = metrics.counter(
+    "singleflight_aborted_total",
+    "Calls rejected because another operation on the volume is in progress",
+)
+
+
+class SingleFlight:
+    """
+    Allows a single operation per resource (e.g. a volume) at a time.
+
+    A call identical to the one in progress waits for its result instead of
+    repeating it, a different call on the same resource is rejected with
+    ABORTED as recommended by the CSI spec.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def run(self, resource: str, key, function, timeout: float = None):
+        """
+        Runs the function unless an identical call is already in progress
+        :param resource: The resource the operation works on
+        :type resource: str
+        :param key: Identifies the call, equal keys are deduplicated
+        :param function: The operation itself
+        :param timeout: Maximum seconds to wait for a call in progress
+        :type timeout: float
+        :return: The result of the function
+        """
+        future, inflight = self._join(resource, key)
+        if future is None:
+            try:
+                return inflight.result(timeout)
+            except futures.TimeoutError as error:
+                raise DeadlineExceeded(
+                    f"Timed out waiting for {key[0]} on {resource}"
+                ) from error
+
+        try:
+            result = function()
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._leave(resource)
+
+    async def run_async(
+        self, resource: str, key, function, timeout: float = None
+    ):
+        """
+        Runs the coroutine function like run, for the asyncio server
+        :param resource: The resource the operation works on
+        :type resource: str
+        :param key: Identifies the call, equal keys are deduplicated
+        :param function: Coroutine function doing the operation
+        :param timeout: Maximum seconds to wait for a call in progress
+        :type timeout: float
+        :return: The result of the function
+        """
+        future, inflight = self._join(resource, key)
+        if future is None:
+            try:
+                # Shielded, so that giving up does not cancel the result
+                # the other callers wait for
+                return await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(inflight)), timeout
+                )
+            except asyncio.TimeoutError as error:
+                raise DeadlineExceeded(
+                    f"Timed out waiting for {key[0]} on {resource}"
+                ) from error
+
+        try:
+            result = await function()
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._leave(resource)
+
+    def _join(self, resource: str, key) -> tuple:
+        """
+        Starts an operation on the resource, returning its future, or finds
+        the identical call in progress, returning its future to wait for
+        """
+        with self._lock:
+            inflight = self._inflight.get(resource)
+            if inflight is None:
+                future = futures.Future()
+                self._inflight[resource] = (key, future)
+                return future, None
+            if inflight[0] != key:
+                _aborted.inc(operation=key[0])
+                raise Aborted(
+                    f"Another operation on {resource} is in progress"
+                )
+
+        _deduplicated.inc(operation=key[0])
+        logger.debug("Waiting for %s on %s in progress", key[0], resource)
+        return None, inflight[1]
+
+    def _leave(self, resource: str) -> None:
+        with self._lock:
+            del self._inflight[resource]
+
+
+def deduplicated(resource):
+    """
+    Decorates a servicer method, or coroutine method of an asyncio
+    servicer, to run through the servicer's `_inflight` SingleFlight
+    instance
+    :param resource: Callable returning the resource of a request
+    """
+
+    def decorator(method):
+        if asyncio.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def async_wrapper(self, request, context):
+                return await self._inflight.run_async(  # pylint: disable=W0212
+                    resource(request),
+                    (
+                        method.__name__,
+                        request.SerializeToString(deterministic=True),
+                    ),
+                    lambda: method(self, request, context),
+                    context.time_remaining() if context is not None else None,
+                )
+
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(self, request, context):
+            return self._inflight.run(  # pylint: disable=W0212
+                resource(request),
+                (
+                    method.__name__,
+                    request.SerializeToString(deterministic=True),
+                ),
+                lambda: method(self, request, context),
+                context.time_remaining() if context is not None else None,
+            )
+
+        return wrapper
+
+    return decorator
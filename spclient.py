@@ -0,0 +1,635 @@
+"""
+Shared StorPool API client with connection pooling, retries and a circuit
+breaker
+"""
+
+import asyncio
+import errno
+import functools
+import http.client
+import logging
+import queue
+import random
+import select
+import socket
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+from urllib.parse import urlparse
+
+from grpc_interceptor.exceptions import DeadlineExceeded, Unavailable
+from storpool import spapi, spconfig, spjson
+
+import constant
+import metrics
+
+logger = logging.getLogger("StorPoolClient")
+
+_requests = metrics.counter(
+    "api_requests_total", "StorPool API requests by endpoint and result"
+)
+_request_seconds = metrics.summary(
+    "api_request_seconds", "StorPool API request latency by endpoint"
+)
+_retries = metrics.counter(
+    "api_retries_total", "Retried StorPool API requests by endpoint"
+)
+_circuit_open = metrics.gauge(
+    "api_circuit_open", "Whether the StorPool API circuit breaker is open"
+)
+
+# Endpoints which block until the clients catch up, possibly for far
+# longer than a regular request takes
+LONG_WAIT_ENDPOINTS = frozenset(["VolumesReassignWait"])
+
+IDEMPOTENT_METHODS = frozenset(["GET"])
+
+_options = {
+    "timeout": constant.SP_API_TIMEOUT,
+    "long_timeout": constant.SP_API_LONG_TIMEOUT,
+    "retries": constant.SP_API_RETRIES,
+    "pool_size": constant.SP_API_POOL_SIZE,
+    "breaker_threshold": constant.SP_API_BREAKER_THRESHOLD,
+    "breaker_reset": constant.SP_API_BREAKER_RESET,
+}
+
+
+class ApiUnavailableError(Unavailable):
+    """
+    Raised when the StorPool API cannot be reached
+    """
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast after `threshold` consecutive failures, letting a
+    single trial call through every `reset_timeout` seconds until one
+    succeeds.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self._threshold = threshold
+        self._reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+
+    def before_call(self) -> None:
+        """
+        Checks whether a call may be made
+        :raises ApiUnavailableError: if the circuit is open
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+
+            if time.monotonic() - self._opened_at < self._reset_timeout:
+                raise ApiUnavailableError(
+                    "StorPool API is unavailable, failing fast"
+                )
+
+            # Let this call through as a trial, keep failing the others
+            # until it completes.
+            self._opened_at = time.monotonic()
+
+    def record_success(self) -> None:
+        """
+        Closes the circuit
+        """
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("StorPool API is reachable again")
+            self._failures = 0
+            self._opened_at = None
+        _circuit_open.set(0)
+
+    def record_failure(self) -> None:
+        """
+        Counts a failed call, opening the circuit if there are too many
+        """
+        with self._lock:
+            self._failures += 1
+            if self._threshold <= 0 or self._failures < self._threshold:
+                return
+            if self._opened_at is None:
+                logger.error(
+                    "StorPool API failed %d times in a row, opening circuit",
+                    self._failures,
+                )
+            self._opened_at = time.monotonic()
+        _circuit_open.set(1)
+
+    @property
+    def is_open(self) -> bool:
+        """
+        Whether calls are currently failing fast
+        """
+        with self._lock:
+            return self._opened_at is not None
+
+
+class Api(spapi.Api):
+    """
+    StorPool API bindings reusing persistent HTTP connections.
+
+    Every call has a timeout, `long_timeout` for the endpoints waiting for
+    the clients. Calls which are safe to repeat (GET requests, requests
+    which never reached the API and errors the API marks as transient) are
+    retried with jittered exponential backoff.
+
+    A timeout of a long wait means the clients are slow rather than the
+    API being down, so it fails the call with DEADLINE_EXCEEDED and does
+    not count towards opening the circuit.
+    """
+
+    def __init__(
+        self,
+        *args,
+        long_timeout: float = constant.SP_API_LONG_TIMEOUT,
+        retries: int = constant.SP_API_RETRIES,
+        pool_size: int = constant.SP_API_POOL_SIZE,
+        breaker_threshold: int = constant.SP_API_BREAKER_THRESHOLD,
+        breaker_reset: float = constant.SP_API_BREAKER_RESET,
+        **kwargs,
+    ):
+        super().__init__(*args, transientRetries=0, **kwargs)
+        self._long_timeout = long_timeout
+        self._retries = retries
+        self._connections = queue.LifoQueue(maxsize=pool_size)
+        self._breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+
+    def __call__(
+        self, method, multiCluster, query, json=None, clusterName=None
+    ):
+        body = (
+            spjson.dumps(spapi.clear_none(json)) if json is not None else None
+        )
+        path = _path(query, multiCluster and self._multiCluster, clusterName)
+        if method == "GET" and body:
+            path += "?json=" + urllib.parse.quote(body, safe="")
+            body = None
+
+        endpoint = query.split("/")[0]
+        long_wait = endpoint in LONG_WAIT_ENDPOINTS
+        timeout = self._long_timeout if long_wait else self._timeout
+        attempt = 0
+        while True:
+            self._breaker.before_call()
+
+            started = time.monotonic()
+            try:
+                status, result = self._request(method, path, body, timeout)
+            except (OSError, http.client.HTTPException) as error:
+                if long_wait and isinstance(error, socket.timeout):
+                    _requests.inc(endpoint=endpoint, result="timeout")
+                    raise DeadlineExceeded(
+                        f"StorPool API request {endpoint} did not complete "
+                        f"in {timeout}s"
+                    ) from error
+                _unreachable(
+                    self._breaker,
+                    self._retries,
+                    method,
+                    endpoint,
+                    attempt,
+                    error,
+                )
+            else:
+                self._breaker.record_success()
+                _request_seconds.observe(
+                    time.monotonic() - started, endpoint=endpoint
+                )
+
+                if status == http.HTTPStatus.OK and "error" not in result:
+                    _requests.inc(endpoint=endpoint, result="ok")
+                    return result["data"]
+
+                api_error = spapi.ApiError(status, result)
+                _requests.inc(endpoint=endpoint, result=api_error.name)
+                if attempt >= self._retries or not api_error.transient:
+                    raise api_error
+
+            _retries.inc(endpoint=endpoint)
+            time.sleep(_backoff(attempt))
+            attempt += 1
+
+    def _request(self, method, path, body, timeout):
+        idempotent = method in IDEMPOTENT_METHODS
+        while True:
+            try:
+                connection, reused = self._connections.get_nowait(), True
+            except queue.Empty:
+                connection, reused = self._connect(), False
+
+            if reused and not idempotent and self._is_dropped(connection):
+                # Never send a request which must not be repeated over a
+                # connection the API may have closed meanwhile.
+                connection.close()
+                continue
+
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+
+            try:
+                connection.request(method, path, body, self._authHeader)
+                response = connection.getresponse()
+                status, result = response.status, spjson.load(response)
+            except (
+                BrokenPipeError,
+                ConnectionResetError,
+                http.client.RemoteDisconnected,
+            ):
+                connection.close()
+                # The API most likely closed the idle connection before it
+                # received the request. Whether it did cannot be known for
+                # sure, so only idempotent requests are sent again.
+                if reused and idempotent:
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                try:
+                    self._connections.put_nowait(connection)
+                except queue.Full:
+                    connection.close()
+
+            return status, result
+
+    def _connect(self) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection(
+            self._host, self._port, timeout=self._timeout, **self._source
+        )
+
+    @staticmethod
+    def _is_dropped(connection: http.client.HTTPConnection) -> bool:
+        """
+        Whether the API closed an idle connection, which makes its socket
+        readable
+        """
+        if connection.sock is None:
+            return True
+        readable, _, _ = select.select([connection.sock], [], [], 0)
+        return bool(readable)
+
+
+class _Binding:
+    """
+    Stands in for the API client in the spapi bindings, which validate the
+    arguments, build the request and convert its result
+    """
+
+    def __init__(self, data=None):
+        self.data = data
+        self.request = None
+
+    # clusterName is passed by keyword
+    def __call__(
+        self, method, multi_cluster, query, json=None, clusterName=None
+    ):  # pylint: disable=C0103
+        self.request = (method, multi_cluster, query, json, clusterName)
+        return self.data
+
+
+class AsyncApi:
+    """
+    StorPool API client for the asyncio server, with the timeouts, retries
+    and circuit breaker of Api.
+
+    Its methods are coroutine versions of the spapi.Api methods, e.g.
+    `await sp_api.volumeInfo(name)`, sharing their argument checks and
+    result types. Requests are sent over asyncio streams, so a call waiting
+    for the API does not take a thread.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        auth: str,
+        timeout: float = constant.SP_API_TIMEOUT,
+        long_timeout: float = constant.SP_API_LONG_TIMEOUT,
+        retries: int = constant.SP_API_RETRIES,
+        pool_size: int = constant.SP_API_POOL_SIZE,
+        breaker_threshold: int = constant.SP_API_BREAKER_THRESHOLD,
+        breaker_reset: float = constant.SP_API_BREAKER_RESET,
+        multi_cluster: bool = True,
+    ):
+        self._host = host
+        self._port = port
+        self._auth_header = {"Authorization": f"Storpool v1:{auth}"}
+        self._timeout = timeout
+        self._long_timeout = long_timeout
+        self._retries = retries
+        self._pool_size = pool_size
+        self._multi_cluster = multi_cluster
+        self._connections = []
+        self._breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+
+    def __getattr__(self, name):
+        binding = getattr(spapi.Api, name, None)
+        if not (binding.__doc__ or "").startswith("HTTP:"):
+            raise AttributeError(f"StorPool API has no call {name!r}")
+
+        async def call(*args, **kwargs):
+            request = _Binding()
+            binding(request, *args, returnRawAPIData=True, **kwargs)
+            data = await self._call(*request.request)
+            return binding(_Binding(data), *args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = binding.__doc__
+        setattr(self, name, call)
+        return call
+
+    async def _call(
+        self, method, multi_cluster, query, json=None, cluster_name=None
+    ):
+        body = (
+            spjson.dumps(spapi.clear_none(json)) if json is not None else None
+        )
+        path = _path(
+            query, multi_cluster and self._multi_cluster, cluster_name
+        )
+        if method == "GET" and body:
+            path += "?json=" + urllib.parse.quote(body, safe="")
+            body = None
+
+        endpoint = query.split("/")[0]
+        long_wait = endpoint in LONG_WAIT_ENDPOINTS
+        timeout = self._long_timeout if long_wait else self._timeout
+        attempt = 0
+        while True:
+            self._breaker.before_call()
+
+            started = time.monotonic()
+            try:
+                status, result = await self._request(
+                    method, path, body, timeout
+                )
+            except (OSError, http.client.HTTPException) as error:
+                if long_wait and isinstance(error, socket.timeout):
+                    _requests.inc(endpoint=endpoint, result="timeout")
+                    raise DeadlineExceeded(
+                        f"StorPool API request {endpoint} did not complete "
+                        f"in {timeout}s"
+                    ) from error
+                _unreachable(
+                    self._breaker,
+                    self._retries,
+                    method,
+                    endpoint,
+                    attempt,
+                    error,
+                )
+            else:
+                self._breaker.record_success()
+                _request_seconds.observe(
+                    time.monotonic() - started, endpoint=endpoint
+                )
+
+                if status == http.HTTPStatus.OK and "error" not in result:
+                    _requests.inc(endpoint=endpoint, result="ok")
+                    return result["data"]
+
+                api_error = spapi.ApiError(status, result)
+                _requests.inc(endpoint=endpoint, result=api_error.name)
+                if attempt >= self._retries or not api_error.transient:
+                    raise api_error
+
+            _retries.inc(endpoint=endpoint)
+            await asyncio.sleep(_backoff(attempt))
+            attempt += 1
+
+    async def _request(self, method, path, body, timeout):
+        idempotent = method in IDEMPOTENT_METHODS
+        while True:
+            if self._connections:
+                (reader, writer), reused = self._connections.pop(), True
+            else:
+                reader, writer = await self._connect()
+                reused = False
+
+            if reused and not idempotent and reader.at_eof():
+                # Never send a request which must not be repeated over a
+                # connection the API has closed meanwhile.
+                writer.close()
+                continue
+
+            try:
+                status, result, keep_alive = await asyncio.wait_for(
+                    self._exchange(reader, writer, method, path, body),
+                    timeout,
+                )
+            except asyncio.TimeoutError as error:
+                writer.close()
+                raise socket.timeout("timed out") from error
+            except (
+                BrokenPipeError,
+                ConnectionResetError,
+                http.client.RemoteDisconnected,
+            ):
+                writer.close()
+                # The API most likely closed the idle connection before it
+                # received the request, only idempotent requests are sent
+                # again.
+                if reused and idempotent:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+
+            if keep_alive and len(self._connections) < self._pool_size:
+                self._connections.append((reader, writer))
+            else:
+                writer.close()
+
+            return status, result
+
+    async def _connect(self) -> tuple:
+        try:
+            return await asyncio.wait_for(
+                asyncio.open_connection(self._host, self._port),
+                self._timeout,
+            )
+        except asyncio.TimeoutError as error:
+            raise socket.timeout("timed out") from error
+
+    async def _exchange(self, reader, writer, method, path, body) -> tuple:
+        payload = body.encode("utf-8") if body is not None else b""
+        head = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: {self._host}:{self._port}",
+            f"Content-Length: {len(payload)}",
+        ] + [f"{name}: {value}" for name, value in self._auth_header.items()]
+        writer.write("\r\n".join(head + ["", ""]).encode("latin-1") + payload)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise http.client.RemoteDisconnected(
+                "Remote end closed connection without response"
+            )
+        version, status, _ = (
+            status_line.decode("latin-1").rstrip("\r\n") + "  "
+        ).split(" ", 2)
+        if not version.startswith("HTTP/") or not status.isdigit():
+            raise http.client.BadStatusLine(status_line.decode("latin-1"))
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = (
+            version == "HTTP/1.1"
+            and headers.get("connection", "").lower() != "close"
+        )
+        try:
+            if headers.get("transfer-encoding", "").lower() == "chunked":
+                data = await self._read_chunked(reader)
+            elif "content-length" in headers:
+                data = await reader.readexactly(int(headers["content-length"]))
+            else:
+                data = await reader.read()
+                keep_alive = False
+        except asyncio.IncompleteReadError as error:
+            raise http.client.IncompleteRead(error.partial) from error
+
+        return int(status), spjson.loads(data.decode("utf-8")), keep_alive
+
+    @staticmethod
+    async def _read_chunked(reader) -> bytes:
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                # Skip the trailer
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+
+def _path(query: str, multi_cluster: bool, cluster_name: str) -> str:
+    return "{pref}/{remote}{multi}{query}".format(
+        pref=spapi.SP_API_PREFIX,
+        remote=f"RemoteCommand/{cluster_name}/" if cluster_name else "",
+        multi="MultiCluster/" if multi_cluster else "",
+        query=query,
+    )
+
+
+def _unreachable(breaker, retries, method, endpoint, attempt, error) -> None:
+    """
+    Counts a request which did not reach the API, raising unless it is to
+    be retried
+    """
+    breaker.record_failure()
+    _requests.inc(endpoint=endpoint, result="unreachable")
+
+    if attempt >= retries or breaker.is_open or not _can_retry(method, error):
+        raise ApiUnavailableError(
+            f"StorPool API request {endpoint} failed: {error}"
+        ) from error
+
+
+def _can_retry(method, error) -> bool:
+    if method in IDEMPOTENT_METHODS:
+        return True
+    # The request was never sent, so it is safe to repeat it.
+    return isinstance(error, OSError) and error.errno == errno.ECONNREFUSED
+
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(
+        0,
+        min(
+            constant.SP_API_BACKOFF_MAX,
+            constant.SP_API_BACKOFF_BASE * 2 ** attempt,
+        ),
+    )
+
+
+def configure(**options) -> None:
+    """
+    Sets the options of the clients created by get_api() afterwards
+    :param options: timeout, long_timeout, retries, pool_size,
+        breaker_threshold or breaker_reset
+    """
+    unknown = set(options) - set(_options)
+    if unknown:
+        raise ValueError(f"Unknown StorPool API client options: {unknown}")
+    _options.update(options)
+    _get_client.cache_clear()
+
+
+def get_api(sp_api_endpoint: str = None, sp_api_token: str = None) -> Api:
+    """
+    Returns the StorPool API client shared by all services. The endpoint
+    and token are loaded from /etc/storpool.conf when it exists.
+    :param sp_api_endpoint: StorPool API endpoint, e.g. http://host:81
+    :type sp_api_endpoint: str
+    :param sp_api_token: StorPool API authentication token
+    :type sp_api_token: str
+    :return: The API client
+    :rtype: Api
+    """
+    return _get_client(*_endpoint(sp_api_endpoint, sp_api_token))
+
+
+def get_async_api(
+    sp_api_endpoint: str = None, sp_api_token: str = None
+) -> AsyncApi:
+    """
+    Returns a new StorPool API client for the asyncio server, configured
+    like the clients returned by get_api(). It must only be used from the
+    event loop it first runs in.
+    :param sp_api_endpoint: StorPool API endpoint, e.g. http://host:81
+    :type sp_api_endpoint: str
+    :param sp_api_token: StorPool API authentication token
+    :type sp_api_token: str
+    :return: The API client
+    :rtype: AsyncApi
+    """
+    host, port, token = _endpoint(sp_api_endpoint, sp_api_token)
+    logger.debug("Connecting to StorPool API at %s:%s", host, port)
+    return AsyncApi(host, port, token, **_options)
+
+
+def _endpoint(sp_api_endpoint: str, sp_api_token: str) -> tuple:
+    if Path("/etc/storpool.conf").exists():
+        logger.debug(
+            "Found /etc/storpool.conf, loading API endpoint and token from it"
+        )
+        config = spconfig.SPConfig()
+        return (
+            config["SP_API_HTTP_HOST"],
+            int(config["SP_API_HTTP_PORT"]),
+            config["SP_AUTH_TOKEN"],
+        )
+
+    if sp_api_endpoint is None or sp_api_token is None:
+        raise RuntimeError(
+            "StorPool API endpoint or authentication token not specified"
+        )
+
+    url = urlparse(sp_api_endpoint, "http")
+    return url.hostname, url.port, sp_api_token
+
+
+@functools.lru_cache(maxsize=None)
+def _get_client(host: str, port: int, token: str) -> Api:
+    logger.debug("Connecting to StorPool API at %s:%s", host, port)
+    return Api(host=host, port=port, auth=token, multiCluster=True, **_options)
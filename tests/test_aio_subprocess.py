@@ -0,0 +1,60 @@
+"""
+Tests of running commands from the asyncio server
+"""
+
+import asyncio
+import subprocess
+import time
+
+import pytest
+
+import aio_subprocess
+
+
+def test_output_and_exit_code_are_returned():
+    result = asyncio.run(
+        aio_subprocess.run(["sh", "-c", "echo out; echo err >&2; exit 3"])
+    )
+
+    assert result.returncode == 3
+    assert result.stdout == "out\n"
+    assert result.stderr == "err\n"
+
+
+def test_output_can_be_discarded():
+    result = asyncio.run(
+        aio_subprocess.run(["echo", "out"], stdout=subprocess.DEVNULL)
+    )
+
+    assert result.returncode == 0
+    assert result.stdout is None
+
+
+def test_commands_run_concurrently():
+    async def run_all():
+        return await asyncio.gather(
+            *(aio_subprocess.run(["sleep", "0.3"]) for _ in range(20))
+        )
+
+    started = time.monotonic()
+    results = asyncio.run(run_all())
+
+    assert all(result.returncode == 0 for result in results)
+    assert time.monotonic() - started < 3
+
+
+def test_cancelled_caller_waits_for_the_command(tmp_path):
+    done = tmp_path / "done"
+
+    async def cancel():
+        task = asyncio.ensure_future(
+            aio_subprocess.run(["sh", "-c", f"sleep 0.3; touch {done}"])
+        )
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+
+    assert done.exists()
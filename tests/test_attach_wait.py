@@ -0,0 +1,124 @@
+"""
+Tests of waiting for the StorPool clients to apply reassignments
+"""
+
+import asyncio
+import types
+
+import pytest
+from grpc_interceptor.exceptions import DeadlineExceeded
+
+from attach_wait import AsyncAttachWaiter, AttachWaiter, _Waiter
+
+
+def _client(client_id: int, status: str, generation: int):
+    return types.SimpleNamespace(
+        id=client_id, configStatus=status, clientGeneration=generation
+    )
+
+
+class FakeApi:
+    """
+    Returns a fixed client status from clientsConfigDump
+    """
+
+    def __init__(self, clients: list):
+        self.clients = clients
+        self.calls = 0
+
+    def clientsConfigDump(self, clusterName=None):
+        """
+        Returns the client status
+        """
+        self.calls += 1
+        return self.clients
+
+
+@pytest.mark.parametrize(
+    "clients,applied",
+    [
+        ([_client(1, "ok", 7)], True),
+        ([_client(1, "ok", 6)], False),
+        ([_client(1, "updating", 7)], False),
+        ([_client(1, "down", 3)], False),
+        ([_client(2, "ok", 7)], False),
+    ],
+)
+def test_attach_waits_for_the_client(clients, applied):
+    assert AttachWaiter._applied(clients, _Waiter(1, 7, False)) is applied
+
+
+@pytest.mark.parametrize(
+    "clients,applied",
+    [
+        ([_client(1, "ok", 7)], True),
+        ([_client(1, "ok", 6)], False),
+        ([_client(1, "down", 3)], True),
+        ([_client(2, "ok", 7)], True),
+        ([], True),
+    ],
+)
+def test_detach_skips_down_and_missing_clients(clients, applied):
+    assert AttachWaiter._applied(clients, _Waiter(1, 7, True)) is applied
+
+
+def test_all_clients_skips_down_clients():
+    clients = [_client(1, "ok", 7), _client(2, "down", 3)]
+    assert AttachWaiter._applied(clients, _Waiter(None, 7, True))
+
+    clients.append(_client(3, "ok", 6))
+    assert not AttachWaiter._applied(clients, _Waiter(None, 7, True))
+
+
+def test_detach_from_a_down_client_returns():
+    api = FakeApi([_client(1, "down", 3)])
+    waiter = AttachWaiter(api, 0.01, 0.01, 60)
+
+    waiter.wait("~a", 1, 7, timeout=5, detach=True)
+
+    assert api.calls >= 1
+
+
+def test_wait_without_timeout_uses_the_default():
+    api = FakeApi([_client(1, "down", 3)])
+    waiter = AttachWaiter(api, 0.01, 0.01, 0.2)
+
+    with pytest.raises(DeadlineExceeded):
+        waiter.wait("~a", 1, 7)
+
+
+class FakeAsyncApi(FakeApi):
+    """
+    Returns a fixed client status like FakeApi, from a coroutine
+    """
+
+    async def clientsConfigDump(self, clusterName=None):
+        """
+        Returns the client status
+        """
+        self.calls += 1
+        return self.clients
+
+
+def test_async_waits_share_the_polls_of_a_cluster():
+    api = FakeAsyncApi([_client(i, "ok", 7) for i in range(1000)])
+
+    async def wait_all():
+        waiter = AsyncAttachWaiter(api, 0.01, 0.01, 60)
+        await asyncio.gather(
+            *(waiter.wait("~a", i, 7, timeout=5) for i in range(1000))
+        )
+
+    asyncio.run(wait_all())
+
+    assert 1 <= api.calls <= 3
+
+
+def test_async_wait_without_timeout_uses_the_default():
+    api = FakeAsyncApi([_client(1, "down", 3)])
+
+    async def wait():
+        await AsyncAttachWaiter(api, 0.01, 0.01, 0.2).wait("~a", 1, 7)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(wait())
@@ -0,0 +1,137 @@
+"""
+Tests of the index of volume attachments
+"""
+
+import asyncio
+import threading
+import time
+import types
+from concurrent import futures
+
+from attachments import AttachmentIndex
+
+
+def _attachment(global_id: str, client: int, rights: str = "rw"):
+    return types.SimpleNamespace(
+        globalId=global_id,
+        clusterId="a",
+        client=client,
+        rights=rights,
+        snapshot=False,
+    )
+
+
+class FakeListing:
+    """
+    Returns the current attachments, counting the calls
+    """
+
+    def __init__(self, attachments: list, delay: float = 0.0):
+        self.attachments = attachments
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return list(self.attachments)
+
+
+def test_publish_is_skipped_for_a_verified_attachment():
+    listing = FakeListing([_attachment("a.b.1", 3)])
+    index = AttachmentIndex(listing)
+    index.resync()
+
+    assert index.attached_only("a.b.1", "a", 3, "rw")
+    assert not index.attached_only("a.b.1", "a", 4, "rw")
+    assert listing.calls == 2
+
+
+def test_detach_outside_of_the_driver_is_noticed():
+    listing = FakeListing([_attachment("a.b.1", 3)])
+    index = AttachmentIndex(listing)
+    index.resync()
+
+    listing.attachments = []
+
+    assert not index.attached_only("a.b.1", "a", 3, "rw")
+    assert index.detached("a.b.1", "a", 3)
+
+
+def test_concurrent_checks_share_a_listing():
+    listing = FakeListing(
+        [_attachment(f"a.b.{i}", 3) for i in range(20)], delay=0.1
+    )
+    index = AttachmentIndex(listing)
+    index.resync()
+    listing.calls = 0
+
+    with futures.ThreadPoolExecutor(20) as executor:
+        results = list(
+            executor.map(
+                lambda i: index.attached_only(f"a.b.{i}", "a", 3, "rw"),
+                range(20),
+            )
+        )
+
+    assert all(results)
+    assert listing.calls <= 2
+
+
+def test_failed_check_does_not_skip():
+    listing = FakeListing([_attachment("a.b.1", 3)])
+    index = AttachmentIndex(listing)
+    index.resync()
+
+    def fail():
+        raise OSError("unreachable")
+
+    index._fetch = fail
+
+    assert not index.attached_only("a.b.1", "a", 3, "rw")
+
+
+def test_changes_during_a_resync_are_replayed():
+    listing = FakeListing([_attachment("a.b.1", 3)], delay=0.2)
+    index = AttachmentIndex(listing)
+    resync = threading.Thread(target=index.resync)
+    resync.start()
+    time.sleep(0.05)
+
+    index.detach("a.b.1")
+    resync.join()
+
+    assert index.detached("a.b.1")
+
+
+def test_publish_is_not_skipped_for_other_rights():
+    listing = FakeListing([_attachment("a.b.1", 3, "rw")])
+    index = AttachmentIndex(listing)
+    index.resync()
+
+    assert not index.attached_only("a.b.1", "a", 3, "ro")
+    assert listing.calls == 1
+
+
+def test_concurrent_async_checks_share_a_listing():
+    listing = FakeListing([_attachment(f"a.b.{i}", 3) for i in range(1000)])
+    index = AttachmentIndex(listing)
+    index.resync()
+    listing.calls = 0
+
+    async def fetch():
+        await asyncio.sleep(0.1)
+        return listing()
+
+    async def check_all():
+        return await asyncio.gather(
+            *(
+                index.attached_only_async(f"a.b.{i}", "a", 3, "rw", fetch)
+                for i in range(1000)
+            )
+        )
+
+    assert all(asyncio.run(check_all()))
+    assert listing.calls == 1
@@ -0,0 +1,116 @@
+"""
+Tests of detecting filesystems from their superblocks
+"""
+
+import shutil
+import struct
+import subprocess
+import uuid
+from pathlib import Path
+
+import pytest
+
+import fs_probe
+from fs_probe import EMPTY, Superblock, probe
+
+IMAGE_SIZE = 64 << 20
+FS_UUID = "1b4e28ba-2fa1-11d2-883f-0016d3cca427"
+
+
+def _image(tmp_path: Path, superblocks: dict) -> str:
+    data = bytearray(fs_probe.PROBE_SIZE)
+    for offset, value in superblocks.items():
+        data[offset : offset + len(value)] = value
+    image = tmp_path / "image"
+    image.write_bytes(bytes(data))
+    return str(image)
+
+
+def _ext_superblock(incompat: int, compat: int = 0) -> bytes:
+    superblock = bytearray(1024)
+    struct.pack_into("<I", superblock, 0x04, 0x2000)
+    struct.pack_into("<I", superblock, 0x18, 2)
+    struct.pack_into("<H", superblock, 0x38, fs_probe.EXT_MAGIC)
+    struct.pack_into("<III", superblock, 0x5C, compat, incompat, 0)
+    struct.pack_into("<I", superblock, 0x150, 1)
+    return bytes(superblock)
+
+
+def test_empty_device(tmp_path):
+    assert probe(_image(tmp_path, {})) == EMPTY
+
+
+def test_ext4_64bit_block_count(tmp_path):
+    image = _image(
+        tmp_path,
+        {
+            fs_probe.EXT_SUPERBLOCK: _ext_superblock(
+                fs_probe.EXT_INCOMPAT_64BIT
+            )
+        },
+    )
+
+    assert probe(image) == Superblock(True, "ext4", (1 << 32 | 0x2000) * 4096)
+
+
+def test_ext3_without_64bit_ignores_the_high_blocks(tmp_path):
+    image = _image(
+        tmp_path,
+        {
+            fs_probe.EXT_SUPERBLOCK: _ext_superblock(
+                0x2, fs_probe.EXT_COMPAT_HAS_JOURNAL
+            )
+        },
+    )
+
+    assert probe(image) == Superblock(True, "ext3", 0x2000 * 4096)
+
+
+def test_xfs(tmp_path):
+    image = _image(
+        tmp_path,
+        {
+            0: fs_probe.XFS_MAGIC + struct.pack(">IQ", 4096, 1000),
+            fs_probe.XFS_UUID: uuid.UUID(FS_UUID).bytes,
+        },
+    )
+
+    assert probe(image) == Superblock(True, "xfs", 4096 * 1000, FS_UUID)
+
+
+def test_btrfs(tmp_path):
+    image = _image(
+        tmp_path,
+        {
+            fs_probe.BTRFS_SUPERBLOCK + 0x40: fs_probe.BTRFS_MAGIC,
+            fs_probe.BTRFS_SUPERBLOCK + 0x70: struct.pack("<Q", IMAGE_SIZE),
+            fs_probe.BTRFS_SUPERBLOCK
+            + fs_probe.BTRFS_FSID: uuid.UUID(FS_UUID).bytes,
+        },
+    )
+
+    assert probe(image) == Superblock(True, "btrfs", IMAGE_SIZE, FS_UUID)
+
+
+@pytest.mark.parametrize("fs_type", ["ext2", "ext3", "ext4"])
+def test_mkfs_ext(tmp_path, fs_type):
+    if shutil.which(f"mkfs.{fs_type}") is None:
+        pytest.skip(f"needs mkfs.{fs_type}")
+    image = tmp_path / "image"
+    with image.open("wb") as image_file:
+        image_file.truncate(IMAGE_SIZE)
+    subprocess.run(
+        [
+            f"mkfs.{fs_type}",
+            "-q",
+            "-F",
+            "-b",
+            "4096",
+            "-U",
+            FS_UUID,
+            str(image),
+        ],
+        check=True,
+    )
+
+    assert probe(str(image)) == Superblock(True, fs_type, IMAGE_SIZE, FS_UUID)
@@ -0,0 +1,34 @@
+"""
+Tests of replacing the filesystem UUID of cloned volumes
+"""
+
+import shutil
+import subprocess
+
+import pytest
+
+from fs_probe import probe
+from mkfs import FormatError, cloned_fs_uuid, set_uuid
+
+
+def test_cloned_fs_uuid_is_unique_per_volume():
+    assert cloned_fs_uuid("a.b.1") == cloned_fs_uuid("a.b.1")
+    assert cloned_fs_uuid("a.b.1") != cloned_fs_uuid("a.b.2")
+
+
+def test_set_uuid_of_unsupported_filesystem(tmp_path):
+    with pytest.raises(FormatError):
+        set_uuid(str(tmp_path / "image"), "vfat", cloned_fs_uuid("a.b.1"))
+
+
+def test_set_uuid_of_ext4(tmp_path):
+    if shutil.which("mkfs.ext4") is None or shutil.which("tune2fs") is None:
+        pytest.skip("needs mkfs.ext4 and tune2fs")
+    image = tmp_path / "image"
+    with image.open("wb") as image_file:
+        image_file.truncate(64 << 20)
+    subprocess.run(["mkfs.ext4", "-q", "-F", str(image)], check=True)
+
+    set_uuid(str(image), "ext4", cloned_fs_uuid("a.b.1"))
+
+    assert probe(str(image)).uuid == cloned_fs_uuid("a.b.1")
@@ -0,0 +1,168 @@
+"""
+Tests of the mounters against the kernel.
+
+Every scenario runs in a private mount namespace created with
+`unshare -m`, so nothing it mounts is visible outside of it. The tests
+are skipped without CAP_SYS_ADMIN.
+"""
+
+import errno
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# pylint: disable=C0413
+from mount_table import parse_mountinfo  # noqa: E402
+from mounter import MountError, get_mounter  # noqa: E402
+
+CAP_SYS_ADMIN = 21
+
+BACKENDS = ("syscall", "subprocess")
+
+
+def _has_cap_sys_admin() -> bool:
+    with open("/proc/self/status", encoding="utf-8") as status:
+        for line in status:
+            if line.startswith("CapEff:"):
+                return bool(int(line.split()[1], 16) & (1 << CAP_SYS_ADMIN))
+    return False
+
+
+pytestmark = [
+    pytest.mark.skipif(not _has_cap_sys_admin(), reason="needs CAP_SYS_ADMIN"),
+    pytest.mark.skipif(
+        shutil.which("unshare") is None, reason="needs unshare"
+    ),
+]
+
+
+def _mount_at(target: str):
+    with open("/proc/self/mountinfo", encoding="utf-8") as mountinfo:
+        mounts = parse_mountinfo(mountinfo.read())
+    for mount in reversed(mounts):
+        if mount.target == target:
+            return mount
+    return None
+
+
+def _assert_read_only(path: Path) -> None:
+    with pytest.raises(OSError) as error:
+        (path / "file").write_text("data", encoding="utf-8")
+    assert error.value.errno == errno.EROFS
+
+
+def scenario_mount(mounter, tmp: Path) -> None:
+    """
+    A filesystem is mounted with its per-mount and its own options
+    """
+    target = tmp / "target"
+    target.mkdir()
+
+    mounter.mount("csi-test", str(target), "tmpfs", ["noexec", "size=1m"])
+
+    mount = _mount_at(str(target))
+    assert mount is not None
+    assert mount.fs_type == "tmpfs"
+    assert mount.source == "csi-test"
+    assert "noexec" in mount.mount_options.split(",")
+    assert "size=1024k" in mount.super_options.split(",")
+
+
+def scenario_bind(mounter, tmp: Path) -> None:
+    """
+    A read-only bind mount shows the source and leaves it writable
+    """
+    source = tmp / "source"
+    target = tmp / "target"
+    source.mkdir()
+    target.mkdir()
+    mounter.mount("csi-test", str(source), "tmpfs", [])
+    (source / "staged").write_text("data", encoding="utf-8")
+
+    mounter.bind(str(source), str(target), ["ro", "nosuid"])
+
+    mount = _mount_at(str(target))
+    assert mount is not None
+    assert mount.device == _mount_at(str(source)).device
+    assert {"ro", "nosuid"} <= set(mount.mount_options.split(","))
+    assert (target / "staged").read_text(encoding="utf-8") == "data"
+    _assert_read_only(target)
+    (source / "writable").write_text("data", encoding="utf-8")
+
+
+def scenario_remount_readonly(mounter, tmp: Path) -> None:
+    """
+    A writable mount is made read-only in place
+    """
+    target = tmp / "target"
+    target.mkdir()
+    mounter.mount("csi-test", str(target), "tmpfs", [])
+    (target / "before").write_text("data", encoding="utf-8")
+
+    mounter.remount_readonly(str(target))
+
+    assert "ro" in _mount_at(str(target)).mount_options.split(",")
+    assert (target / "before").read_text(encoding="utf-8") == "data"
+    _assert_read_only(target)
+
+
+def scenario_umount(mounter, tmp: Path) -> None:
+    """
+    Unmounting removes the mount and fails once there is none
+    """
+    target = tmp / "target"
+    target.mkdir()
+    mounter.mount("csi-test", str(target), "tmpfs", [])
+
+    mounter.umount(str(target))
+
+    assert _mount_at(str(target)) is None
+    with pytest.raises(MountError):
+        mounter.umount(str(target))
+
+    mounter.rmdir(str(target))
+    assert not target.exists()
+
+
+SCENARIOS = {
+    "mount": scenario_mount,
+    "bind": scenario_bind,
+    "remount_readonly": scenario_remount_readonly,
+    "umount": scenario_umount,
+}
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("scenario", SCENARIOS)
+def test_mounter(scenario: str, backend: str, tmp_path: Path) -> None:
+    """
+    Runs a scenario with a backend in a new mount namespace
+    """
+    result = subprocess.run(
+        [
+            "unshare",
+            "--mount",
+            "--propagation",
+            "private",
+            sys.executable,
+            __file__,
+            scenario,
+            backend,
+            str(tmp_path),
+        ],
+        encoding="utf-8",
+        capture_output=True,
+        check=False,
+    )
+    assert result.returncode == 0, result.stderr
+
+
+if __name__ == "__main__":
+    # The mounts vanish with the namespace, nothing to clean up
+    SCENARIOS[sys.argv[1]](get_mounter(sys.argv[2]), Path(sys.argv[3]))
@@ -0,0 +1,189 @@
+"""
+Tests of batching volume reassignments
+"""
+
+import asyncio
+import threading
+import time
+from concurrent import futures
+
+import pytest
+from grpc_interceptor.exceptions import DeadlineExceeded
+from storpool import spapi
+
+from reassign import AsyncReassignBatcher, ReassignBatcher
+
+
+def _api_error(name: str) -> spapi.ApiError:
+    return spapi.ApiError(400, {"error": {"name": name, "descr": name}})
+
+
+class FakeApi:
+    """
+    Records volumesReassignWait calls, failing every call which reassigns
+    one of the bad volumes
+    """
+
+    def __init__(self, bad=(), delay=0.0, error=None):
+        self.bad = set(bad)
+        self.delay = delay
+        self.error = error or _api_error("objectDoesNotExist")
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def volumesReassignWait(self, json, clusterName=None):
+        """
+        Fails if any of the volumes is bad
+        """
+        volumes = [entry["volume"] for entry in json["reassign"]]
+        with self.lock:
+            self.calls.append(volumes)
+        time.sleep(self.delay)
+        if self.bad & set(volumes):
+            raise self.error
+
+
+def _reassign_all(batcher, volumes, timeout=None):
+    with futures.ThreadPoolExecutor(len(volumes)) as executor:
+        results = {
+            volume: executor.submit(
+                batcher.reassign,
+                "~a",
+                {"volume": volume, "detach": "all"},
+                timeout,
+            )
+            for volume in volumes
+        }
+        futures.wait(results.values())
+    return results
+
+
+def test_concurrent_reassignments_are_batched():
+    api = FakeApi()
+    batcher = ReassignBatcher(api, 0.2, 100)
+
+    results = _reassign_all(batcher, [f"~v{i}" for i in range(10)])
+
+    assert all(result.result() is None for result in results.values())
+    assert len(api.calls) == 1
+    assert len(api.calls[0]) == 10
+
+
+@pytest.mark.parametrize(
+    "error", [_api_error("objectDoesNotExist"), DeadlineExceeded("slow")]
+)
+def test_failed_batch_is_split_to_the_failing_volume(error):
+    volumes = [f"~v{i}" for i in range(16)]
+    api = FakeApi(bad=["~v5"], delay=0.05, error=error)
+    batcher = ReassignBatcher(api, 0.2, 100)
+
+    started = time.monotonic()
+    results = _reassign_all(batcher, volumes)
+    elapsed = time.monotonic() - started
+
+    for volume, result in results.items():
+        if volume == "~v5":
+            assert result.exception() is error
+        else:
+            assert result.exception() is None
+    # The halves are sent at the same time: the batch, then four levels
+    # of splitting, instead of 16 calls one after the other.
+    assert ["~v5"] in api.calls
+    assert len(api.calls) <= 9
+    assert elapsed < 0.2 + 16 * 0.05
+
+
+def test_caller_stops_waiting_at_its_deadline():
+    api = FakeApi(delay=1)
+    batcher = ReassignBatcher(api, 0.05, 100)
+
+    started = time.monotonic()
+    results = _reassign_all(batcher, ["~v1", "~v2"], timeout=0.3)
+
+    for result in results.values():
+        assert isinstance(result.exception(), DeadlineExceeded)
+    assert time.monotonic() - started < 1
+
+
+def test_expired_reassignments_are_not_resent():
+    api = FakeApi(bad=["~v1"], delay=0.3)
+    batcher = ReassignBatcher(api, 0.05, 100)
+
+    results = _reassign_all(batcher, ["~v1", "~v2"], timeout=0.2)
+
+    for result in results.values():
+        assert isinstance(result.exception(), DeadlineExceeded)
+    time.sleep(0.2)
+    assert len(api.calls) == 1
+
+
+def test_default_timeout_applies_without_one():
+    api = FakeApi(delay=1)
+    batcher = ReassignBatcher(api, 0.05, 100, timeout=0.2)
+
+    results = _reassign_all(batcher, ["~v1"])
+
+    assert isinstance(results["~v1"].exception(), DeadlineExceeded)
+
+
+class FakeAsyncApi(FakeApi):
+    """
+    Records volumesReassignWait calls like FakeApi, without blocking
+    """
+
+    async def volumesReassignWait(self, json, clusterName=None):
+        """
+        Fails if any of the volumes is bad
+        """
+        volumes = [entry["volume"] for entry in json["reassign"]]
+        self.calls.append(volumes)
+        await asyncio.sleep(self.delay)
+        if self.bad & set(volumes):
+            raise self.error
+
+
+async def _reassign_all_async(batcher, volumes, timeout=None):
+    results = await asyncio.gather(
+        *(
+            batcher.reassign(
+                "~a", {"volume": volume, "detach": "all"}, timeout
+            )
+            for volume in volumes
+        ),
+        return_exceptions=True,
+    )
+    return dict(zip(volumes, results))
+
+
+def test_async_failed_batch_is_split_to_the_failing_volume():
+    volumes = [f"~v{i}" for i in range(1000)]
+    api = FakeAsyncApi(bad=["~v5"], delay=0.05)
+
+    async def reassign_all():
+        batcher = AsyncReassignBatcher(api, 0.2, 1000)
+        return await _reassign_all_async(batcher, volumes)
+
+    results = asyncio.run(reassign_all())
+
+    for volume, result in results.items():
+        if volume == "~v5":
+            assert result is api.error
+        else:
+            assert result is None
+    assert len(api.calls[0]) == 1000
+    assert ["~v5"] in api.calls
+
+
+def test_async_caller_stops_waiting_at_its_deadline():
+    api = FakeAsyncApi(delay=1)
+
+    async def reassign_all():
+        batcher = AsyncReassignBatcher(api, 0.05, 100)
+        return await _reassign_all_async(batcher, ["~v1", "~v2"], 0.3)
+
+    started = time.monotonic()
+    results = asyncio.run(reassign_all())
+
+    for result in results.values():
+        assert isinstance(result, DeadlineExceeded)
+    assert time.monotonic() - started < 1
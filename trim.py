@@ -0,0 +1,166 @@
+"""
+Scheduled discarding of the free space of staged volumes
+"""
+
+import fcntl
+import logging
+import os
+import random
+import struct
+import time
+
+from grpc_interceptor.exceptions import Aborted
+
+import metrics
+from mount_table import MountTable
+from periodic import PeriodicTask
+
+logger = logging.getLogger("TrimScheduler")
+
+DISCARD_MODE_PARAMETER = "discardMode"
+DISCARD_MODES = ("online", "scheduled")
+
+# _IOWR('X', 121, struct fstrim_range)
+FITRIM = 0xC0185879
+TRIM_CHUNK = 1 << 30
+
+STORPOOL_DEVICE_PREFIX = "/dev/sp-"
+# Where kubelet stages the volumes of CSI drivers, below its root directory
+STAGING_DIR = "plugins/kubernetes.io/csi"
+
+_trimmed_bytes = metrics.counter(
+    "trim_bytes_total", "Bytes discarded by scheduled trims"
+)
+_trim_seconds = metrics.summary("trim_seconds", "Time spent trimming a volume")
+_trim_errors = metrics.counter(
+    "trim_errors_total", "Scheduled trims which failed"
+)
+
+
+def fitrim(path: str, start: int, length: int) -> int:
+    """
+    Discards the unused blocks of a filesystem range
+    :param path: A directory on the filesystem
+    :type path: str
+    :param start: Start of the range in bytes
+    :type start: int
+    :param length: Length of the range in bytes
+    :type length: int
+    :return: The number of bytes discarded
+    :rtype: int
+    """
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+    try:
+        trim_range = bytearray(struct.pack("QQQ", start, length, 0))
+        fcntl.ioctl(fd, FITRIM, trim_range)
+    finally:
+        os.close(fd)
+
+    return struct.unpack("QQQ", trim_range)[1]
+
+
+class TrimScheduler:
+    """
+    Trims the StorPool volumes staged by kubelet and mounted without the
+    discard option, instead of having the filesystem send a small discard
+    for every freed extent. Other mounts of StorPool devices on the host
+    are left alone.
+
+    The first run starts after a random delay of up to `interval` seconds
+    and each later one between a half and one and a half intervals after
+    the previous, so that the nodes do not trim all at once and do not
+    fall into step when started together. Volumes are trimmed in 1 GiB
+    ranges, at most `rate` bytes of filesystem space per second. A range
+    is trimmed only while holding the staging path lock, so an unstage
+    waits for at most a single range.
+    """
+
+    def __init__(
+        self,
+        mounts: MountTable,
+        locks,
+        interval: float,
+        rate: float,
+        kubelet_dir: str,
+    ):
+        """
+        :param mounts: The mount table of the node
+        :param locks: The node's KeyedLock
+        :param interval: Seconds between runs, 0 disables trimming
+        :param rate: Maximum bytes of filesystem space trimmed per second
+        :param kubelet_dir: The kubelet root directory
+        """
+        self._mounts = mounts
+        self._locks = locks
+        self._rate = rate
+        self._staging_dir = os.path.join(kubelet_dir, STAGING_DIR) + "/"
+        self._task = PeriodicTask(
+            "trim-scheduler",
+            interval,
+            self.run,
+            initial_delay=random.uniform(0, interval),
+            jitter=0.5,
+        ).start()
+
+    def run(self) -> None:
+        """
+        Trims all staged volumes mounted without discard
+        """
+        for mount in self._scheduled_mounts():
+            self._trim(mount)
+
+    def _scheduled_mounts(self) -> list:
+        staged = {}
+        for mount in self._mounts.mounts():
+            options = mount.options.split(",")
+            if (
+                mount.source.startswith(STORPOOL_DEVICE_PREFIX)
+                and mount.target.startswith(self._staging_dir)
+                and "discard" not in options
+                and "ro" not in options
+            ):
+                staged.setdefault(mount.device, mount)
+        return list(staged.values())
+
+    def _trim(self, mount) -> None:
+        started = time.monotonic()
+        try:
+            stat = os.statvfs(mount.target)
+        except OSError as error:
+            logger.debug("Skipping %s: %s", mount.target, error)
+            return
+
+        size = stat.f_blocks * stat.f_frsize
+        trimmed = 0
+        for start in range(0, size, TRIM_CHUNK):
+            chunk_started = time.monotonic()
+            try:
+                with self._locks.hold([f"path:{mount.target}"], "trim", 0):
+                    current = self._mounts.at(mount.target)
+                    if current is None or current.device != mount.device:
+                        return
+                    chunk_trimmed = fitrim(mount.target, start, TRIM_CHUNK)
+            except Aborted:
+                logger.debug("%s is busy, trimming it later", mount.target)
+                return
+            except OSError as error:
+                logger.error("Failed to trim %s: %s", mount.target, error)
+                _trim_errors.inc()
+                return
+
+            trimmed += chunk_trimmed
+            _trimmed_bytes.inc(chunk_trimmed)
+            if self._rate > 0:
+                time.sleep(
+                    max(
+                        0.0,
+                        TRIM_CHUNK / self._rate
+                        - (time.monotonic() - chunk_started),
+                    )
+                )
+
+        elapsed = time.monotonic() - started
+        _trim_seconds.observe(elapsed)
+        logger.info(
+            "Trimmed %d bytes of %s in %.1fs", trimmed, mount.target, elapsed
+        )
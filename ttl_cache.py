@@ -0,0 +1,111 @@
+"""
+Bounded read-through cache with expiring entries
+"""
+
+import collections
+import threading
+import time
+
+import metrics
+
+_lookups = metrics.counter(
+    "ttl_cache_lookups_total", "Lookups in the read-through caches, by result"
+)
+_entries = metrics.gauge(
+    "ttl_cache_entries", "Number of entries in the read-through caches"
+)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Caches the results of `fetch(key)` for `ttl` seconds, evicting the least
+    recently used entries beyond `max_entries`.
+
+    Entries must be invalidated by the code changing the underlying objects.
+    A fetch racing with an invalidation of any key does not store its
+    result, so a value read before a change is never cached after it.
+    """
+
+    def __init__(self, name: str, fetch, ttl: float, max_entries: int):
+        """
+        :param name: Name of the cache, used in metrics
+        :param fetch: Callable returning the value of a key, exceptions
+            are passed on and not cached
+        :param ttl: Seconds a value is served from memory, 0 disables caching
+        :param max_entries: Maximum number of cached values
+        """
+        self._name = name
+        self._fetch = fetch
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._values = collections.OrderedDict()
+        self._invalidations = 0
+
+    def get(self, key):
+        """
+        Returns the value of a key, fetching it if it is not cached
+        :param key: The key to look up
+        :return: The cached or freshly fetched value
+        """
+        now = time.monotonic()
+        value, invalidations = self._lookup(key, now)
+        if value is _MISSING:
+            value = self._fetch(key)
+            self._store(key, value, now, invalidations)
+        return value
+
+    async def get_async(self, key, fetch):
+        """
+        Returns the value of a key like get, fetching it with a coroutine
+        function instead, for the asyncio server
+        :param key: The key to look up
+        :param fetch: Coroutine function returning the value of a key
+        :return: The cached or freshly fetched value
+        """
+        now = time.monotonic()
+        value, invalidations = self._lookup(key, now)
+        if value is _MISSING:
+            value = await fetch(key)
+            self._store(key, value, now, invalidations)
+        return value
+
+    def _lookup(self, key, now: float) -> tuple:
+        """
+        Returns the cached value, or _MISSING and the invalidation count to
+        store the fetched value with
+        """
+        with self._lock:
+            cached = self._values.get(key)
+            if cached is not None and cached[0] > now:
+                self._values.move_to_end(key)
+                _lookups.inc(cache=self._name, result="hit")
+                return cached[1], None
+            invalidations = self._invalidations
+
+        _lookups.inc(cache=self._name, result="miss")
+        return _MISSING, invalidations
+
+    def _store(self, key, value, now: float, invalidations: int) -> None:
+        if self._ttl <= 0 or self._max_entries <= 0:
+            return
+
+        with self._lock:
+            if invalidations == self._invalidations:
+                self._values[key] = (now + self._ttl, value)
+                self._values.move_to_end(key)
+                while len(self._values) > self._max_entries:
+                    self._values.popitem(last=False)
+                _entries.set(len(self._values), cache=self._name)
+
+    def invalidate(self, key) -> None:
+        """
+        Forgets the cached value of a key
+        :param key: The key whose underlying object changed
+        """
+        with self._lock:
+            self._invalidations += 1
+            self._values.pop(key, None)
+            _entries.set(len(self._values), cache=self._name)
@@ -3,6 +3,7 @@ This module contains various utility functions
 """
 
 import re
+from typing import Optional
 
 
 def csi_node_id_to_sp_node_id(csi_node_id: str) -> int:
@@ -20,23 +21,32 @@ def csi_node_id_to_sp_cluster_id(csi_node_id: str) -> str:
     return re.match(r"^[a-z0-9]+\.[a-z0-9]+", csi_node_id).group(0)
 
 
-def get_mounted_devices() -> list[dict]:
+def sp_global_id_to_sp_cluster_id(global_id: str) -> Optional[str]:
     """
-    Returns all mounts currently present on the node
-    :return: A list containing dictionaries with information about a mount
-    :rtype: list
+    Returns the id of the cluster a volume or snapshot was created in
+    :param global_id: The globalId of the volume or snapshot
+    :type global_id: str
+    :return: The cluster id, None if global_id is not a valid globalId
+    :rtype: str
     """
-    result = []
-    with open("/proc/mounts") as file:
-        mounts = [mount.strip("\n") for mount in file.readlines()]
-        for mount in mounts:
-            attributes = mount.split(" ")
-            result.append(
-                {
-                    "device": attributes[0],
-                    "target": attributes[1],
-                    "filesystem": attributes[2],
-                    "options": attributes[3],
-                }
-            )
-        return result
+    match = re.match(r"^([a-z0-9]+\.[a-z0-9]+)\.[a-z0-9]+$", global_id)
+    return match.group(1) if match else None
+
+
+SIZE_SUFFIXES = {"K": 1, "M": 2, "G": 3, "T": 4, "P": 5}
+
+
+def parse_size(size: str) -> int:
+    """
+    Parses a size in bytes with an optional binary suffix, e.g. 10G or 10Gi
+    :param size: The size as specified by the user
+    :type size: str
+    :return: The size in bytes
+    :rtype: int
+    """
+    match = re.fullmatch(r"([0-9]+)(?:([KMGTP])I?)?B?", size.strip().upper())
+    if match is None:
+        raise ValueError(f"Invalid size: {size}")
+
+    multiplier = 1024 ** SIZE_SUFFIXES.get(match.group(2), 0)
+    return int(match.group(1)) * multiplier
@@ -0,0 +1,147 @@
+"""
+In-memory index of the volumes and snapshots provisioned by the driver
+"""
+
+import logging
+import threading
+from typing import NamedTuple, Optional
+
+import metrics
+
+logger = logging.getLogger("VolumeIndex")
+
+CSI_NAME_TAG = "csi_name"
+CSI_SNAPSHOT_NAME_TAG = "csi_snapshot_name"
+CSI_SOURCE_TAG = "csi_source"
+
+_lookups = metrics.counter(
+    "volume_index_lookups_total",
+    "Lookups of CSI names in the volume and snapshot indexes, by result",
+)
+_entries = metrics.gauge(
+    "volume_index_entries", "Number of entries in the volume indexes"
+)
+
+
+class IndexedVolume(NamedTuple):
+    """
+    A volume or snapshot known to the index
+    """
+
+    global_id: str
+    size: int
+    source: str = ""
+    created: int = 0
+
+
+class VolumeIndex:
+    """
+    Maps the CSI name tag of the provisioned volumes (or snapshots) to their
+    globalId.
+
+    The index is seeded from a single bulk listing, updated on every create
+    and delete done by the driver and periodically resynced with the
+    StorPool API. Changes made while a resync is in progress are replayed on
+    top of the fresh listing so that they are not lost.
+    """
+
+    def __init__(self, name: str, fetch, tag: str):
+        """
+        :param name: Name of the index, used in logs and metrics
+        :param fetch: Callable returning the volumes or snapshots to index
+        :param tag: The tag holding the CSI name of the volume or snapshot
+        """
+        self._name = name
+        self._fetch = fetch
+        self._tag = tag
+        self._lock = threading.Lock()
+        self._volumes = {}
+        self._resync_changes = None
+
+    def resync(self) -> None:
+        """
+        Rebuilds the index from a bulk volume listing
+        """
+        with self._lock:
+            self._resync_changes = []
+
+        try:
+            volumes = self._fetch()
+        except Exception:
+            with self._lock:
+                self._resync_changes = None
+            raise
+
+        self.load(volumes)
+
+    def load(self, volumes: list) -> None:
+        """
+        Replaces the index with the tagged volumes in a listing
+        :param volumes: The result of a volumesList or snapshotsList call
+        :type volumes: list
+        """
+        indexed = {}
+        for volume in volumes:
+            tags = volume.tags or {}
+            csi_name = tags.get(self._tag)
+            if csi_name:
+                indexed[csi_name] = IndexedVolume(
+                    volume.globalId,
+                    volume.size,
+                    tags.get(CSI_SOURCE_TAG, ""),
+                    volume.creationTimestamp,
+                )
+
+        with self._lock:
+            for change in self._resync_changes or []:
+                change(indexed)
+            self._resync_changes = None
+            self._volumes = indexed
+            _entries.set(len(indexed), index=self._name)
+
+        logger.debug("Indexed %d CSI %s", len(indexed), self._name)
+
+    def lookup(self, csi_name: str) -> Optional[IndexedVolume]:
+        """
+        Looks up a volume or snapshot by its CSI name
+        :param csi_name: The name as requested by the CO
+        :type csi_name: str
+        :return: The indexed volume or None if there is no such name
+        :rtype: IndexedVolume
+        """
+        with self._lock:
+            volume = self._volumes.get(csi_name)
+
+        _lookups.inc(
+            index=self._name, result="miss" if volume is None else "hit"
+        )
+        return volume
+
+    def add(self, csi_name: str, volume: IndexedVolume) -> None:
+        """
+        Records a newly provisioned or resized volume or snapshot
+        """
+
+        def change(volumes):
+            volumes[csi_name] = volume
+
+        self._apply(change)
+
+    def remove(self, global_id: str) -> None:
+        """
+        Forgets a deleted volume or snapshot
+        """
+
+        def change(volumes):
+            for csi_name, volume in list(volumes.items()):
+                if volume.global_id == global_id:
+                    del volumes[csi_name]
+
+        self._apply(change)
+
+    def _apply(self, change) -> None:
+        with self._lock:
+            change(self._volumes)
+            if self._resync_changes is not None:
+                self._resync_changes.append(change)
+            _entries.set(len(self._volumes), index=self._name)
@@ -0,0 +1,320 @@
+"""
+Pool of spare volumes created ahead of CreateVolume requests
+"""
+
+import logging
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from storpool import spapi
+
+import metrics
+import utils
+from periodic import PeriodicTask
+from volume_index import CSI_NAME_TAG
+
+logger = logging.getLogger("WarmPool")
+
+CSI_POOL_TAG = "csi_pool"
+
+_claims = metrics.counter(
+    "warm_pool_claims_total",
+    "CreateVolume requests served from the warm pool, by result",
+)
+_spares = metrics.gauge(
+    "warm_pool_spares", "Number of spare volumes in the warm pool"
+)
+_refill_lag = metrics.gauge(
+    "warm_pool_refill_lag_seconds",
+    "Seconds since a warm pool bucket first fell below its target size",
+)
+_refill_seconds = metrics.summary(
+    "warm_pool_refill_seconds", "Time spent refilling the warm pool"
+)
+
+
+class PoolBucket(NamedTuple):
+    """
+    A group of identical spare volumes
+    """
+
+    template: str
+    size: int
+    count: int
+    parent: str = ""
+
+    @property
+    def tag(self) -> str:
+        """
+        The value of the csi_pool tag of the spares in this bucket
+        """
+        return f"{self.template}:{self.size}"
+
+    @property
+    def formatted(self) -> bool:
+        """
+        Whether the spares are clones of a formatted snapshot
+        """
+        return bool(self.parent)
+
+    @classmethod
+    def parse(cls, spec: str) -> "PoolBucket":
+        """
+        Parses a TEMPLATE:SIZE:COUNT[:PARENT] bucket specification
+        :param spec: The bucket specification, e.g. nvme:10G:5
+        :type spec: str
+        :return: The bucket
+        :rtype: PoolBucket
+        """
+        fields = spec.split(":")
+        if len(fields) not in (3, 4) or not fields[0]:
+            raise ValueError(f"Invalid warm pool bucket: {spec}")
+
+        return cls(
+            fields[0],
+            utils.parse_size(fields[1]),
+            int(fields[2]),
+            fields[3] if len(fields) == 4 else "",
+        )
+
+
+class Spare(NamedTuple):
+    """
+    A spare volume claimed from the pool
+    """
+
+    global_id: str
+    formatted: bool
+
+
+class WarmPool:
+    """
+    Keeps a number of spare volumes per template and size, so that
+    CreateVolume only has to retag (and possibly grow) an existing volume.
+
+    Spares are tagged with csi_pool instead of csi_name, so they are not
+    visible as CSI volumes until claimed. Buckets with a parent snapshot hold
+    thin clones of it; the snapshot is expected to contain a filesystem of
+    the default type created for exactly the bucket size, so these spares
+    are only claimed without resizing. All of them share the filesystem UUID
+    of the snapshot, which the node replaces when first staging a claimed
+    spare.
+    """
+
+    def __init__(self, sp_api, buckets: list, interval: float):
+        self._sp_api = sp_api
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self._spares = {bucket: [] for bucket in buckets}
+        self._claimed = set()
+        self._short_since = {}
+        self._task = PeriodicTask(
+            "warm-pool-refill", interval, self.refill, initial_delay=0
+        ).start()
+
+    def claim(
+        self,
+        template: str,
+        volume_size: int,
+        formatted_ok: bool,
+        tags: dict,
+    ) -> Optional[Spare]:
+        """
+        Turns a spare volume into a CSI volume
+        :param template: The requested template
+        :type template: str
+        :param volume_size: The requested size in bytes
+        :type volume_size: int
+        :param formatted_ok: Whether a volume with the default filesystem
+            already created on it may be used
+        :type formatted_ok: bool
+        :param tags: The tags of the new CSI volume
+        :type tags: dict
+        :return: The claimed volume, None if there is no suitable spare
+        :rtype: Spare
+        """
+        for bucket in self._candidates(template, volume_size, formatted_ok):
+            for global_id in self._take(bucket):
+                try:
+                    self._sp_api.volumeUpdate(
+                        f"~{global_id}",
+                        self._claim_update(bucket, volume_size, tags),
+                    )
+                except spapi.ApiError as error:
+                    self._claim_failed(global_id, error)
+                    continue
+
+                return self._claimed_spare(bucket, global_id, template)
+
+        _claims.inc(template=template, result="miss")
+        return None
+
+    async def claim_async(
+        self,
+        sp_api,
+        template: str,
+        volume_size: int,
+        formatted_ok: bool,
+        tags: dict,
+    ) -> Optional[Spare]:
+        """
+        Turns a spare volume into a CSI volume like claim, for the asyncio
+        server
+        :param sp_api: The AsyncApi StorPool API client
+        :param template: The requested template
+        :type template: str
+        :param volume_size: The requested size in bytes
+        :type volume_size: int
+        :param formatted_ok: Whether a volume with the default filesystem
+            already created on it may be used
+        :type formatted_ok: bool
+        :param tags: The tags of the new CSI volume
+        :type tags: dict
+        :return: The claimed volume, None if there is no suitable spare
+        :rtype: Spare
+        """
+        for bucket in self._candidates(template, volume_size, formatted_ok):
+            for global_id in self._take(bucket):
+                try:
+                    await sp_api.volumeUpdate(
+                        f"~{global_id}",
+                        self._claim_update(bucket, volume_size, tags),
+                    )
+                except spapi.ApiError as error:
+                    self._claim_failed(global_id, error)
+                    continue
+
+                return self._claimed_spare(bucket, global_id, template)
+
+        _claims.inc(template=template, result="miss")
+        return None
+
+    def _take(self, bucket: PoolBucket):
+        """
+        Yields the spares of a bucket one at a time, marking them claimed
+        """
+        while True:
+            with self._lock:
+                if not self._spares[bucket]:
+                    return
+                global_id = self._spares[bucket].pop()
+                self._claimed.add(global_id)
+                remaining = len(self._spares[bucket])
+
+            _spares.set(remaining, bucket=bucket.tag)
+            yield global_id
+
+    @staticmethod
+    def _claim_update(bucket: PoolBucket, volume_size: int, tags: dict):
+        volume_update = {"tags": {**tags, CSI_POOL_TAG: ""}}
+        if volume_size > bucket.size:
+            volume_update["size"] = volume_size
+        return volume_update
+
+    def _claim_failed(self, global_id: str, error: spapi.ApiError) -> None:
+        logger.error("Failed to claim spare volume %s: %s", global_id, error)
+        with self._lock:
+            self._claimed.discard(global_id)
+
+    @staticmethod
+    def _claimed_spare(
+        bucket: PoolBucket, global_id: str, template: str
+    ) -> Spare:
+        logger.info(
+            "Claimed spare volume %s from bucket %s", global_id, bucket.tag
+        )
+        _claims.inc(template=template, result="hit")
+        return Spare(global_id, bucket.formatted)
+
+    def refill(self) -> None:
+        """
+        Creates the spare volumes missing from every bucket
+        """
+        started = time.monotonic()
+        listed = {bucket.tag: [] for bucket in self._buckets}
+        for volume in self._sp_api.volumesList():
+            tags = volume.tags or {}
+            if tags.get(CSI_POOL_TAG) in listed and CSI_NAME_TAG not in tags:
+                listed[tags[CSI_POOL_TAG]].append(volume.globalId)
+
+        with self._lock:
+            listed_ids = {
+                global_id for ids in listed.values() for global_id in ids
+            }
+            self._claimed &= listed_ids
+            for bucket in self._buckets:
+                self._spares[bucket] = [
+                    global_id
+                    for global_id in listed[bucket.tag]
+                    if global_id not in self._claimed
+                ]
+
+        for bucket in self._buckets:
+            self._refill_bucket(bucket)
+
+        _refill_seconds.observe(time.monotonic() - started)
+
+    def _refill_bucket(self, bucket: PoolBucket) -> None:
+        with self._lock:
+            missing = bucket.count - len(self._spares[bucket])
+
+        if missing > 0:
+            short_since = self._short_since.setdefault(
+                bucket, time.monotonic()
+            )
+            _refill_lag.set(time.monotonic() - short_since, bucket=bucket.tag)
+
+        volume_create = {
+            "template": bucket.template,
+            "size": bucket.size,
+            "tags": {CSI_POOL_TAG: bucket.tag},
+        }
+        if bucket.parent:
+            volume_create["parent"] = bucket.parent
+
+        for _ in range(missing):
+            try:
+                result = self._sp_api.volumeCreate(volume_create)
+            except spapi.ApiError as error:
+                logger.error(
+                    "Failed to create a spare volume in bucket %s: %s",
+                    bucket.tag,
+                    error,
+                )
+                return
+
+            with self._lock:
+                self._spares[bucket].append(str(result.globalId))
+                _spares.set(len(self._spares[bucket]), bucket=bucket.tag)
+
+        self._short_since.pop(bucket, None)
+        _refill_lag.set(0, bucket=bucket.tag)
+
+    def _candidates(
+        self, template: str, volume_size: int, formatted_ok: bool
+    ) -> list:
+        """
+        Returns the buckets a volume may be claimed from, best first: exact
+        size matches (formatted ones first), then the largest smaller spares
+        which will be grown to the requested size
+        """
+        exact = [
+            bucket
+            for bucket in self._buckets
+            if bucket.template == template
+            and bucket.size == volume_size
+            and (formatted_ok or not bucket.formatted)
+        ]
+        exact.sort(key=lambda bucket: not bucket.formatted)
+
+        smaller = [
+            bucket
+            for bucket in self._buckets
+            if bucket.template == template
+            and bucket.size < volume_size
+            and not bucket.formatted
+        ]
+        smaller.sort(key=lambda bucket: bucket.size, reverse=True)
+
+        return exact + smaller